@@ -0,0 +1,168 @@
+import os
+import sys
+import time
+from glob import glob
+
+import emitter
+from compiler import CompileError, Compiler, build
+
+# Batch compilation of many scripts over a pool of worker processes. The
+# lexer and parse tables are built once in the parent and every worker
+# creates one Compiler when it starts (inheriting the tables when processes
+# are forked, loading them from the table cache otherwise) and compiles the
+# scripts it is handed one after the other. Every script gets its own output
+# file, written by the worker, or all the code is collected into one output
+# in the order the scripts were given.
+
+_compiler = None
+
+
+def expand(patterns):
+    # Script paths from the command line, glob patterns expanded in sorted
+    # order so the same patterns always give the same batch
+    paths = []
+    for pattern in patterns:
+        if any(c in pattern for c in '*?['):
+            paths.extend(sorted(glob(pattern, recursive=True)))
+        else:
+            paths.append(pattern)
+    return paths
+
+
+def output_path(path, out_dir=None):
+    # name.txt compiles to name.out, next to the script or in out_dir
+    name = os.path.splitext(path)[0] + '.out'
+    if out_dir is not None:
+        name = os.path.join(out_dir, os.path.basename(name))
+    return name
+
+
+def count_lines(text):
+    return text.count('\n') + (1 if text and not text.endswith('\n') else 0)
+
+
+def init(optimize, loops=(), fold_limits=None):
+    global _compiler
+    _compiler = Compiler(optimize, loops=loops)
+    _compiler.fold_limits = fold_limits
+
+
+def generate(compiler, text, write):
+    # Writes the code of text to write and returns the number of instructions
+    if not compiler.level and not compiler.loops:
+        return len(compiler.stream(text, write))
+    program = compiler.compile(text)
+    out = emitter.Emitter(write)
+    for line in program.lines():
+        out.line(line)
+    out.flush()
+    return len(program)
+
+
+def compile_file(job):
+    # Runs in a worker. Returns (path, lines, instructions, errors, warnings,
+    # code), the code only when there is no output file to write it to.
+    path, output = job
+    compiler = _compiler
+    try:
+        with open(path, 'r') as file:
+            text = file.read()
+    except OSError as e:
+        return path, 0, 0, [e.strerror], [], None
+    except UnicodeDecodeError as e:
+        # A script that is not text fails on its own, like a missing one
+        return path, 0, 0, ['cannot be read as %s: %s at byte %d' % (e.encoding, e.reason, e.start)], [], None
+    lines = count_lines(text)
+    code = None
+    try:
+        if output is None:
+            parts = []
+            count = generate(compiler, text, parts.append)
+            code = ''.join(parts)
+        else:
+            out = emitter.OutputFile(output)
+            try:
+                count = generate(compiler, text, out.write)
+            except BaseException:
+                out.discard()
+                raise
+            out.commit()
+    except CompileError as e:
+        return path, lines, 0, e.errors, list(compiler.warnings), None
+    return path, lines, count, [], list(compiler.warnings), code
+
+
+def compile_files(jobs, workers, optimize=0, loops=(), fold_limits=None):
+    # Compiles (path, output) jobs, output None to get the code back, and
+    # yields the result of every job in order
+    build()
+    if workers <= 1 or len(jobs) <= 1:
+        init(optimize, loops, fold_limits)
+        for job in jobs:
+            yield compile_file(job)
+        return
+    import multiprocessing
+
+    chunksize = max(1, min(64, len(jobs) // (workers * 4)))
+    pool = multiprocessing.Pool(workers, init, (optimize, loops, fold_limits))
+    try:
+        for result in pool.imap(compile_file, jobs, chunksize):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def run(paths, workers, optimize=0, output=None, out_dir=None, loops=(), fold_limits=None):
+    # Compiles every script of paths, into one output file if output is
+    # given ("-" for standard output) and into a file per script otherwise.
+    # Errors are printed per script, the throughput goes to standard error.
+    if output is None:
+        outputs = [output_path(path, out_dir) for path in paths]
+        if len(set(outputs)) < len(outputs):
+            if out_dir is None:
+                print('scripts with the same name compile to the same output file')
+            else:
+                print('scripts with the same name compile to the same output file in %s' % out_dir)
+            return 1
+        if out_dir is not None:
+            os.makedirs(out_dir, exist_ok=True)
+        combined = None
+    else:
+        outputs = [None] * len(paths)
+        combined = None if output == '-' else emitter.OutputFile(output)
+    write = sys.stdout.write if combined is None else combined.write
+
+    start = time.perf_counter()
+    failed = lines = instructions = 0
+    jobs = list(zip(paths, outputs))
+    try:
+        for path, n, count, errors, warnings, code in compile_files(jobs, workers, optimize, loops, fold_limits):
+            lines += n
+            instructions += count
+            for msg in warnings:
+                print('%s: warning: %s' % (path, msg))
+            if errors:
+                failed += 1
+                for msg in errors:
+                    print('%s: %s' % (path, msg))
+            elif code is not None:
+                write('==== %s ====\n' % path)
+                write(code)
+    except BaseException:
+        if combined:
+            combined.discard()
+        raise
+    if combined:
+        # Like a single compile, a failure leaves the output file as it was
+        if failed:
+            combined.discard()
+        else:
+            combined.commit()
+    elapsed = time.perf_counter() - start
+
+    sys.stderr.write('%d scripts (%d failed), %d lines, %d instructions in %.3f s with %d workers: '
+                     '%.1f scripts/s, %.0f lines/s\n'
+                     % (len(paths), failed, lines, instructions, elapsed, workers,
+                        len(paths) / elapsed if elapsed else 0.0, lines / elapsed if elapsed else 0.0))
+    return 1 if failed else 0
@@ -0,0 +1,1081 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import batch
+import cfg
+import client
+import dfa
+import emitter
+import incremental
+import interpreter
+import ir
+import nodes
+import optimizer
+import profiler
+import pycode
+import stats
+import vm
+from compiler import Compiler
+from programs import (block_program, deep_program, expression_program, flat_program, identifier_program,
+                      nested_program, random_program, string_program)
+
+# Benchmarks for the compiler, run "python benchmark.py <name>" or with no
+# arguments to run all of them.
+
+
+class ChainCompiler(Compiler):
+    # Code generation as it was before the work stack: an if/elif chain on
+    # the kind of every statement, recursing into every block, kept as the
+    # reference bench_codegen measures against
+    def generate(self, prog):
+        self.program = ir.Program()
+        self.chain(prog)
+        return self.program
+
+    def chain(self, stms):
+        emit = self.program.emit
+        for stm in stms:
+            t = type(stm)
+            if t is nodes.DeclareAssign:
+                self.declare_assign(stm)
+            elif t is nodes.Declare:
+                self.declare(stm)
+            elif t is nodes.Assign:
+                self.assign(stm)
+            elif t is nodes.Print:
+                self.printC(stm)
+            elif t is nodes.Conditional:
+                emit(ir.IF)
+                self.test(stm.if_.test)
+                self.chain(stm.if_.body)
+                emit(ir.END_IF)
+                for elif_ in stm.elifs:
+                    emit(ir.ELIF)
+                    self.test(elif_.test)
+                    self.chain(elif_.body)
+                    emit(ir.END_ELIF)
+                if stm.else_ is not None:
+                    emit(ir.ELSE)
+                    self.chain(stm.else_.body)
+                    emit(ir.END_ELSE)
+            elif t is nodes.While:
+                emit(ir.WHILE)
+                self.test(stm.test)
+                self.chain(stm.body)
+                emit(ir.END_WHILE)
+            elif t is nodes.DoWhile:
+                emit(ir.DO)
+                self.chain(stm.body)
+                emit(ir.DO_WHILE)
+                self.test(stm.test)
+                emit(ir.END_DO)
+            elif t is nodes.For:
+                self.declare_assign(stm.init)
+                emit(ir.FOR)
+                self.test(stm.test)
+                self.chain(stm.body)
+                self.assign(stm.step)
+                emit(ir.END_FOR)
+
+
+def bench_codegen(sizes, repeat=5):
+    # ns per tree node generating code from the work stack and with the
+    # recursive if/elif chains it replaced, fastest of repeat runs, checking
+    # both generate the same code
+    print('%-8s %10s %10s %12s %12s %8s' % ('shape', 'blocks', 'nodes', 'stack ns', 'chain ns', 'ratio'))
+    for shape, make in (('flat', flat_program), ('nested', nested_program), ('deep', deep_program)):
+        for n in sizes if shape != 'deep' else (100, 1000, 10000):
+            prog = Compiler().parse(make(n))
+            count = stats.tree_stats(prog)[0]
+            times = []
+            code = []
+            for compiler in (Compiler(), ChainCompiler()):
+                best = None
+                try:
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        compiler.generate(prog)
+                        elapsed = time.perf_counter() - start
+                        best = elapsed if best is None else min(best, elapsed)
+                except RecursionError:
+                    best = None
+                times.append(best)
+                code.append(None if best is None else list(compiler.program.lines()))
+            if code[1] is not None and code[0] != code[1]:
+                print('%s %d: the chains generate other code' % (shape, n))
+                return 1
+            stack, chain = times
+            print('%-8s %10d %10d %12.1f %12s %8s' % (
+                shape, n, count, stack / count * 1e9, 'recursion' if chain is None else '%.1f' % (chain / count * 1e9),
+                '' if chain is None else '%.2f' % (stack / chain)))
+
+
+def bench_long_expression(sizes):
+    # One left associative chain of n terms and a negated product of n
+    # variables, both lowered with a single temporary
+    print('%-8s %10s %10s %10s %12s %8s' % ('chain', 'terms', 'parse s', 'codegen s', 'ns/term', 'temps'))
+    for name, make in (('sum', lambda n: 'float x = %s;\n' % ' + '.join(['1'] * n)),
+                       ('product', lambda n: 'float x = 2;\nx = -(%s);\n' % ' * '.join(['x'] * n))):
+        for n in sizes:
+            compiler = Compiler()
+            start = time.perf_counter()
+            prog = compiler.parse(make(n))
+            parse = time.perf_counter() - start
+            start = time.perf_counter()
+            compiler.generate(prog)
+            elapsed = time.perf_counter() - start
+            print('%-8s %10d %10.3f %10.3f %12.1f %8d' % (name, n, parse, elapsed, elapsed / n * 1e9,
+                                                          compiler.program.temps))
+
+
+def bench_incremental(sizes):
+    # Recompiling a program after changing one statement, from scratch and
+    # with the per-statement cache
+    print('%-8s %10s %10s %10s %10s' % ('shape', 'blocks', 'full', 'cold', 'edited'))
+    for shape, make in (('flat', flat_program), ('nested', lambda n: nested_program(n, unique=True))):
+        for n in sizes:
+            text = make(n)
+            edited = text.replace('x = x + 1;', 'x = x + 2;', 1)
+            start = time.perf_counter()
+            Compiler().compile(text)
+            full = time.perf_counter() - start
+            compiler = incremental.IncrementalCompiler()
+            start = time.perf_counter()
+            compiler.compile(text)
+            cold = time.perf_counter() - start
+            start = time.perf_counter()
+            compiler.compile(edited)
+            print('%-8s %10d %10.3f %10.3f %10.3f' % (shape, n, full, cold, time.perf_counter() - start))
+
+
+def bench_parse_scaling(sizes):
+    print('%-8s %10s %12s %12s' % ('shape', 'statements', 'seconds', 'us/statement'))
+    for shape, make in (('flat', flat_program), ('block', block_program)):
+        for n in sizes:
+            text = make(n)
+            compiler = Compiler()
+            start = time.perf_counter()
+            compiler.parse(text)
+            elapsed = time.perf_counter() - start
+            print('%-8s %10d %12.3f %12.2f' % (shape, n, elapsed, elapsed / n * 1e6))
+
+
+def traced(make):
+    tracemalloc.start()
+    try:
+        value = make()
+        return value, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_ir_memory(sizes):
+    # Memory held by a compiled program, compared with the same code kept as
+    # a list of text lines
+    print('%-8s %10s %12s %10s %10s %10s' % ('names', 'statements', 'instructions', 'ir B/ins', 'text B/ins',
+                                            'bin B/ins'))
+    for names in (100, 0):
+        for n in sizes:
+            program = Compiler().compile(flat_program(n, names))
+            data = program.to_bytes()
+            count = len(program)
+            _, ir_bytes = traced(lambda: ir.Program.from_bytes(data))
+            _, text_bytes = traced(lambda: list(program.lines()))
+            print('%-8s %10d %12d %10.1f %10.1f %10.1f' % (names or 'unique', n, count, ir_bytes / count,
+                                                          text_bytes / count, len(data) / count))
+
+
+def as_tuples(node):
+    # The tree as the nested tuples it used to be built from
+    if type(node) is list:
+        return [as_tuples(item) for item in node]
+    if isinstance(node, nodes.Node):
+        return (node.tag,) + tuple(as_tuples(getattr(node, name)) for name in node.fields)
+    return node
+
+
+def copy_nodes(node):
+    if type(node) is list:
+        return [copy_nodes(item) for item in node]
+    if isinstance(node, nodes.Node):
+        return type(node)(*[copy_nodes(getattr(node, name)) for name in node.fields])
+    return node
+
+
+def tuple_tree_stats(stms):
+    # stats.tree_stats over the tuple tree, dispatching on the string tags
+    count = 0
+    max_block = max_expression = 0
+    blocks = [(stms, 0)]
+    expressions = []
+    while blocks:
+        block, depth = blocks.pop()
+        max_block = max(max_block, depth)
+        for stm in block:
+            count += 1
+            kind = stm[0]
+            if kind == 'declareAssign':
+                expressions.append(stm[3])
+            elif kind == 'assign':
+                expressions.append(stm[2])
+            elif kind == 'print':
+                expressions.append(stm[1])
+            elif kind == 'while' or kind == 'do-while':
+                expressions.append(stm[1])
+                blocks.append((stm[2], depth + 1))
+            elif kind == 'for':
+                count += 2
+                expressions += [stm[1][3], stm[2], stm[3][2]]
+                blocks.append((stm[4], depth + 1))
+            elif kind == 'conditional':
+                for arm in [stm[1]] + stm[2]:
+                    count += 1
+                    expressions.append(arm[1])
+                    blocks.append((arm[2], depth + 1))
+                if stm[3] is not None:
+                    count += 1
+                    blocks.append((stm[3][1], depth + 1))
+
+    stack = [(expression, 1) for expression in expressions]
+    while stack:
+        expression, depth = stack.pop()
+        count += 1
+        max_expression = max(max_expression, depth)
+        if type(expression) is tuple:
+            if expression[0] == 'operation':
+                stack.append((expression[1], depth + 1))
+                stack.append((expression[3], depth + 1))
+            elif expression[0] == 'neg':
+                stack.append((expression[1], depth + 1))
+    return count, max_block, max_expression
+
+
+def best_time(fn, arg, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench_tree(sizes, repeat):
+    # Memory held by the syntax tree of a random program of about n nodes
+    # (some 40 a statement) and the time to walk it, as __slots__ nodes and
+    # as the nested tuples with string tags the parser used to build
+    print('%-6s %10s %12s %12s %12s %12s' % ('tree', 'nodes', 'MB', 'B/node', 'walk ms', 'ns/node'))
+    for n in sizes:
+        prog = Compiler().parse(random_program(max(1, n // 40)))
+        count = stats.tree_stats(prog)[0]
+        for name, make, walk in (('tuples', as_tuples, tuple_tree_stats), ('nodes', copy_nodes, stats.tree_stats)):
+            tree, size = traced(lambda: make(prog))
+            elapsed = best_time(walk, tree, repeat)
+            print('%-6s %10d %12.1f %12.1f %12.1f %12.1f' % (name, count, size / 1e6, size / count, elapsed * 1e3,
+                                                              elapsed / count * 1e9))
+            del tree
+
+
+STREAM_MEMORY = """
+import os, resource, sys
+import compiler, emitter, programs
+
+text = programs.flat_program(%d)
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+out = open(os.devnull, 'w')
+c = compiler.Compiler()
+if sys.argv[1] == 'stream':
+    count = len(c.stream(text, out.write))
+else:
+    program = c.compile(text)
+    count = len(program)
+    for line in program.lines():
+        out.write(line + '\\n')
+print(count, before, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def bench_stream_memory(sizes):
+    # Peak resident memory of compiling to a file, keeping the tree and the
+    # program first or streaming the code out while parsing. Every run is a
+    # process of its own, the source text is included in the baseline.
+    print('%-8s %10s %12s %12s %12s %10s' % ('mode', 'statements', 'instructions', 'baseline MB', 'peak MB',
+                                            'seconds'))
+    for n in sizes:
+        for mode in ('program', 'stream'):
+            start = time.perf_counter()
+            result = subprocess.run([sys.executable, '-c', STREAM_MEMORY % n, mode], check=True, stdout=subprocess.PIPE,
+                                    cwd=os.path.dirname(os.path.abspath(__file__)))
+            elapsed = time.perf_counter() - start
+            count, before, peak = map(int, result.stdout.split())
+            print('%-8s %10d %12d %12.1f %12.1f %10.2f' % (mode, n, count, before / 1024, peak / 1024, elapsed))
+
+
+MAPPED_MEMORY = """
+import os, resource, sys
+import compiler, mapped
+
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+out = open(os.devnull, 'w')
+c = compiler.Compiler()
+if sys.argv[2] == 'mmap':
+    source = mapped.open_source(sys.argv[1])
+else:
+    file = open(sys.argv[1], 'r')
+    source = file.read()
+    file.close()
+count = len(c.stream(source, out.write))
+print(count, before, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def bench_mapped_memory(sizes):
+    # Peak resident memory of streaming a generated source file of n
+    # assignments through the compiler, read into a string or memory mapped.
+    # Every run is a process of its own.
+    print('%-6s %10s %10s %12s %12s %10s' % ('input', 'statements', 'file MB', 'baseline MB', 'peak MB', 'seconds'))
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            path = os.path.join(tmp, 'source.txt')
+            file = open(path, 'w')
+            # Written in parts, the generator would otherwise hold it all
+            for i in range(0, n, 100000):
+                file.write(expression_program(min(100000, n - i), 4, seed=i))
+            file.close()
+            size = os.path.getsize(path)
+            for mode in ('read', 'mmap'):
+                start = time.perf_counter()
+                result = subprocess.run([sys.executable, '-c', MAPPED_MEMORY, path, mode], check=True,
+                                        stdout=subprocess.PIPE, cwd=os.path.dirname(os.path.abspath(__file__)))
+                elapsed = time.perf_counter() - start
+                count, before, peak = map(int, result.stdout.split())
+                print('%-6s %10d %10.1f %12.1f %12.1f %10.2f' % (mode, n, size / 1e6, before / 1024, peak / 1024,
+                                                                  elapsed))
+
+
+# Shapes and sizes of the regression suite
+SUITE = (
+    ('flat', flat_program, (2000, 20000)),
+    ('nested', lambda n: nested_program(n, unique=True), (200, 2000)),
+    ('deep', lambda n: deep_program(n, ('if', 'for', 'while', 'do')), (100, 1000)),
+    ('expression', lambda n: expression_program(20, n), (50, 300)),
+    ('identifiers', identifier_program, (500, 5000)),
+    ('random', random_program, (200, 2000)),
+)
+SUITE_PHASES = ('lex', 'parse', 'codegen', 'output')
+# Slower phases differing from the baseline by less than this many seconds
+# are taken as noise
+MIN_DELTA = 0.005
+
+
+def suite_run(text, write):
+    # CPU seconds every phase took for one compile, less noisy than wall
+    # time on a busy machine
+    run = stats.Stats()
+    compiler = Compiler(stats=run)
+    compiler.generate(compiler.parse(text))
+    with run.phase('output'):
+        out = emitter.Emitter(write)
+        for line in compiler.program.lines():
+            out.line(line)
+        out.flush()
+    return dict((name, run.phases[name]['cpu_seconds']) for name in SUITE_PHASES)
+
+
+def bench_suite(path, save, threshold, repeat):
+    # Times every phase on every shape and size, best of a few runs, and
+    # compares with the baseline file. Returns 1 if a phase got slower than
+    # the threshold allows.
+    baseline = {}
+    if os.path.exists(path) and not save:
+        file = open(path)
+        baseline = json.load(file)
+        file.close()
+    print('%-12s %8s' % ('shape', 'size') + ''.join(' %10s' % ('%s ms' % name) for name in SUITE_PHASES))
+    results = {}
+    regressions = []
+    devnull = open(os.devnull, 'w')
+    for shape, make, sizes in SUITE:
+        for n in sizes:
+            text = make(n)
+            key = '%s/%d' % (shape, n)
+            old = baseline.get(key, {})
+            best = None
+            try:
+                # A case that looks slower than the baseline gets as many runs
+                # again before it counts, a busy moment is not a regression
+                for attempt in range(2):
+                    for _ in range(repeat):
+                        times = suite_run(text, devnull.write)
+                        best = times if best is None else dict((name, min(best[name], times[name])) for name in times)
+                    slower = [name for name in SUITE_PHASES if name in old and
+                              best[name] > old[name] * (1 + threshold) and best[name] - old[name] > MIN_DELTA]
+                    if not slower:
+                        break
+            except RecursionError:
+                print('%-12s %8d %10s' % (shape, n, 'RecursionError'))
+                continue
+            results[key] = best
+            print('%-12s %8d' % (shape, n) + ''.join(' %10.2f' % (best[name] * 1e3) for name in SUITE_PHASES))
+            for name in slower:
+                regressions.append((key, name, best[name], old[name]))
+    devnull.close()
+
+    if save:
+        file = open(path, 'w')
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.close()
+        print('baseline saved to %s' % path)
+    elif not baseline:
+        print('no baseline in %s, save one with --save-baseline' % path)
+    for key, name, new, old in regressions:
+        print('REGRESSION %s %s: %.2f ms, baseline %.2f ms (+%.0f%%)' % (key, name, new * 1e3, old * 1e3,
+                                                                          (new / old - 1) * 100))
+    return 1 if regressions else 0
+
+
+LOOPS = (
+    ('while', 'int x = 0;\nwhile(x < %d){\n    x = x + 1;\n}\n'),
+    ('for', 'int s = 0;\nfor(int i = 0; i < %d; i = i + 1){\n    s = s + i;\n}\n'),
+    ('do', 'int x = 0;\ndo{\n    x = x + 1;\n}while(x < %d);\n'),
+)
+
+
+# Loops inside loops with conditionals and arithmetic, n outer iterations
+NESTED_LOOP = '''float total = 0;
+for(int i = 0; i < %d; i = i + 1){
+    int j = 0;
+    while(j < 10){
+        if(j == 3){
+            total = total + i * 2;
+        } elif (j > 7) {
+            total = total - 1;
+        } else {
+            total = total + j / 2;
+        }
+        j = j + 1;
+    }
+}
+'''
+
+
+def bench_vm_loop(iterations):
+    # The while loop of script.txt, scaled up
+    print('%-8s %12s %10s %14s %14s' % ('loop', 'iterations', 'seconds', 'iterations/s', 'instructions/s'))
+    for name, source in LOOPS:
+        for n in iterations:
+            machine = vm.VM(Compiler().compile(source % n))
+            start = time.perf_counter()
+            machine.run()
+            elapsed = time.perf_counter() - start
+            print('%-8s %12d %10.3f %14.0f %14.0f' % (name, n, elapsed, n / elapsed, machine.steps / elapsed))
+
+
+# Loops for the loop optimizations, n iterations of the outer loop
+LOOP_KERNELS = (
+    ('invariant', '''float a = 3;
+float b = 4;
+float s = 0;
+int n = 0;
+while(n < %d){
+    s = s + a * b - b / a;
+    n = n + 1;
+}
+print s;
+'''),
+    ('strength', '''float s = 0;
+int n = 0;
+while(n < %d){
+    for(int j = 0; j < 40; j = j + 1){
+        s = s + j * 8 + 2 ^ j;
+    }
+    n = n + 1;
+}
+print s;
+'''),
+    ('counted', '''float s = 0;
+for(int i = 0; i < %d; i = i + 1){
+    for(int j = 0; j < 4; j = j + 1){
+        s = s + j * 2;
+    }
+}
+print s;
+'''),
+)
+LOOP_FLAGS = ((), ('hoist',), ('strength',), ('unroll',), ('hoist', 'strength', 'unroll'))
+
+
+def bench_loop_passes(iterations):
+    # Size of the emitted code and instructions executed and time on the
+    # virtual machine with every loop pass on its own and all of them, at -O0
+    # and -O2, checking the printed results stay the same and that programs
+    # failing in a loop print and fail as they do without optimizations
+    print('%-10s %10s %3s %-22s %8s %12s %10s %8s' % ('loop', 'iterations', '-O', 'passes', 'code', 'executed',
+                                                     'seconds', 'speedup'))
+    for name, source in LOOP_KERNELS:
+        for n in iterations:
+            text = source % n
+            for level in (0, 2):
+                expected = base = None
+                for loops in LOOP_FLAGS:
+                    program = Compiler(level, loops=loops).compile(text)
+                    elapsed = None
+                    for _ in range(3):
+                        out = []
+                        machine = vm.VM(program, out.append)
+                        start = time.perf_counter()
+                        machine.run()
+                        elapsed = min(elapsed or float('inf'), time.perf_counter() - start)
+                    if expected is None:
+                        expected, base = out, elapsed
+                    elif out != expected:
+                        print('%s with %s prints %s instead of %s' % (name, ' '.join(loops), out, expected))
+                        return 1
+                    print('%-10s %10d %3d %-22s %8d %12d %10.3f %8.2f' % (name, n, level, ' '.join(loops) or '-',
+                                                                         len(program), machine.steps, elapsed,
+                                                                         base / elapsed))
+    for level in (0, 2):
+        for loops in LOOP_FLAGS[1:]:
+            for failure in failing_failures(level, loops):
+                print('-O%d with %s: %s' % (level, ' '.join(loops), failure))
+                return 1
+
+
+# A loop testing short-circuit conditions, n iterations
+LOGIC_LOOP = '''int n = 0;
+int hits = 0;
+while(n < %d){
+    if(((n > 10) and (n < 1000)) or (n == 5)){
+        hits = hits + 1;
+    }
+    n = n + 1;
+}
+print hits;
+'''
+
+
+def bench_cfg(iterations):
+    # Instructions executed and time on the virtual machine running the
+    # structured code, stepping over its markers, and the code lowered to
+    # jumps, checking both print the same
+    print('%-8s %12s %10s %10s %12s %12s %10s %10s %8s' % ('loop', 'iterations', 'code', 'lowered', 'executed',
+                                                          'lowered', 'seconds', 'lowered', 'speedup'))
+    for name, source in LOOPS + (('nested', NESTED_LOOP), ('logic', LOGIC_LOOP)):
+        for n in iterations:
+            compiler = Compiler()
+            structured = compiler.generate(compiler.parse(source % n))
+            lowered = cfg.lower(structured)
+            results = []
+            for program in (structured, lowered):
+                out = []
+                machine = vm.VM(program, out.append)
+                start = time.perf_counter()
+                machine.run()
+                results.append((out, machine.steps, time.perf_counter() - start))
+            (out, steps, elapsed), (lowered_out, lowered_steps, lowered_elapsed) = results
+            if lowered_out != out:
+                print('%s lowered prints %s instead of %s' % (name, lowered_out, out))
+                return 1
+            print('%-8s %12d %10d %10d %12d %12d %10.3f %10.3f %8.2f' % (
+                name, n, len(structured), len(lowered), steps, lowered_steps, elapsed, lowered_elapsed,
+                elapsed / lowered_elapsed))
+
+
+# Constants hostile to folding, every one has to compile in bounded time
+FOLDING = (
+    ('power', lambda n: 'int j = %s9%s;\nprint j;\n' % ('9 ^ (' * n, ')' * n)),
+    ('squares', lambda n: 'int x = 3;\n%sprint x;\n' % ('x = x * x;\n' * n)),
+    ('doubling', lambda n: 'string s = "ab";\n%sprint s;\n' % ('s = s + s;\n' * n)),
+    ('zero', lambda n: 'float x = 1;\n%sprint x;\n' % ('x = x / 0;\n' * n)),
+    ('nested', lambda n: 'int x = %s1%s;\nprint x;\n' % ('(2 * ' * n, ')' * n)),
+    ('counter', lambda n: 'int x = 0;\nfor (int i = 1000000000; i < %d; i = i + 1) {\n    x = 7 ^ i;\n}\n'
+                          'print x;\n' % (1000000000 + n)),
+    ('loops', lambda n: 'float x = 0;\n%sprint x;\n'
+                        % ('for (float i = 0.5; i < 90000; i = i + 1) {\n    x = x + i * 3;\n}\n' * n)),
+)
+
+
+# Seconds any hostile case may take to compile
+MAX_FOLDING_SECONDS = 2.0
+
+
+def folding_failures(level):
+    # What goes wrong folding the cases the limits are for at a level, the
+    # failures as text
+    failures = []
+    # Parsed as ((9 ^ 9) ^ 9) ^ 9, the last power is past the limit
+    program = Compiler(level).compile('int j = 9 ^ 9 ^ 9 ^ 9;\nprint j;\n')
+    if ir.IPOW not in [ins.op for ins in program]:
+        failures.append('9 ^ 9 ^ 9 ^ 9 was folded')
+    out = []
+    vm.run(program, out.append)
+    if out != [str(9 ** 729)]:
+        failures.append('9 ^ 9 ^ 9 ^ 9 prints a wrong value')
+    compiler = Compiler(level)
+    compiler.fold_limits = (4096, 4096, optimizer.MAX_FOLDING_STEPS)
+    if ir.IPOW in [ins.op for ins in compiler.compile('int j = 9 ^ 9 ^ 9 ^ 9;\nprint j;\n')]:
+        failures.append('9 ^ 9 ^ 9 ^ 9 was not folded within a limit of 4096 bits')
+    program = Compiler(level).compile('float x = 1 / 0;\nprint x;\n')
+    try:
+        vm.run(program, lambda text: None)
+        failures.append('1 / 0 ran')
+    except vm.VMError:
+        pass
+    program = Compiler(level).compile(dict(FOLDING)['nested'](1000))
+    if [ins.op for ins in program if ins.op != ir.MOVE and ins.op != ir.PRINT]:
+        failures.append('2 * (2 * ... 1) nested 1000 deep was not folded')
+    # Each product is a step, the ones past the budget are left to run time
+    compiler = Compiler(level)
+    compiler.fold_limits = optimizer.LIMITS[:2] + (100,)
+    program = compiler.compile(dict(FOLDING)['nested'](1000))
+    if ir.IMUL not in [ins.op for ins in program]:
+        failures.append('2 * (2 * ... 1) nested 1000 deep was folded in 100 steps')
+    out = []
+    vm.run(program, out.append)
+    if out != [str(2 ** 1000)]:
+        failures.append('2 * (2 * ... 1) folded in 100 steps prints a wrong value')
+    return failures
+
+
+# Programs failing at run time after printing, compiled at any level they
+# have to print the same and fail the same as without optimizations
+FAILING = (
+    ('division', 'float g;\nint b = 0;\ng = 1 / b;\nprint "hi";\ng = 2.0;\nprint g;\n'),
+    ('conversion', 'int b = 10 ^ 400;\nfloat f;\nf = b;\nprint "hi";\nf = 1.0;\nprint f;\n'),
+    ('undeclared', 'int x;\nx = y + 1;\nprint "hi";\nx = 2;\nprint x;\n'),
+    ('hoisted', 'int b = 10 ^ 400;\nfloat f;\nfor(int i = 0; i < 3; i = i + 1){\n    print i;\n    f = b;\n}\n'),
+    ('unrolled', 'int b = 0;\nfloat g;\nfor(int i = 0; i < 4; i = i + 1){\n    print i;\n    g = i / b;\n}\n'
+                 'print g;\n'),
+    ('untyped', 'int x;\nfor(int i = 0; i < 3; i = i + 1){\n    print i;\n    x = y * 2;\n}\nprint x;\n'),
+)
+
+
+def run_failing(program):
+    # What a program prints and whether it fails
+    out = []
+    try:
+        vm.run(program, out.append)
+    except vm.VMError:
+        return out, True
+    return out, False
+
+
+def failing_failures(level, loops=()):
+    # The programs of FAILING that print or fail differently at a level with
+    # the loop passes in loops, as text
+    failures = []
+    for name, text in FAILING:
+        expected = run_failing(Compiler().compile(text))
+        out = run_failing(Compiler(level, loops=loops).compile(text))
+        if out != expected:
+            failures.append('%s prints %s and %s instead of %s and %s' % (
+                name, out[0], 'fails' if out[1] else 'succeeds', expected[0],
+                'fails' if expected[1] else 'succeeds'))
+    return failures
+
+
+def bench_folding():
+    # Compile time of programs whose constants would grow without bound if
+    # folded, at every level with all loop passes, then checks that what is
+    # past the limits is left to run time and the rest still folds, and that
+    # no optimization removes an operation failing at run time
+    print('%-10s %8s %6s %12s %10s' % ('case', 'size', 'level', 'instructions', 'ms'))
+    status = 0
+    for name, make in FOLDING:
+        for n in (10, 100, 1000):
+            text = make(n)
+            for level in (0, 1, 2):
+                start = time.perf_counter()
+                program = Compiler(level, loops=('hoist', 'strength', 'unroll')).compile(text)
+                elapsed = time.perf_counter() - start
+                print('%-10s %8d %6d %12d %10.2f' % (name, n, level, len(program), elapsed * 1000))
+                if elapsed > MAX_FOLDING_SECONDS:
+                    print('%s of size %d takes longer than %.1f s to compile' % (name, n, MAX_FOLDING_SECONDS))
+                    status = 1
+    for level in (1, 2):
+        for failure in folding_failures(level) + failing_failures(level):
+            print('-O%d: %s' % (level, failure))
+            status = 1
+    return status
+
+
+def bench_backends(iterations):
+    # Running the same loops on the virtual machine, by walking the syntax
+    # tree and as Python bytecode, and the time to translate the tree to a
+    # code object or to load it again from the cache
+    print('%-8s %12s %10s %10s %10s %8s %8s %10s %10s' % ('loop', 'iterations', 'vm s', 'tree s', 'python s',
+                                                           'vs vm', 'vs tree', 'compile ms', 'cached ms'))
+    for name, source in LOOPS + (('nested', NESTED_LOOP),):
+        for n in iterations:
+            text = source % n
+            compiler = Compiler()
+            prog = compiler.parse(text)
+            compiler.generate(prog)
+            machine = vm.VM(compiler.lower())
+            start = time.perf_counter()
+            machine.run()
+            vm_time = time.perf_counter() - start
+            start = time.perf_counter()
+            interpreter.run(prog)
+            tree_time = time.perf_counter() - start
+            start = time.perf_counter()
+            compile(pycode.translate(prog), '<program>', 'exec')
+            translate = time.perf_counter() - start
+            pycode.load(text, prog=prog)
+            start = time.perf_counter()
+            code = pycode.load(text)
+            load = time.perf_counter() - start
+            start = time.perf_counter()
+            pycode.run(code)
+            python_time = time.perf_counter() - start
+            print('%-8s %12d %10.3f %10.3f %10.3f %8.1f %8.1f %10.2f %10.3f' % (
+                name, n, vm_time, tree_time, python_time, vm_time / python_time, tree_time / python_time,
+                translate * 1e3, load * 1e3))
+
+
+DEEP_EXPRESSIONS = (
+    ('sum', lambda n: 'int x = %s;\nprint x;\n' % ' + '.join(['1'] * n), lambda n: str(n)),
+    ('and', lambda n: 'boolean b = %s;\nprint b;\n' % ' and '.join(['true'] * n), lambda n: 'true'),
+    ('or', lambda n: 'boolean b = %s or true;\nprint b;\n' % ' or '.join(['false'] * n), lambda n: 'true'),
+    ('negate', lambda n: 'float g = 2.5;\nfloat f = %sg%s;\nprint f;\n' % ('-(' * n, ')' * n),
+     lambda n: '2.5' if n % 2 == 0 else '-2.5'),
+)
+
+
+def bench_deep_expressions(terms):
+    # Long and deeply nested expressions on every backend, which evaluate
+    # them without recursing, checking they all print the right value
+    print('%-8s %8s %10s %10s %10s %10s' % ('shape', 'terms', 'vm ms', 'tree ms', 'python ms', 'profiled ms'))
+    for name, make, expected in DEEP_EXPRESSIONS:
+        for n in terms:
+            text = make(n)
+            compiler = Compiler()
+            prog = compiler.parse(text)
+            compiler.generate(prog)
+            program = compiler.lower()
+            runs = (
+                lambda out: vm.run(program, out),
+                lambda out: interpreter.run(prog, out),
+                lambda out: pycode.run(compile(pycode.translate(prog), '<program>', 'exec'), out),
+                lambda out: profiler.run(prog, out),
+            )
+            times = []
+            for run in runs:
+                out = []
+                start = time.perf_counter()
+                try:
+                    run(out.append)
+                except RecursionError:
+                    out = ['RecursionError']
+                times.append((time.perf_counter() - start) * 1e3)
+                if out != [expected(n)]:
+                    print('%s of %d terms prints %s instead of %s' % (name, n, out, expected(n)))
+                    return 1
+            print('%-8s %8d %10.2f %10.2f %10.2f %10.2f' % ((name, n) + tuple(times)))
+
+
+def bench_hotspots(iterations):
+    # Walking the syntax tree with and without the counters and loop timers
+    # of the profiler, checking both print the same
+    print('%-8s %12s %10s %10s %10s %8s' % ('loop', 'iterations', 'tree s', 'profiled s', 'overhead', 'loops'))
+    for name, source in LOOPS + (('nested', NESTED_LOOP),):
+        for n in iterations:
+            prog = Compiler().parse(source % n)
+            results = []
+            for machine in (interpreter.Interpreter(), profiler.Profiler()):
+                out = []
+                machine.out = out.append
+                start = time.perf_counter()
+                machine.run(prog)
+                results.append((out, time.perf_counter() - start))
+            (out, plain), (profiled_out, profiled) = results
+            if profiled_out != out:
+                print('%s profiled prints %s instead of %s' % (name, profiled_out, out))
+                return 1
+            print('%-8s %12d %10.3f %10.3f %9.1f%% %8d' % (name, n, plain, profiled, (profiled / plain - 1) * 100,
+                                                            len(machine.loops)))
+
+
+def time_python(code, env, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], env=env, check=True,
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def bench_startup(runs):
+    # Whole process time, cold runs start from an empty table cache
+    compile_one = "import compiler; compiler.compile_source('int x = 1;')"
+    print('%-12s %10s %10s' % ('case', 'median ms', 'min ms'))
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        cold = []
+        for i in range(runs):
+            env['SIMPLE_COMPILER_CACHE'] = os.path.join(tmp, 'cold%d' % i)
+            cold += time_python(compile_one, env, 1)
+        env['SIMPLE_COMPILER_CACHE'] = os.path.join(tmp, 'warm')
+        time_python(compile_one, env, 1)
+        cases = (
+            ('python', time_python('pass', env, runs)),
+            ('import', time_python('import compiler', env, runs)),
+            ('cold start', cold),
+            ('warm start', time_python(compile_one, env, runs)),
+        )
+    for name, times in cases:
+        print('%-12s %10.1f %10.1f' % (name, statistics.median(times) * 1e3, min(times) * 1e3))
+
+
+def percentile(times, p):
+    # Nearest rank percentile
+    times = sorted(times)
+    return times[max(0, min(len(times), -(-len(times) * p // 100)) - 1)]
+
+
+def bench_daemon(runs):
+    # Latency of compiling script.txt in a new process each time, with the
+    # thin client of a running compile server, the script in its cache or
+    # changed before every run, and of the requests alone, also while
+    # another client keeps the server running a long program
+    here = os.path.dirname(os.path.abspath(__file__))
+    file = open(os.path.join(here, 'script.txt'))
+    script = file.read()
+    file.close()
+    print('%-14s %8s %10s %10s %10s' % ('case', 'runs', 'p50 ms', 'p99 ms', 'speedup'))
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env['SIMPLE_COMPILER_CACHE'] = os.path.join(tmp, 'cache')
+        env['SIMPLE_COMPILER_SOCKET'] = path = os.path.join(tmp, 'daemon.sock')
+        server = subprocess.Popen([sys.executable, os.path.join(here, 'daemon.py'), '--socket', path], env=env,
+                                  stdout=subprocess.DEVNULL)
+        try:
+            while not client.listening(path):
+                if server.poll() is not None:
+                    print('the server did not start')
+                    return 1
+                time.sleep(0.05)
+
+            def timed(count, changed, run):
+                times = []
+                for i in range(count):
+                    file = open(os.path.join(tmp, 'script.txt'), 'w')
+                    file.write('int changed = %d;\n%s' % (i, script) if changed else script)
+                    file.close()
+                    start = time.perf_counter()
+                    run()
+                    times.append(time.perf_counter() - start)
+                return times
+
+            def process(name):
+                subprocess.run([sys.executable, os.path.join(here, name)], env=env, cwd=tmp, check=True,
+                               stdout=subprocess.DEVNULL)
+
+            def request():
+                if client.request(path, [], tmp)['status']:
+                    raise RuntimeError('compile failed')
+
+            busy = os.path.join(tmp, 'busy')
+            os.makedirs(busy)
+            stop = threading.Event()
+
+            def keep_busy():
+                # A changed loop of a few million steps every time, so it
+                # is never in the cache
+                i = 0
+                while not stop.is_set():
+                    i += 1
+                    file = open(os.path.join(busy, 'script.txt'), 'w')
+                    file.write('int x = %d;\nwhile(x < %d){\n    x = x + 1;\n}\n' % (i, i + 1000000))
+                    file.close()
+                    client.request(path, ['--run', '--max-steps', '100000000', '--no-tree', '-o', '-'], busy)
+
+            def while_busy(count):
+                thread = threading.Thread(target=keep_busy)
+                thread.start()
+                try:
+                    time.sleep(0.2)
+                    return timed(count, False, request)
+                finally:
+                    stop.set()
+                    thread.join()
+
+            # Warms the table cache
+            timed(1, False, lambda: process('compiler.py'))
+            cases = (
+                ('cold', timed(runs * 10, False, lambda: process('compiler.py'))),
+                ('client hit', timed(runs * 10, False, lambda: process('client.py'))),
+                ('client miss', timed(runs * 10, True, lambda: process('client.py'))),
+                ('request hit', timed(runs * 100, False, request)),
+                ('request miss', timed(runs * 100, True, request)),
+                ('request busy', while_busy(runs * 100)),
+            )
+        finally:
+            server.terminate()
+            server.wait()
+    cold = percentile(cases[0][1], 50)
+    for name, times in cases:
+        print('%-14s %8d %10.2f %10.2f %10.1f' % (name, len(times), percentile(times, 50) * 1e3,
+                                                  percentile(times, 99) * 1e3, cold / percentile(times, 50)))
+
+
+def bench_batch(scripts):
+    # Throughput of compiling a directory of scripts, one process per script
+    # as before batch mode and in a batch with a growing number of workers
+    here = os.path.dirname(os.path.abspath(__file__))
+    cpus = os.cpu_count() or 1
+    print('%-10s %8s %10s %12s %12s %10s' % ('mode', 'workers', 'seconds', 'scripts/s', 'lines/s', 'speedup'))
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        lines = 0
+        for i in range(scripts):
+            text = random_program(50, seed=i)
+            lines += batch.count_lines(text)
+            paths.append(os.path.join(tmp, 's%d.txt' % i))
+            file = open(paths[-1], 'w')
+            file.write(text)
+            file.close()
+
+        # Processes are slow enough that a sample of the scripts will do
+        sample = paths[:max(1, min(scripts, 20))]
+        start = time.perf_counter()
+        for path in sample:
+            subprocess.run([sys.executable, os.path.join(here, 'compiler.py'), path, '-j', '1'], check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        elapsed = (time.perf_counter() - start) * scripts / len(sample)
+        print('%-10s %8d %10.3f %12.1f %12.0f' % ('process', 1, elapsed, scripts / elapsed, lines / elapsed))
+
+        jobs = [(path, os.path.splitext(path)[0] + '.out') for path in paths]
+        single = None
+        for workers in sorted(set([1, 2, 4, cpus])):
+            start = time.perf_counter()
+            for result in batch.compile_files(jobs, workers):
+                pass
+            elapsed = time.perf_counter() - start
+            single = single or elapsed
+            print('%-10s %8d %10.3f %12.1f %12.0f %10.2f' % ('batch', workers, elapsed, scripts / elapsed,
+                                                            lines / elapsed, single / elapsed))
+    print('%d CPUs' % cpus)
+
+
+def bench_parallel_lex(sizes):
+    # Lexing one large script serially and in chunks over a growing number of
+    # worker processes, checking the tokens are the same
+    cpus = os.cpu_count() or 1
+    print('%-10s %8s %10s %10s %10s' % ('statements', 'workers', 'tokens', 'seconds', 'speedup'))
+    for n in sizes:
+        text = flat_program(n, 100)
+        c = Compiler()
+        start = time.perf_counter()
+        serial = c.tokenize(text, c.lexer)
+        single = time.perf_counter() - start
+        expected = [(tok.type, tok.value, tok.lineno, tok.lexpos) for tok in serial]
+        del serial
+        print('%-10d %8s %10d %10.3f %10.2f' % (n, 'serial', len(expected), single, 1.0))
+        for workers in sorted(set([2, 4, cpus]) - set([1])):
+            c.lex_jobs = workers
+            start = time.perf_counter()
+            toks = c.tokenize(text, c.lexer)
+            elapsed = time.perf_counter() - start
+            if [(tok.type, tok.value, tok.lineno, tok.lexpos) for tok in toks] != expected:
+                print('chunked tokens differ from the serial lexer')
+                return 1
+            print('%-10d %8d %10d %10.3f %10.2f' % (n, workers, len(toks), elapsed, single / elapsed))
+    print('%d CPUs' % cpus)
+
+
+def bench_dfa_lex(sizes):
+    # Tokens per second of the PLY master regex and of the automaton of
+    # dfa.py over the same large sources, checking the tokens are the same
+    inputs = (
+        ('flat', lambda n: flat_program(n, 100)),
+        ('strings', lambda n: string_program(n // 2)),
+        ('long', lambda n: identifier_program(n // 50)),
+    )
+    print('%-10s %-8s %8s %10s %10s %12s %12s %8s' % (
+        'statements', 'input', 'MB', 'tokens', 'seconds', 'ply tok/s', 'dfa tok/s', 'speedup'))
+    for n in sizes:
+        for name, make in inputs:
+            text = make(n)
+            c = Compiler()
+            times = []
+            streams = []
+            for lexer in (c.lexer, dfa.DfaLexer()):
+                lexer.compiler = c
+                lexer.lineno = 1
+                start = time.perf_counter()
+                toks = c.tokenize(text, lexer)
+                times.append(time.perf_counter() - start)
+                streams.append([(tok.type, tok.value, tok.lineno, tok.lexpos) for tok in toks])
+                del toks
+            if streams[0] != streams[1]:
+                print('dfa tokens differ from the PLY lexer on %s' % name)
+                return 1
+            count = len(streams[0])
+            del streams
+            print('%-10d %-8s %8.1f %10d %10.3f %12.0f %12.0f %8.2f' % (
+                n, name, len(text) / 1e6, count, times[1], count / times[0], count / times[1], times[0] / times[1]))
+
+
+BENCHMARKS = {
+    'batch': lambda args: bench_batch(args.scripts),
+    'backends': lambda args: bench_backends(args.iterations),
+    'cfg': lambda args: bench_cfg(args.iterations),
+    'codegen': lambda args: bench_codegen(args.sizes, args.repeat),
+    'daemon': lambda args: bench_daemon(args.runs),
+    'deep_expressions': lambda args: bench_deep_expressions([1000, 5000, 20000]),
+    'dfa_lex': lambda args: bench_dfa_lex(args.sizes),
+    'folding': lambda args: bench_folding(),
+    'hotspots': lambda args: bench_hotspots(args.iterations),
+    'incremental': lambda args: bench_incremental(args.sizes),
+    'mapped_memory': lambda args: bench_mapped_memory(args.sizes),
+    'long_expression': lambda args: bench_long_expression(args.sizes),
+    'loop_passes': lambda args: bench_loop_passes(args.iterations),
+    'ir_memory': lambda args: bench_ir_memory(args.sizes),
+    'startup': lambda args: bench_startup(args.runs),
+    'stream_memory': lambda args: bench_stream_memory(args.sizes),
+    'tree': lambda args: bench_tree(args.sizes, args.repeat),
+    'suite': lambda args: bench_suite(args.baseline, args.save_baseline, args.threshold, args.repeat),
+    'vm_loop': lambda args: bench_vm_loop(args.iterations),
+    'parse_scaling': lambda args: bench_parse_scaling(args.sizes),
+    'parallel_lex': lambda args: bench_parallel_lex(args.sizes),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simple-Compiler benchmarks')
+    parser.add_argument('names', nargs='*', help='benchmarks to run: %s' % ', '.join(sorted(BENCHMARKS)))
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help='program sizes in statements')
+    parser.add_argument('--iterations', type=int, nargs='+', default=[100000, 1000000, 5000000],
+                        help='loop iterations for execution benchmarks')
+    parser.add_argument('--scripts', type=int, default=200, help='scripts compiled by the batch benchmark')
+    parser.add_argument('--runs', type=int, default=10, help='repetitions for process level benchmarks')
+    parser.add_argument('--repeat', type=int, default=5, help='runs of every suite case, the fastest counts')
+    parser.add_argument('--baseline', default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                           'benchmark_baseline.json'),
+                        help='baseline file of the suite (default benchmark_baseline.json)')
+    parser.add_argument('--save-baseline', action='store_true', help='store the suite results as the baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='slowdown of a suite phase over the baseline that fails, as a fraction (default 0.25)')
+    args = parser.parse_args(argv)
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error('unknown benchmark %r' % name)
+    status = 0
+    for name in args.names or sorted(BENCHMARKS):
+        print('== %s ==' % name)
+        status = BENCHMARKS[name](args) or status
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
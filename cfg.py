@@ -0,0 +1,322 @@
+import re
+
+import ir
+
+# Lowering structured code to jumps, and the control flow graph of the result.
+#
+# Every block marker is replaced by the jumps it stands for: a test becomes a
+# conditional jump past its arm, the end of an arm followed by elif or else a
+# jump to the end of the chain. While and for loops are rotated, their test
+# code moves after the body and jumps back to it while it holds, so an
+# iteration runs a single jump; a do-while loop ends in one the same way.
+# Jumps are first made to numbered labels, placed in the code as it is
+# lowered, and resolved to instruction offsets once the code is complete. A
+# jump to the instruction right after it is dropped.
+#
+# A Graph splits lowered code into basic blocks, straight line code entered
+# only at its first instruction and left only after its last, and works out
+# which operands are live into and out of every block and the immediate
+# dominator of every block.
+
+
+# Opcodes that only structured code has, and a table translating the opcode
+# column to 1 for them and 0 for the rest
+STRUCTURED = frozenset(ir.MARKERS) | frozenset([ir.TEST])
+_flags = bytes(int(op in STRUCTURED) for op in range(256))
+
+
+def lower(program, base=0):
+    # Lowered copy of a structured ir.Program, sharing its operand table. Jump
+    # targets are offsets counted from base.
+    ops = program.ops
+    conditions = program.a
+    size = len(ops)
+    # Only the markers are visited, the code between them is copied in runs
+    marks = [m.start() for m in re.finditer(b'\x01', ops.tobytes().translate(_flags))]
+    marks.append(size)
+
+    # The lowered code is a list of entries: a range of instructions copied
+    # as they are, (opcode, condition, label) for a jump and -1 - n for the
+    # place of label n. The code of a while or for loop is collected on its
+    # own until its test is known, the code around it waits in outer.
+    seq = []
+    outer = []
+    # Open blocks as [opener, label of the loop head or the arm's end, label
+    # of a do-while exit, whether it has a test, test code of a rotated loop]
+    blocks = []
+    # End labels of the open if/elif/else chains
+    chains = []
+    count = 0
+    run = 0
+    for pc in marks:
+        if run < pc:
+            seq.append(range(run, pc))
+        run = pc + 1
+        if pc == size:
+            break
+        op = ops[pc]
+        if op in ir.OPENERS:
+            block = [op, None, None, False, None]
+            blocks.append(block)
+            if op == ir.IF:
+                chains.append(count)
+                count += 1
+            elif op in ir.LOOPS:
+                block[1] = count
+                count += 1
+                if op == ir.DO:
+                    seq.append(-1 - block[1])
+                else:
+                    seq.append((ir.JUMP, -1, block[1]))
+                    outer.append(seq)
+                    seq = []
+        elif op == ir.TEST or op == ir.DO_WHILE:
+            if not blocks:
+                raise ValueError('%s outside of a block at instruction %d' % (ir.MARKERS.get(op, 'test'), pc))
+            if op == ir.DO_WHILE:
+                continue
+            block = blocks[-1]
+            block[3] = True
+            kind = block[0]
+            following = ops[pc + 1] if pc + 1 < size else None
+            if kind == ir.IF or kind == ir.ELIF:
+                if (following == ir.END_IF or following == ir.END_ELIF) and pc + 2 < size and ops[pc + 2] in (
+                        ir.ELIF, ir.ELSE):
+                    # An empty arm, the rest of the chain runs unless it holds
+                    seq.append((ir.JUMP_IF, conditions[pc], chains[-1]))
+                else:
+                    block[1] = count
+                    count += 1
+                    seq.append((ir.JUMP_UNLESS, conditions[pc], block[1]))
+            elif kind == ir.DO:
+                if following == ir.END_DO:
+                    seq.append((ir.JUMP_IF, conditions[pc], block[1]))
+                    block[4] = True
+                else:
+                    block[2] = count
+                    count += 1
+                    seq.append((ir.JUMP_UNLESS, conditions[pc], block[2]))
+            else:
+                # The test code so far goes after the body
+                block[4] = (seq, conditions[pc], count)
+                seq = outer.pop()
+                seq.append(-1 - count)
+                count += 1
+        else:
+            if not blocks or ir.OPENERS[blocks[-1][0]] != op:
+                raise ValueError('unmatched %s at instruction %d' % (ir.MARKERS[op], pc))
+            kind, label, after, tested, rotated = blocks.pop()
+            if kind == ir.IF or kind == ir.ELIF:
+                if pc + 1 < size and ops[pc + 1] in (ir.ELIF, ir.ELSE):
+                    if label is not None or not tested:
+                        seq.append((ir.JUMP, -1, chains[-1]))
+                    if label is not None:
+                        seq.append(-1 - label)
+                else:
+                    if label is not None:
+                        seq.append(-1 - label)
+                    seq.append(-1 - chains.pop())
+            elif kind == ir.ELSE:
+                seq.append(-1 - chains.pop())
+            elif kind == ir.DO:
+                if rotated is None:
+                    seq.append((ir.JUMP, -1, label))
+                if after is not None:
+                    seq.append(-1 - after)
+            elif rotated is not None:
+                test, condition, body = rotated
+                seq.append(-1 - label)
+                seq.extend(test)
+                seq.append((ir.JUMP_IF, condition, body))
+            else:
+                # No test, the loop only ends by jumping back
+                body = seq
+                seq = outer.pop()
+                seq[-1] = -1 - label
+                seq.extend(body)
+                seq.append((ir.JUMP, -1, label))
+    if blocks:
+        raise ValueError('unterminated %s' % ir.MARKERS[blocks[-1][0]])
+
+    # Jumps to the instruction right after them go, then every label gets
+    # the offset of the instruction following it
+    kept = []
+    for i, entry in enumerate(seq):
+        if type(entry) is tuple:
+            place = -1 - entry[2]
+            j = i + 1
+            while j < len(seq) and type(seq[j]) is int and seq[j] != place:
+                j += 1
+            if j < len(seq) and seq[j] == place:
+                continue
+        kept.append(entry)
+    where = [0] * count
+    offset = base
+    for entry in kept:
+        t = type(entry)
+        if t is range:
+            offset += len(entry)
+        elif t is int:
+            where[-1 - entry] = offset
+        else:
+            offset += 1
+
+    out = program.shared()
+    out.temps = program.temps
+    columns = ((out.ops, ops), (out.dest, program.dest), (out.a, program.a), (out.b, program.b))
+    for entry in kept:
+        t = type(entry)
+        if t is range:
+            for column, code in columns:
+                column.extend(code[entry.start:entry.stop])
+        elif t is tuple:
+            op, condition, label = entry
+            if op == ir.JUMP:
+                out.emit(op, -1, out.label(where[label]))
+            else:
+                out.emit(op, -1, condition, out.label(where[label]))
+    return out
+
+
+def uses(instr):
+    # Variables and temporaries an instruction reads
+    return [operand for operand in (instr.a, instr.b) if operand is not None and operand[0] in (ir.TEMP, ir.NAME)]
+
+
+class Block:
+    # Instructions start to end, not included, of lowered code and the
+    # indexes of the blocks control can go to next and come from
+    __slots__ = ('start', 'end', 'succs', 'preds')
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        self.succs = []
+        self.preds = []
+
+
+class Graph:
+    def __init__(self, program):
+        self.code = list(program)
+        code = self.code
+        size = len(code)
+        leaders = set([0])
+        for pc, instr in enumerate(code):
+            if instr.op in ir.JUMPS:
+                leaders.add(target(instr))
+                leaders.add(pc + 1)
+        starts = sorted(pc for pc in leaders if pc < size)
+        self.blocks = [Block(start, end) for start, end in zip(starts, starts[1:] + [size])]
+        self.index = dict((block.start, i) for i, block in enumerate(self.blocks))
+        for i, block in enumerate(self.blocks):
+            last = code[block.end - 1]
+            following = []
+            if last.op != ir.JUMP:
+                following.append(block.end)
+            if last.op in ir.JUMPS:
+                following.append(target(last))
+            for pc in following:
+                # The end of the code is no block
+                if pc < size and self.index[pc] not in block.succs:
+                    block.succs.append(self.index[pc])
+                    self.blocks[self.index[pc]].preds.append(i)
+
+    def liveness(self):
+        # Operands live on entry to and exit from every block, nothing is
+        # live at the end of the code. Solved backwards until nothing changes.
+        gen = []
+        kill = []
+        for block in self.blocks:
+            read = set()
+            written = set()
+            for instr in self.code[block.start:block.end]:
+                for operand in uses(instr):
+                    if operand not in written:
+                        read.add(operand)
+                if instr.dest is not None:
+                    written.add(instr.dest)
+            gen.append(read)
+            kill.append(written)
+        live_in = [set() for _ in self.blocks]
+        live_out = [set() for _ in self.blocks]
+        changed = True
+        while changed:
+            changed = False
+            for i in range(len(self.blocks) - 1, -1, -1):
+                out = set()
+                for succ in self.blocks[i].succs:
+                    out |= live_in[succ]
+                new = gen[i] | (out - kill[i])
+                if new != live_in[i] or out != live_out[i]:
+                    live_in[i] = new
+                    live_out[i] = out
+                    changed = True
+        return live_in, live_out
+
+    def postorder(self):
+        # Blocks reachable from the entry, every one after its successors
+        # on the depth first walk
+        if not self.blocks:
+            return []
+        order = []
+        seen = set([0])
+        stack = [(0, iter(self.blocks[0].succs))]
+        while stack:
+            i, succs = stack[-1]
+            for succ in succs:
+                if succ not in seen:
+                    seen.add(succ)
+                    stack.append((succ, iter(self.blocks[succ].succs)))
+                    break
+            else:
+                stack.pop()
+                order.append(i)
+        return order
+
+    def dominators(self):
+        # Immediate dominator of every block, None for the entry and blocks
+        # that can't be reached. The iterative algorithm of Cooper, Harvey
+        # and Kennedy over the reverse postorder.
+        order = self.postorder()
+        number = dict((i, n) for n, i in enumerate(order))
+        idom = [None] * len(self.blocks)
+        if not order:
+            return idom
+        idom[0] = 0
+
+        def intersect(x, y):
+            while x != y:
+                while number[x] < number[y]:
+                    x = idom[x]
+                while number[y] < number[x]:
+                    y = idom[y]
+            return x
+
+        changed = True
+        while changed:
+            changed = False
+            for i in reversed(order[:-1]):
+                new = None
+                for pred in self.blocks[i].preds:
+                    if idom[pred] is not None:
+                        new = pred if new is None else intersect(pred, new)
+                if new != idom[i]:
+                    idom[i] = new
+                    changed = True
+        idom[0] = None
+        return idom
+
+    def lines(self):
+        # One line per block: its instructions, the blocks it goes to, its
+        # immediate dominator and the operands live on entry
+        live_in = self.liveness()[0]
+        idom = self.dominators()
+        for i, block in enumerate(self.blocks):
+            yield 'B%d %d-%d -> %s, idom %s, live in: %s' % (
+                i, block.start, block.end - 1, ' '.join('B%d' % succ for succ in block.succs) or '-',
+                '-' if idom[i] is None else 'B%d' % idom[i],
+                ' '.join(sorted(ir.operand_text(operand) for operand in live_in[i])) or '-')
+
+
+def target(instr):
+    return instr.a[1] if instr.op == ir.JUMP else instr.b[1]
@@ -0,0 +1,134 @@
+import re
+
+from ply.lex import LexToken
+
+from compiler import build
+
+# Lexing one large source in chunks over a pool of worker processes. The
+# text is cut right after a ';', '{' or '}' that is outside a string, where
+# the serial lexer always starts a new token, every chunk is lexed by the
+# same PLY lexer in a worker and the token streams are joined in order with
+# the line number and position of every token moved by the lines and
+# characters before its chunk. A string can't span lines and no other token
+# holds a quote, so matching the string rule from the start of a line finds
+# the strings the lexer finds there and whether a character is inside one
+# only depends on its line. Errors are reported in the order the serial
+# lexer reports them.
+
+# Smaller chunks are not worth a process
+MIN_CHUNK = 1 << 20
+
+_boundary = re.compile(r'[;{}]')
+# The lexer rule for strings
+_string = re.compile(r'"(?:[^"\\\n]|\\.)*"')
+
+_lexer = None
+
+
+class _Errors(list):
+    # Takes the place of the compiler in a worker, collecting lexer errors
+    def error(self, msg):
+        self.append(msg)
+
+
+def safe_cut(text, pos):
+    # Offset just after the first boundary at or after pos, None if there is
+    # none. A line is searched from its start for its strings.
+    line = text.rfind('\n', 0, pos) + 1
+    size = len(text)
+    while line < size:
+        end = text.find('\n', line)
+        if end < 0:
+            end = size
+        search = max(pos, line)
+        strings = _string.finditer(text, line, end)
+        string = next(strings, None)
+        while True:
+            m = _boundary.search(text, search, end)
+            if m is None:
+                break
+            while string is not None and string.end() <= m.start():
+                string = next(strings, None)
+            if string is not None and string.start() < m.start():
+                search = string.end()
+                continue
+            return m.end()
+        line = end + 1
+    return None
+
+
+def cuts(text, parts):
+    # Chunk offsets from 0 to len(text), at most parts chunks of at least
+    # MIN_CHUNK characters, fewer when no boundary is found
+    size = len(text)
+    step = max(size // max(parts, 1), MIN_CHUNK)
+    offsets = [0]
+    while len(offsets) < parts and offsets[-1] + step < size:
+        cut = safe_cut(text, offsets[-1] + step)
+        if cut is None or cut >= size:
+            break
+        offsets.append(cut)
+    offsets.append(size)
+    return offsets
+
+
+def init():
+    global _lexer
+    _lexer = build()[0].clone()
+    _lexer.compiler = _Errors()
+
+
+def lex_chunk(chunk):
+    # Runs in a worker. Returns the types, values, line numbers and
+    # positions of the tokens of chunk, each counted from the chunk, and the
+    # errors.
+    lexer = _lexer
+    lexer.compiler = errors = _Errors()
+    lexer.lineno = 1
+    lexer.input(chunk)
+    types = []
+    values = []
+    lines = []
+    positions = []
+    for tok in iter(lexer.token, None):
+        types.append(tok.type)
+        values.append(tok.value)
+        lines.append(tok.lineno)
+        positions.append(tok.lexpos)
+    return types, values, lines, positions, errors
+
+
+def tokenize(text, workers, compiler):
+    # The tokens of text as the serial lexer returns them, lexed in up to
+    # workers chunks. Errors are added to compiler.
+    offsets = cuts(text, workers)
+    if len(offsets) <= 2:
+        lexer = compiler.lexer
+        lexer.lineno = 1
+        lexer.input(text)
+        return list(iter(lexer.token, None))
+    import multiprocessing
+
+    build()
+    chunks = [text[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+    pool = multiprocessing.Pool(min(workers, len(chunks)), init)
+    try:
+        results = pool.map(lex_chunk, chunks, 1)
+    finally:
+        pool.terminate()
+        pool.join()
+
+    toks = []
+    append = toks.append
+    line = 0
+    for start, chunk, (types, values, lines, positions, errors) in zip(offsets, chunks, results):
+        compiler.errors.extend(errors)
+        for i in range(len(types)):
+            tok = LexToken()
+            tok.type = types[i]
+            tok.value = values[i]
+            tok.lineno = lines[i] + line
+            tok.lexpos = positions[i] + start
+            append(tok)
+        line += chunk.count('\n')
+    return toks
@@ -0,0 +1,71 @@
+import json
+import os
+import socket
+import sys
+
+# Thin client of the compile server in daemon.py, taking the arguments of
+# compiler.py. It only sends them with its working directory and prints what
+# the server sends back, so it starts without importing the compiler. When
+# no server is listening or the server doesn't serve the arguments, the
+# compile runs here with compiler.main.
+
+
+def socket_path():
+    # daemon.sock in the directory of compiler.cache_dir, worked out without
+    # importing the compiler
+    path = os.environ.get('SIMPLE_COMPILER_SOCKET')
+    if path:
+        return path
+    base = os.environ.get('SIMPLE_COMPILER_CACHE')
+    if not base:
+        base = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                            'simple-compiler')
+    return os.path.join(base, 'daemon.sock')
+
+
+def listening(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def request(path, argv, cwd):
+    # The response of the server, OSError when none is listening
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        sock.sendall(json.dumps({'argv': argv, 'cwd': cwd}).encode('utf-8') + b'\n')
+        parts = []
+        for part in iter(lambda: sock.recv(1 << 16), b''):
+            parts.append(part)
+    finally:
+        sock.close()
+    if not parts:
+        raise ConnectionError('no response from the compile server')
+    return json.loads(b''.join(parts))
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    try:
+        response = request(socket_path(), argv, os.getcwd())
+    except OSError:
+        response = {'fallback': True}
+    if response.get('fallback'):
+        import compiler
+
+        return compiler.main(argv)
+    sys.stdout.write(response['stdout'])
+    if 'stderr' in response:
+        sys.stderr.write(response['stderr'])
+    return response['status']
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,562 +1,1087 @@
-import ply.lex as lex
-import ply.yacc as yacc
-
-# Code based on the PLY basic example documentation https://www.dabeaz.com/ply/ply.html#ply_nn0
-
-reserved = {
-    'and': 'AND',
-    'or': 'OR',
-    'int': 'INT',
-    'float': 'FLOAT',
-    'string': 'STRING',
-    'boolean': 'BOOLEAN',
-    'true': 'TRUE',
-    'false': 'FALSE',
-    'if': 'IF',
-    'elif': 'ELIF',
-    'else': 'ELSE',
-    'do': 'DO',
-    'while': 'WHILE',
-    'for': 'FOR',
-    'print': 'PRINT'
-}
-
-tokens = ['FLOATV',
-          'INTV',
-          'EQC',
-          'NOTEQC',
-          'BIGGEREQ',
-          'SMALLEREQ',
-          'STRINGV',
-          'ID'] + list(reserved.values())
-
-literals = ['=', '+', '-', '*', '/', '^', '(', ')', '{', '}', '<', '>', ';']
-
-t_EQC = r'=='
-t_NOTEQC = r'!='
-t_BIGGEREQ = r'>='
-t_SMALLEREQ = r'<='
-
-
-def t_FLOATV(t):
-    r'\d+\.\d+'
-    t.value = float(t.value)
-    return t
-
-
-def t_INTV(t):
-    r'\d+'
-    t.value = int(t.value)
-    return t
-
-
-def t_STRING(t):
-    r'".*"'
-    t.value = t.value.replace("\"", "")
-    t.type = reserved.get(t.value, 'STRINGV')  # Check for reserved words
-    return t
-
-
-def t_ID(t):
-    r'[a-zA-Z_][a-zA-Z_0-9]*'
-    t.type = reserved.get(t.value, 'ID')  # Check for reserved words
-    return t
-
-
-def t_newline(t):
-    r'\n+'
-    t.lexer.lineno += len(t.value)
-
-
-t_ignore = ' \t'
-
-
-def t_error(t):
-    print("Illegal character '%s'" % t.value[0])
-    t.lexer.skip(1)
-
-
-lex.lex()
-
-precedence = (
-    ('right', '='),
-    ('left', 'EQC', 'NOTEQC'),
-    ('left', '+', '-'),
-    ('left', '*', '/'),
-    ('left', '^'),
-    ('left', 'AND', 'OR'),
-    ('nonassoc', '<', '>', 'BIGGEREQ', 'SMALLEREQ'),
-    ('right', 'UMINUS')
-)
-
-names = {}
-prog = {}
-
-
-def p_start(p):
-    '''prog : statement'''
-    global prog
-    prog = p[1]
-
-
-def p_statement(p):
-    '''statement : conditional statement
-                 | while statement
-                 | for statement
-                 | declare ';' statement
-                 | print ';' statement
-                 | none'''
-    if len(p) > 2:
-        if p[2] == ';':
-            p[2] = p[3]
-        p[0] = (p[1],) + p[2]
-    else:
-        p[0] = ()
-
-
-def p_none(p):
-    'none :'
-    pass
-
-
-def p_conditional(p):
-    '''conditional : if elif else'''
-    p[0] = ('conditional', p[1], p[2], p[3])
-
-
-def p_if(p):
-    '''if : IF '(' expression ')' '{' statement '}' '''
-    p[0] = ('if', p[3], p[6])
-
-
-def p_elif(p):
-    '''elif : ELIF '(' expression ')' '{' statement '}' elif
-                 | none'''
-    if len(p) > 2:
-        p[0] = (('elif', p[3], p[6]),) + p[8]
-    else:
-        p[0] = ()
-
-
-def p_else(p):
-    '''else : ELSE '{' statement '}'
-            | none'''
-    if len(p) > 2:
-        p[0] = ('else', p[3])
-
-
-def p_while(p):
-    '''while : WHILE '(' expression ')' '{' statement '}'
-             | DO '{' statement '}' WHILE '(' expression ')' ';' '''
-    if p[1] == "while":
-        p[0] = ('while', p[3], p[6])
-    else:
-        p[0] = ('do-while', p[7], p[3])
-
-
-def p_for(p):
-    '''for : FOR '(' declarationAssign ';' expression ';' declareAssign ')' '{' statement '}' '''
-    p[0] = ('for', p[3], p[5], p[7], p[10])
-
-
-def p_type(p):
-    '''type : INT
-            | FLOAT
-            | STRING
-            | BOOLEAN'''
-    p[0] = p[1]
-
-
-def p_declare(p):
-    '''declare : declaration
-               | declarationAssign
-               | declareAssign'''
-    p[0] = p[1]
-
-
-def p_declaration(p):
-    '''declaration : type ID'''
-    p[0] = ('declare', p[1], p[2])
-
-
-def p_declarationAssign(p):
-    '''declarationAssign : type ID '=' expression'''
-    p[0] = ('declareAssign', p[1], p[2], p[4])
-
-
-def p_declareAssign(p):
-    '''declareAssign : ID '=' expression'''
-    p[0] = ('assign', p[1], p[3])
-    p[0] = ('assign', p[1], p[3])
-
-
-def p_print(p):
-    'print : PRINT expression'
-    # print(p[2])
-    p[0] = ('print', p[2])
-
-
-def p_expression_operation(p):
-    '''expression : expression '+' expression
-                  | expression '-' expression
-                  | expression '*' expression
-                  | expression '/' expression
-                  | expression '^' expression
-                  | expression EQC expression
-                  | expression NOTEQC expression
-                  | expression BIGGEREQ expression
-                  | expression SMALLEREQ expression
-                  | expression '>' expression
-                  | expression '<' expression
-                  | expression AND expression
-                  | expression OR expression'''
-    p[0] = ('operation', p[1], p[2], p[3])
-
-
-def p_expression_uminus(p):
-    '''expression : '-' expression %prec UMINUS'''
-    p[0] = -p[2]
-
-
-def p_expression_group(p):
-    '''expression : '(' expression ')' '''
-    p[0] = p[2]
-
-
-def p_expression_number(p):
-    '''expression : INTV
-                  | FLOATV
-                  | STRINGV
-                  | boolval'''
-    p[0] = p[1]
-
-
-def p_boolVal(p):
-    '''boolval : TRUE
-               | FALSE'''
-    if p[1] == "true":
-        p[0] = True
-    elif p[1] == "false":
-        p[0] = False
-
-
-def p_expression_ID(p):
-    "expression : ID"
-    p[0] = p[1]
-
-
-def p_error(t):
-    if t:
-        print("Syntax error at '%s'" % t.value)
-    else:
-        print("Syntax error at EOF")
-
-
-yacc.yacc()
-file = open("script.txt", "r")
-s = file.read()
-yacc.parse(s)
-
-print('==== Tree ====')
-print(prog)
-
-code = []
-
-def declare_assign(val):
-    res = "" + val[2] + " "
-    if val[1] == 'int' or val[1] == 'float':
-        if type(val[3]) is not tuple:
-            res = res + str(float(val[3]))
-        else:
-            res = res + operation(val[3])
-    else:
-        res = res + str(val[3])
-
-    code.append(res)
-
-
-def declare(val):
-    res = "" + val[1] + " " + val[2]
-    code.append(res)
-
-
-def operation(val):
-    res = ""
-
-    if val[2] == '>' or val[2] == '>=' or val[2] == '<' or val[2] == '>=' or val[2] == 'and' or val[2] == 'or' or val[2] == '==':
-        if type(val[1]) is not tuple:
-            res = res + str(val[1])
-        else:
-            res = res + str(operation(val[1]))
-
-        res = res + ' ' + val[2] + ' '
-
-        if type(val[3]) is not tuple:
-            res = res + str(val[3])
-        else:
-            res = res + str(operation(val[3]))
-
-        code.append(res)
-
-    else:
-        numericRes = 0
-        if type(val[1]) is not tuple:
-            if type(val[1]) is int or float:
-                numericRes = val[1]
-
-            res = res + str(val[1])
-        else:
-            numericRes = operation(val[1])
-            res = res + str(numericRes)
-
-        if val[2] == '+':
-            res = res + ' + '
-        elif val[2] == '-':
-            res = res + ' - '
-        elif val[2] == '*':
-            res = res + ' * '
-        elif val[2] == '/':
-            res = res + ' / '
-        elif val[2] == '^':
-            res = res + ' ^ '
-
-        if type(val[3]) is not tuple:
-            if val[2] == '+' and type(val[3]) is not str:
-                if type(numericRes) is not str:
-                    numericRes = numericRes + val[3]
-                else:
-                    numericRes = val[3]
-            elif val[2] == '-' and type(val[3]) is not str:
-                if type(numericRes) is not str:
-                    numericRes = numericRes - val[3]
-                else:
-                    numericRes = val[3]
-            elif val[2] == '*' and type(val[3]) is not str:
-                if type(numericRes) is not str:
-                    numericRes = numericRes * val[3]
-                else:
-                    numericRes = val[3]
-            elif val[2] == '/' and type(val[3]) is not str:
-                if type(numericRes) is not str:
-                    numericRes = numericRes / val[3]
-                else:
-                    numericRes = val[3]
-            elif val[2] == '^' and type(val[3]) is not str:
-                if type(numericRes) is not str:
-                    numericRes = numericRes ** val[3]
-                else:
-                    numericRes = val[3]
-
-            res = res + str(val[3])
-
-        elif type(val[3]) is str:
-            res = res + val[3]
-            code.append(res)
-            return res
-
-        else:
-            opRes = 0
-
-            if val[2] == '+':
-                op = operation(val[3])
-                numericRes = numericRes + op
-                opRes = op
-            elif val[2] == '-':
-                op = operation(val[3])
-                numericRes = numericRes - op
-                opRes = op
-            elif val[2] == '*':
-                op = operation(val[3])
-                numericRes = numericRes * op
-                opRes = op
-            elif val[2] == '/':
-                op = operation(val[3])
-                numericRes = numericRes / op
-                opRes = op
-            elif val[2] == '^':
-                op = operation(val[3])
-                numericRes = numericRes ** op
-                opRes = op
-
-            res = res + str(opRes)
-
-        code.append(res)
-        return numericRes
-
-
-def assign(val):
-    res = "" + val[1] + " "
-
-    if type(val[2]) is not tuple:
-        res = res + str(val[2])
-    else:
-        res = res + str(operation(val[2]))
-
-    code.append(res)
-
-def printC(val):
-
-    res = val[0] + ' ' + val[1]
-    code.append(res)
-
-def fori(val):
-    code.append('for')
-    declare_assign(val[1])
-    operation(val[2])
-    assign(val[3])
-    for stm in val[4]:
-        if stm[0] == 'declareAssign':
-            declare_assign(stm)
-        elif stm[0] == 'declare':
-            declare(stm)
-        elif stm[0] == 'assign':
-            assign(stm)
-        elif stm[0] == 'print':
-            printC(stm)
-        elif stm[0] == 'if':
-            ifcond(stm[1])
-        elif stm[0] == 'while':
-            whilei(stm)
-        elif stm[0] == 'do-while':
-            dowhilei(stm)
-    code.append('end for')
-
-def ifcond(val):
-    code.append('if')
-    operation(val[1][1])
-    for stm in val[1][2]:
-        if stm[0] == 'declareAssign':
-            declare_assign(stm)
-        elif stm[0] == 'declare':
-            declare(stm)
-        elif stm[0] == 'assign':
-            assign(stm)
-        elif stm[0] == 'for':
-            fori(stm)
-        elif stm[0] == 'print':
-            printC(stm)
-        elif stm[0] == 'if':
-            ifcond(stm[1])
-        elif stm[0] == 'while':
-            whilei(stm)
-        elif stm[0] == 'do-while':
-            dowhilei(stm)
-    code.append('end if')
-    index = 2
-    while index < len(val):
-        if len(val[index]) > 0:
-            if val[index][0][0] == 'elif':
-                code.append('elif')
-                operation(val[index][0][1])
-                for stm in val[index][0][2]:
-                    if stm[0] == 'declareAssign':
-                        declare_assign(stm)
-                    elif stm[0] == 'declare':
-                        declare(stm)
-                    elif stm[0] == 'assign':
-                        assign(stm)
-                    elif stm[0] == 'for':
-                        fori(stm)
-                    elif stm[0] == 'print':
-                        printC(stm)
-                    elif stm[0] == 'if':
-                        ifcond(stm[1])
-                    elif stm[0] == 'while':
-                        whilei(stm)
-                    elif stm[0] == 'do-while':
-                        dowhilei(stm)
-                code.append('end elif')
-            else:
-                code.append('else')
-                for stm in val[index][1]:
-                    if stm[0] == 'declareAssign':
-                        declare_assign(stm)
-                    elif stm[0] == 'declare':
-                        declare(stm)
-                    elif stm[0] == 'assign':
-                        assign(stm)
-                    elif stm[0] == 'for':
-                        fori(stm)
-                    elif stm[0] == 'print':
-                        printC(stm)
-                    elif stm[0] == 'if':
-                        ifcond(stm[1])
-                    elif stm[0] == 'while':
-                        whilei(stm)
-                    elif stm[0] == 'do-while':
-                        dowhilei(stm)
-                code.append('end else')
-
-        index = index + 1
-
-def whilei(val):
-    code.append('while')
-    operation(val[1])
-    for stm in val[2]:
-        if stm[0] == 'declareAssign':
-            declare_assign(stm)
-        elif stm[0] == 'declare':
-            declare(stm)
-        elif stm[0] == 'assign':
-            assign(stm)
-        elif stm[0] == 'for':
-            fori(stm)
-        elif stm[0] == 'print':
-            printC(stm)
-        elif stm[0] == 'conditional':
-            ifcond(stm)
-        elif stm[0] == 'while':
-            whilei(stm)
-        elif stm[0] == 'do-while':
-            dowhilei(stm)
-    code.append('end while')
-
-def dowhilei(val):
-    code.append('do')
-    for stm in val[2]:
-        if stm[0] == 'declareAssign':
-            declare_assign(stm)
-        elif stm[0] == 'declare':
-            declare(stm)
-        elif stm[0] == 'assign':
-            assign(stm)
-        elif stm[0] == 'for':
-            fori(stm)
-        elif stm[0] == 'print':
-            printC(stm)
-        elif stm[0] == 'conditional':
-            ifcond(stm)
-        elif stm[0] == 'while':
-            whilei(stm)
-        elif stm[0] == 'do-while':
-            dowhilei(stm)
-    code.append('while')
-    operation(val[1])
-    code.append('end while')
-
-for val in prog:
-    print(val)
-    if val[0] == 'declareAssign':
-        declare_assign(val)
-    elif val[0] == 'declare':
-        declare(val)
-    elif val[0] == 'assign':
-        assign(val)
-    elif val[0] == 'for':
-        fori(val)
-    elif val[0] == 'print':
-        printC(val)
-    elif val[0] == 'conditional':
-        ifcond(val)
-    elif val[0] == 'while':
-        whilei(val)
-    elif val[0] == 'do-while':
-        dowhilei(val)
-
-print("===============================================")
-
-file = open('output.txt', 'a')
-for val in code:
-    print(val)
-    file.write(val + '\n')
-file.close()
\ No newline at end of file
+import contextlib
+import copy
+import functools
+import hashlib
+import heapq
+import os
+import re
+import sys
+import threading
+
+import cfg
+import emitter
+import ir
+import nodes
+import symbols
+import typecheck
+from nodes import Id, Neg, Operation, ToFloat
+
+# Code based on the PLY basic example documentation https://www.dabeaz.com/ply/ply.html#ply_nn0
+
+reserved = {
+    'and': 'AND',
+    'or': 'OR',
+    'int': 'INT',
+    'float': 'FLOAT',
+    'string': 'STRING',
+    'boolean': 'BOOLEAN',
+    'true': 'TRUE',
+    'false': 'FALSE',
+    'if': 'IF',
+    'elif': 'ELIF',
+    'else': 'ELSE',
+    'do': 'DO',
+    'while': 'WHILE',
+    'for': 'FOR',
+    'print': 'PRINT'
+}
+
+tokens = ['FLOATV',
+          'INTV',
+          'EQC',
+          'NOTEQC',
+          'BIGGEREQ',
+          'SMALLEREQ',
+          'STRINGV',
+          'ID'] + list(reserved.values())
+
+literals = ['=', '+', '-', '*', '/', '^', '(', ')', '{', '}', '<', '>', ';']
+
+t_EQC = r'=='
+t_NOTEQC = r'!='
+t_BIGGEREQ = r'>='
+t_SMALLEREQ = r'<='
+
+
+def t_FLOATV(t):
+    r'\d+\.\d+'
+    t.value = float(t.value)
+    return t
+
+
+def t_INTV(t):
+    r'\d+'
+    t.value = int(t.value)
+    return t
+
+
+# \n, \t, \" and \\ in a string, any other backslash is kept as it is
+ESCAPES = {'n': '\n', 't': '\t', '"': '"', '\\': '\\'}
+_escape = re.compile(r'\\(.)')
+
+
+def unescape(text):
+    if '\\' not in text:
+        return text
+    return _escape.sub(lambda m: ESCAPES.get(m.group(1), m.group()), text)
+
+
+def t_STRING(t):
+    r'"(?:[^"\\\n]|\\.)*"'
+    # Up to the next quote not escaped by a backslash, on the same line
+    t.type = 'STRINGV'
+    t.value = unescape(t.value[1:-1])
+    return t
+
+
+def t_ID(t):
+    r'[a-zA-Z_][a-zA-Z_0-9]*'
+    t.type = reserved.get(t.value, 'ID')  # Check for reserved words
+    return t
+
+
+def t_newline(t):
+    r'\n+'
+    t.lexer.lineno += len(t.value)
+
+
+t_ignore = ' \t'
+
+
+def t_error(t):
+    t.lexer.compiler.error("Illegal character '%s'" % t.value[0])
+    t.lexer.skip(1)
+
+
+precedence = (
+    ('right', '='),
+    ('left', 'EQC', 'NOTEQC'),
+    ('left', '+', '-'),
+    ('left', '*', '/'),
+    ('left', '^'),
+    ('left', 'AND', 'OR'),
+    ('nonassoc', '<', '>', 'BIGGEREQ', 'SMALLEREQ'),
+    ('right', 'UMINUS')
+)
+
+
+def p_start(p):
+    '''prog : program'''
+    p[0] = p[1]
+
+
+def p_program(p):
+    '''program : program conditional
+               | program while
+               | program for
+               | program declare ';'
+               | program print ';'
+               | none'''
+    # The top level statement list, every statement is handed to the compiler
+    # as soon as it is reduced
+    if len(p) > 2:
+        p.lexer.compiler.top_level(p[1], p[2])
+        p[0] = p[1]
+    else:
+        p[0] = []
+
+
+def p_statement(p):
+    '''statement : statement conditional
+                 | statement while
+                 | statement for
+                 | statement declare ';'
+                 | statement print ';'
+                 | none'''
+    # Left recursive so the parser reduces after every statement, the list is
+    # extended in place instead of copied and the parser stack stays shallow
+    if len(p) > 2:
+        p[1].append(p[2])
+        p[0] = p[1]
+    else:
+        p[0] = []
+
+
+def p_none(p):
+    'none :'
+    pass
+
+
+def p_conditional(p):
+    '''conditional : if elif else'''
+    p[0] = nodes.Conditional(p[1], p[2], p[3])
+
+
+def p_if(p):
+    '''if : IF '(' expression ')' block'''
+    p[0] = nodes.If(p.lexer.compiler.checker.condition(p[3], 'if', p.lineno(1)), p[5], p.lineno(1))
+
+
+def p_elif(p):
+    '''elif : elif ELIF '(' expression ')' block
+            | none'''
+    if len(p) > 2:
+        p[1].append(nodes.Elif(p.lexer.compiler.checker.condition(p[4], 'elif', p.lineno(2)), p[6], p.lineno(2)))
+        p[0] = p[1]
+    else:
+        p[0] = []
+
+
+def p_else(p):
+    '''else : ELSE block
+            | none'''
+    if len(p) > 2:
+        p[0] = nodes.Else(p[2])
+
+
+def p_while(p):
+    '''while : WHILE '(' expression ')' block
+             | DO block WHILE '(' expression ')' ';' '''
+    checker = p.lexer.compiler.checker
+    if p[1] == "while":
+        p[0] = nodes.While(checker.condition(p[3], 'while', p.lineno(1)), p[5], p.lineno(1))
+    else:
+        p[0] = nodes.DoWhile(checker.condition(p[5], 'do-while', p.lineno(3)), p[2], p.lineno(1))
+
+
+def p_for(p):
+    '''for : FOR '(' scope declarationAssign ';' expression ';' declareAssign ')' block'''
+    # The initialization is scoped to the loop
+    p.lexer.compiler.symbols.close()
+    p[0] = nodes.For(p[4], p.lexer.compiler.checker.condition(p[6], 'for', p.lineno(1)), p[8], p[10], p.lineno(1))
+
+
+def p_block(p):
+    '''block : '{' scope statement '}' '''
+    p.lexer.compiler.symbols.close()
+    p[0] = p[3]
+
+
+def p_scope(p):
+    'scope :'
+    p.lexer.compiler.symbols.open()
+
+
+def p_type(p):
+    '''type : INT
+            | FLOAT
+            | STRING
+            | BOOLEAN'''
+    p[0] = p[1]
+
+
+def p_declare(p):
+    '''declare : declaration
+               | declarationAssign
+               | declareAssign'''
+    p[0] = p[1]
+
+
+def p_declaration(p):
+    '''declaration : type ID'''
+    p[0] = p.lexer.compiler.checker.declare(p[1], p[2], p.lineno(2))
+
+
+def p_declarationAssign(p):
+    '''declarationAssign : type ID '=' expression'''
+    p[0] = p.lexer.compiler.checker.declare_assign(p[1], p[2], p[4], p.lineno(2))
+
+
+def p_declareAssign(p):
+    '''declareAssign : ID '=' expression'''
+    p[0] = p.lexer.compiler.checker.assign(p[1], p[3], p.lineno(1))
+
+
+def p_print(p):
+    'print : PRINT expression'
+    # print(p[2])
+    p[0] = nodes.Print(p[2], p.lineno(1))
+
+
+def p_expression_operation(p):
+    '''expression : expression '+' expression
+                  | expression '-' expression
+                  | expression '*' expression
+                  | expression '/' expression
+                  | expression '^' expression
+                  | expression EQC expression
+                  | expression NOTEQC expression
+                  | expression BIGGEREQ expression
+                  | expression SMALLEREQ expression
+                  | expression '>' expression
+                  | expression '<' expression
+                  | expression AND expression
+                  | expression OR expression'''
+    p[0] = p.lexer.compiler.checker.operation(p[1], p[2], p[3], p.lineno(2))
+
+
+def p_expression_uminus(p):
+    '''expression : '-' expression %prec UMINUS'''
+    if type(p[2]) in (int, float):
+        p[0] = -p[2]
+    else:
+        p[0] = p.lexer.compiler.checker.negate(p[2], p.lineno(1))
+
+
+def p_expression_group(p):
+    '''expression : '(' expression ')' '''
+    p[0] = p[2]
+
+
+def p_expression_number(p):
+    '''expression : INTV
+                  | FLOATV
+                  | STRINGV
+                  | boolval'''
+    p[0] = p[1]
+
+
+def p_boolVal(p):
+    '''boolval : TRUE
+               | FALSE'''
+    if p[1] == "true":
+        p[0] = True
+    elif p[1] == "false":
+        p[0] = False
+
+
+def p_expression_ID(p):
+    "expression : ID"
+    p[0] = p.lexer.compiler.checker.name(p[1], p.lineno(1))
+
+
+# Expression nodes that are generated into instructions, anything else is an
+# operand
+COMPOUND = frozenset([Operation, Neg, ToFloat])
+
+
+class CompileError(Exception):
+    def __init__(self, errors):
+        Exception.__init__(self, '\n'.join(errors))
+        self.errors = errors
+
+
+# The lexer and the parse tables are built once and shared by every Compiler,
+# each compiler works on its own clone of the lexer and copy of the parser so
+# no parsing state is shared between calls or threads. Nothing is built until
+# the first Compiler is created, so importing this module stays cheap.
+_build_lock = threading.Lock()
+_lexer = None
+_parser = None
+
+
+def cache_dir():
+    path = os.environ.get('SIMPLE_COMPILER_CACHE')
+    if not path:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        path = os.path.join(base, 'simple-compiler')
+    return path
+
+
+def grammar_hash():
+    import ply.yacc as yacc
+
+    # Everything yacc uses to build the tables, productions in definition order
+    module = sys.modules[__name__]
+    rules = [f for name, f in vars(module).items() if name.startswith('p_')]
+    rules.sort(key=lambda f: f.__code__.co_firstlineno)
+    h = hashlib.sha256()
+    h.update(repr((yacc.__tabversion__, tokens, literals, precedence)).encode())
+    for f in rules:
+        h.update(f.__name__.encode() + b'\0' + f.__doc__.encode() + b'\0')
+    return h.hexdigest()
+
+
+def build_parser(debug=False):
+    import ply.yacc as yacc
+
+    module = sys.modules[__name__]
+    key = grammar_hash()
+    # Only used as a table module name that never exists, so yacc regenerates
+    # the tables instead of picking up a stray parsetab.py from sys.path
+    tabmodule = 'parsetab_' + key[:16]
+    if debug:
+        # Writes parser.out to the working directory
+        return yacc.yacc(module=module, debug=True, write_tables=False,
+                         tabmodule=tabmodule, outputdir=os.getcwd())
+
+    path = os.path.join(cache_dir(), 'parsetab-%s.pickle' % key)
+    errorlog = yacc.NullLogger()
+    if os.path.exists(path):
+        try:
+            return yacc.yacc(module=module, debug=False, optimize=True, picklefile=path, errorlog=errorlog)
+        except Exception:
+            pass  # Unreadable cache entry, build the tables again below
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    except OSError:
+        # Read-only home, keep the tables in memory only
+        return yacc.yacc(module=module, debug=False, write_tables=False, tabmodule=tabmodule, errorlog=errorlog)
+
+    # Write under a private name and move it into place so concurrent
+    # processes never read a half written table
+    tmp = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+    parser = yacc.yacc(module=module, debug=False, picklefile=tmp, errorlog=errorlog)
+    try:
+        os.replace(tmp, path)
+    except OSError:
+        pass
+    return parser
+
+
+def build(debug=False):
+    global _lexer, _parser
+    with _build_lock:
+        if _parser is None or debug:
+            import ply.lex as lex
+
+            _lexer = lex.lex(module=sys.modules[__name__])
+            _parser = build_parser(debug)
+    return _lexer, _parser
+
+
+class Compiler:
+    def __init__(self, optimize=0, stats=None, loops=()):
+        lexer, parser = build()
+        self.level = optimize
+        # Names of the optimizer loop passes to run, at any level
+        self.loops = loops
+        # Largest integer in bits and string in characters constant folding
+        # gives and the steps it may take, (bits, characters, steps), None
+        # for the limits of optimizer.py
+        self.fold_limits = None
+        # Optional stats.Stats, timing every phase
+        self.stats = stats
+        self.report = []
+        self.lexer = lexer.clone()
+        self.lexer.compiler = self
+        self.mapped = None
+        # Worker processes lexing a large str source in chunks, 0 to lex it
+        # while parsing
+        self.lex_jobs = 0
+        # Whether str source is lexed by the automaton of dfa.py instead
+        self.lex_dfa = False
+        self.dfa = None
+        self.parser = copy.copy(parser)
+        self.parser.errorfunc = self.syntax_error
+        self.errors = []
+        self.symbols = symbols.SymbolTable()
+        self.warnings = self.symbols.warnings
+        self.checker = typecheck.Checker(self.symbols, self.error)
+        self.program = ir.Program()
+        self.streaming = False
+        self.work = []
+        # Free temporary numbers and how many were ever used
+        self.free = []
+        self.allocated = 0
+        # Dispatch tables by statement class
+        self.simple = {
+            nodes.DeclareAssign: self.declare_assign,
+            nodes.Declare: self.declare,
+            nodes.Assign: self.assign,
+            nodes.Print: self.printC,
+        }
+        self.nested = {
+            nodes.Conditional: self.ifcond,
+            nodes.While: self.whilei,
+            nodes.DoWhile: self.dowhilei,
+            nodes.For: self.fori,
+        }
+
+    def error(self, msg):
+        self.errors.append(msg)
+
+    def syntax_error(self, t):
+        if t:
+            self.error("Syntax error at '%s'" % t.value)
+        else:
+            self.error("Syntax error at EOF")
+
+    def phase(self, name):
+        if self.stats is None:
+            return contextlib.nullcontext()
+        return self.stats.phase(name)
+
+    def source_lexer(self, text):
+        # The PLY lexer or the automaton for a str, anything else is a
+        # bytes-like buffer such as a memory mapped file and is lexed in place
+        if isinstance(text, str):
+            if not self.lex_dfa:
+                return self.lexer
+            if self.dfa is None:
+                import dfa
+
+                self.dfa = dfa.DfaLexer()
+                self.dfa.compiler = self
+            return self.dfa
+        if self.mapped is None:
+            import mapped
+
+            self.mapped = mapped.MappedLexer()
+            self.mapped.compiler = self
+        return self.mapped
+
+    def parse(self, text, declared=None):
+        # text is a str or a bytes-like buffer of UTF-8 source. declared maps
+        # the names declared before it to their types, when it is a part of a
+        # program parsed on its own.
+        self.errors = []
+        self.symbols = symbols.SymbolTable(declared)
+        self.warnings = self.symbols.warnings
+        self.checker = typecheck.Checker(self.symbols, self.error)
+        lexer = self.source_lexer(text)
+        lexer.lineno = 1
+        if self.stats is None and not self.lex_jobs:
+            prog = self.parser.parse(text, lexer=lexer)
+        else:
+            # Lexing runs ahead of the parser so both can be measured, or in
+            # chunks over worker processes
+            with self.phase('lex'):
+                toks = self.tokenize(text, lexer)
+            if self.stats is not None:
+                self.stats.count('tokens', len(toks))
+            with self.phase('parse'):
+                prog = self.parser.parse(lexer=lexer, tokenfunc=functools.partial(next, iter(toks), None))
+        if self.errors:
+            raise CompileError(self.errors)
+        if self.stats is not None:
+            self.stats.tree(prog)
+            self.stats.count('symbols', len(self.symbols))
+        return prog
+
+    def tokenize(self, text, lexer):
+        if self.lex_jobs > 1 and isinstance(text, str):
+            import chunked
+
+            return chunked.tokenize(text, self.lex_jobs, self)
+        lexer.input(text)
+        return list(iter(lexer.token, None))
+
+    def generate(self, prog):
+        with self.phase('codegen'):
+            self.program = ir.Program()
+            self.statements(prog)
+            self.drain()
+        if self.stats is not None:
+            self.stats.count('instructions', len(self.program))
+        return self.program
+
+    def compile(self, text):
+        self.generate(self.parse(text))
+        self.optimize()
+        return self.lower()
+
+    def optimize(self):
+        if self.level or self.loops:
+            import optimizer
+
+            with self.phase('optimize'):
+                self.program, self.report = optimizer.optimize(self.program, self.level, self.loops,
+                                                               self.fold_limits or optimizer.LIMITS)
+            if self.stats is not None:
+                self.stats.count('optimized instructions', len(self.program))
+        return self.program
+
+    def lower(self):
+        # The structured code becomes jumps, see cfg.py
+        with self.phase('lower'):
+            self.program = cfg.lower(self.program)
+        if self.stats is not None:
+            self.stats.count('lowered instructions', len(self.program))
+        return self.program
+
+    def stream(self, text, write):
+        # Compiles text generating every top level statement as soon as it is
+        # parsed into an emitter.Emitter that writes the code to write, so
+        # neither the tree nor the code are kept. Returns the emitter.
+        self.program = emitter.Emitter(write)
+        self.streaming = True
+        try:
+            self.parse(text)
+        finally:
+            self.streaming = False
+        self.program.flush()
+        return self.program
+
+    def top_level(self, prog, val):
+        if not self.streaming:
+            prog.append(val)
+        elif not self.errors:
+            self.statement(val)
+            self.program.release()
+
+    def statement(self, val):
+        self.statements([val])
+        self.drain()
+
+    def statements(self, stms):
+        self.work.append(iter(stms))
+
+    def drain(self):
+        # Code is generated from an explicit stack of iterators instead of
+        # recursing, so nesting depth is not limited by the Python stack.
+        # Simple statements are generated on the spot. A nested statement is
+        # a generator that emits its own markers and yields its blocks, it
+        # goes on top of the stack, each block it yields goes on top of it
+        # and whatever is below resumes once the top is exhausted.
+        work = self.work
+        simple = self.simple
+        nested = self.nested
+        while work:
+            for stm in work[-1]:
+                if type(stm) is list:
+                    work.append(iter(stm))
+                    break
+                fn = simple.get(type(stm))
+                if fn is not None:
+                    fn(stm)
+                else:
+                    # Its first block goes on top of it at once
+                    blocks = nested[type(stm)](stm)
+                    work.append(blocks)
+                    work.append(iter(next(blocks)))
+                    break
+            else:
+                work.pop()
+
+    def declare_assign(self, val):
+        self.store(self.program.name(val.var), val.value)
+
+    def declare(self, val):
+        self.program.emit(ir.DECLARE, self.program.name(val.var), self.program.const(val.type))
+
+    def assign(self, val):
+        self.store(self.program.name(val.var), val.value)
+
+    def store(self, dest, value):
+        # Operations write straight into the variable, anything else is a move
+        t = type(value)
+        if t in COMPOUND:
+            self.operation(value, dest)
+        else:
+            self.program.emit(ir.MOVE, dest, self.operand(value))
+
+    def operand(self, val):
+        t = type(val)
+        if t is Id:
+            return self.program.name(val.var)
+        if t in COMPOUND:
+            return self.operation(val)
+        return self.program.const(val)
+
+    def operation(self, val, dest=-1):
+        # Emits an expression in post order from an explicit stack, so long
+        # chains like 1 + 1 + ... + 1 are not limited by the Python stack.
+        # Only operations go on the stack, constants and names are operands
+        # as they are. Temporaries are allocated by a linear scan over the
+        # code: every one dies at its only read, which frees it for the next
+        # operation, the lowest free number first. The result goes into dest,
+        # or into a temporary that is already free again, the caller reads it
+        # at once. and and or only evaluate their right side when the left
+        # one does not decide the result, see logic().
+        program = self.program
+        free = self.free
+        if type(val) is Operation and val.op not in typecheck.LOGIC:
+            left = val.left
+            right = val.right
+            tl = type(left)
+            tr = type(right)
+            if tl not in COMPOUND and tr not in COMPOUND:
+                # Most operations only have constants and names as operands
+                a = program.name(left.var) if tl is Id else program.const(left)
+                b = program.name(right.var) if tr is Id else program.const(right)
+                if dest < 0:
+                    # The result is free again as soon as it is read
+                    if not free:
+                        self.allocated += 1
+                        free.append(self.allocated)
+                    dest = program.temp(free[0])
+                program.emit(ir.TYPED_OPS[val.op, val.type], dest, a, b)
+                return dest
+        results = []
+        stack = [(val, False)]
+        while stack:
+            node, ready = stack.pop()
+            if type(node) is Operation and node.op in typecheck.LOGIC:
+                d = self.logic(node, ready, stack, results)
+                if d is None:
+                    continue
+                if not stack and dest >= 0:
+                    program.emit(ir.MOVE, dest, d)
+                    heapq.heappush(free, -1 - d)
+                    d = dest
+                results.append(d)
+                continue
+            if type(node) is Operation:
+                left = node.left
+                right = node.right
+                if not ready:
+                    stack.append((node, True))
+                    if type(right) in COMPOUND:
+                        stack.append((right, False))
+                    if type(left) in COMPOUND:
+                        stack.append((left, False))
+                    continue
+                t = type(right)
+                if t in COMPOUND:
+                    b = results.pop()
+                else:
+                    b = program.name(right.var) if t is Id else program.const(right)
+                t = type(left)
+                if t in COMPOUND:
+                    a = results.pop()
+                else:
+                    a = program.name(left.var) if t is Id else program.const(left)
+                op = ir.TYPED_OPS[node.op, node.type]
+            else:
+                # A negation or a conversion to float
+                value = node.value
+                t = type(value)
+                if not ready:
+                    stack.append((node, True))
+                    if t in COMPOUND:
+                        stack.append((value, False))
+                    continue
+                if t in COMPOUND:
+                    a = results.pop()
+                else:
+                    a = program.name(value.var) if t is Id else program.const(value)
+                b = -1
+                op = ir.NEG_OPS[node.type] if type(node) is Neg else ir.ITOF
+            if a < -1:
+                heapq.heappush(free, -1 - a)
+            if b < -1:
+                heapq.heappush(free, -1 - b)
+            if stack or dest < 0:
+                if free:
+                    d = program.temp(heapq.heappop(free))
+                else:
+                    self.allocated += 1
+                    d = program.temp(self.allocated)
+            else:
+                d = dest
+            program.emit(op, d, a, b)
+            results.append(d)
+        if d < -1:
+            heapq.heappush(free, -1 - d)
+        return d
+
+    def logic(self, node, state, stack, results):
+        # One step of an and or or in operation(): the left side is copied
+        # into a temporary of its own, which the right side overwrites in a
+        # block that only runs when the left side is true for and, false for
+        # or. Unless both sides are booleans the result is converted to one.
+        # Returns the temporary once it holds the result, None before.
+        program = self.program
+        free = self.free
+        if state is False:
+            stack.append((node, True))
+            if type(node.left) in COMPOUND:
+                stack.append((node.left, False))
+            return None
+        if state is True:
+            a = self.leaf(node.left, results)
+            if free:
+                d = program.temp(heapq.heappop(free))
+            else:
+                self.allocated += 1
+                d = program.temp(self.allocated)
+            program.emit(ir.MOVE, d, a)
+            if a < -1:
+                heapq.heappush(free, -1 - a)
+            program.emit(ir.IF)
+            program.emit(ir.TEST, -1, d)
+            if node.op == 'or':
+                program.emit(ir.END_IF)
+                program.emit(ir.ELSE)
+            stack.append((node, d))
+            if type(node.right) in COMPOUND:
+                stack.append((node.right, False))
+            return None
+        d = state
+        b = self.leaf(node.right, results)
+        program.emit(ir.MOVE, d, b)
+        if b < -1:
+            heapq.heappush(free, -1 - b)
+        program.emit(ir.END_IF if node.op == 'and' else ir.END_ELSE)
+        if typecheck.type_of(node.left) != 'boolean' or typecheck.type_of(node.right) != 'boolean':
+            program.emit(ir.BOOL, d, d)
+        return d
+
+    def leaf(self, val, results):
+        # Operand of a side of an operation, computed already if compound
+        t = type(val)
+        if t in COMPOUND:
+            return results.pop()
+        return self.program.name(val.var) if t is Id else self.program.const(val)
+
+    def test(self, val):
+        self.program.emit(ir.TEST, -1, self.operand(val))
+
+    def printC(self, val):
+        self.program.emit(ir.PRINT, -1, self.operand(val.value))
+
+    def fori(self, val):
+        # The loop starts at the marker so the step runs after the body
+        self.declare_assign(val.init)
+        self.program.emit(ir.FOR)
+        self.test(val.test)
+        yield val.body
+        self.assign(val.step)
+        self.program.emit(ir.END_FOR)
+
+    def ifcond(self, val):
+        emit = self.program.emit
+        emit(ir.IF)
+        self.test(val.if_.test)
+        yield val.if_.body
+        emit(ir.END_IF)
+        for elif_ in val.elifs:
+            emit(ir.ELIF)
+            self.test(elif_.test)
+            yield elif_.body
+            emit(ir.END_ELIF)
+        if val.else_ is not None:
+            emit(ir.ELSE)
+            yield val.else_.body
+            emit(ir.END_ELSE)
+
+    def whilei(self, val):
+        self.program.emit(ir.WHILE)
+        self.test(val.test)
+        yield val.body
+        self.program.emit(ir.END_WHILE)
+
+    def dowhilei(self, val):
+        self.program.emit(ir.DO)
+        yield val.body
+        self.program.emit(ir.DO_WHILE)
+        self.test(val.test)
+        self.program.emit(ir.END_DO)
+
+
+def compile_source(text, optimize=0, loops=()):
+    return Compiler(optimize, loops=loops).compile(text)
+
+
+def argument_parser():
+    import argparse
+
+    import optimizer
+
+    argparser = argparse.ArgumentParser(description='Compile script.txt to three-address code in output.txt')
+    argparser.add_argument('-b', '--binary', metavar='FILE',
+                           help='also write the compiled program in binary form to FILE')
+    argparser.add_argument('-O', dest='optimize', type=int, choices=[0, 1, 2], default=0,
+                           help='optimization level: -O1 propagates constants and removes unreachable branches '
+                                'and dead code, -O2 also eliminates common subexpressions')
+    argparser.add_argument('--loops', nargs='+', choices=['hoist', 'strength', 'unroll', 'all'], default=[],
+                           metavar='PASS',
+                           help='optimize loops at any -O level: hoist moves invariant operations out of loops, '
+                                'strength turns products and powers of loop counters into running sums and '
+                                'products, unroll copies the body of for loops with a constant trip count, all '
+                                'runs the three')
+    argparser.add_argument('--fold-bits', type=int, metavar='N',
+                           help='fold integer constants of at most N bits (default %d), larger ones are computed '
+                                'at run time' % optimizer.MAX_FOLDED_BITS)
+    argparser.add_argument('--fold-length', type=int, metavar='N',
+                           help='fold string constants of at most N characters (default %d)'
+                                % optimizer.MAX_FOLDED_LENGTH)
+    argparser.add_argument('--fold-steps', type=int, metavar='N',
+                           help='stop folding constants and stepping loop counters at compile time after N '
+                                'operations or iterations (default %d)' % optimizer.MAX_FOLDING_STEPS)
+    argparser.add_argument('--cfg', action='store_true',
+                           help='print the basic blocks of the code with the blocks they jump to, their immediate '
+                                'dominators and the variables live on entry')
+    argparser.add_argument('--run', nargs='?', const='vm', choices=['vm', 'interpreter', 'python'],
+                           help='execute the program on the virtual machine (default), by walking the syntax tree '
+                                'or as Python bytecode')
+    argparser.add_argument('--hotspots', nargs='?', const='text', choices=['text', 'json', 'folded'],
+                           help='run the program by walking the syntax tree counting the statements run on every '
+                                'line and timing every loop, and print the report to standard error as text '
+                                '(default), json or folded stacks for flame graph tools')
+    argparser.add_argument('--max-steps', type=int, metavar='N',
+                           help='stop a --run after executing N instructions, or N loop iterations when not run '
+                                'on the virtual machine')
+    argparser.add_argument('scripts', nargs='*', metavar='SCRIPT',
+                           help='compile these scripts or glob patterns in a batch instead of script.txt, each '
+                                'into a .out file next to it unless -o or --out-dir is given')
+    argparser.add_argument('-o', '--output', metavar='FILE',
+                           help='file to write the code to, "-" for standard output only (default output.txt), '
+                                'in a batch all the code in the order of the scripts')
+    argparser.add_argument('--out-dir', metavar='DIR', help='in a batch, write the .out files to DIR')
+    argparser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, metavar='N',
+                           help='in a batch, compile with N worker processes (default one per CPU)')
+    argparser.add_argument('--append', action='store_true',
+                           help='append to the output file instead of replacing it')
+    argparser.add_argument('--no-tree', dest='tree', action='store_false',
+                           help='do not print the syntax tree, without -O, -b or --run the code is then written '
+                                'while parsing and neither the tree nor the program are kept in memory')
+    argparser.add_argument('--stats', nargs='?', const='text', choices=['text', 'json'],
+                           help='print the time and net allocated memory blocks of every phase and counts of '
+                                'tokens, tree nodes and instructions to standard error, as text (default) or json')
+    argparser.add_argument('--profile', choices=['cprofile', 'tracemalloc'],
+                           help='with --stats, also report the functions taking the most time (cprofile) or the '
+                                'memory allocated by every phase and the largest allocation sites (tracemalloc)')
+    argparser.add_argument('--mmap', action='store_true',
+                           help='lex script.txt in place from a memory mapped file instead of reading it into a '
+                                'string, with --no-tree memory use then stays flat whatever the size of the file')
+    argparser.add_argument('--lex-jobs', type=int, default=0, metavar='N',
+                           help='lex script.txt in chunks over N worker processes before parsing it, for very '
+                                'large scripts')
+    argparser.add_argument('--lexer', choices=['ply', 'dfa'], default='ply',
+                           help='lex script.txt with the PLY master regex (default) or the single automaton built '
+                                'from the same rules in dfa.py')
+    argparser.add_argument('--watch', action='store_true',
+                           help='recompile script.txt into output.txt every time it is saved, regenerating only '
+                                'the statements that changed')
+    argparser.add_argument('--debug-grammar', action='store_true',
+                           help='regenerate the parse tables and write parser.out to the working directory')
+    return argparser
+
+
+def fold_limits(args):
+    # Compiler.fold_limits for the command line args, None when no limit is
+    # given
+    if args.fold_bits is None and args.fold_length is None and args.fold_steps is None:
+        return None
+    import optimizer
+
+    return tuple(default if given is None else given
+                 for given, default in zip((args.fold_bits, args.fold_length, args.fold_steps), optimizer.LIMITS))
+
+
+def parse_args(argparser, argv=None):
+    args = argparser.parse_args(argv)
+    if 'all' in args.loops:
+        args.loops = ['hoist', 'strength', 'unroll']
+    return args
+
+
+def main(argv=None):
+    argparser = argument_parser()
+    args = parse_args(argparser, argv)
+    if args.hotspots:
+        if args.run not in (None, 'interpreter'):
+            argparser.error('--hotspots runs the program by walking the syntax tree, not with --run %s' % args.run)
+        args.run = 'interpreter'
+    if args.debug_grammar:
+        build(debug=True)
+
+    if args.scripts:
+        import batch
+
+        if args.watch or args.run or args.binary or args.append or args.stats or args.profile or args.cfg:
+            argparser.error('a batch cannot be combined with --watch, --run, -b, --append, --stats, --profile or '
+                            '--cfg')
+        if args.output is not None and args.out_dir is not None:
+            argparser.error('-o and --out-dir cannot be combined')
+        return batch.run(batch.expand(args.scripts), args.jobs, args.optimize, args.output, args.out_dir, args.loops,
+                         fold_limits(args))
+    if args.output is None:
+        args.output = 'output.txt'
+
+    if args.watch:
+        import incremental
+
+        compiler = incremental.IncrementalCompiler(args.optimize, loops=args.loops)
+        compiler.compiler.fold_limits = fold_limits(args)
+        return incremental.watch(compiler, 'script.txt', args.output, args.binary)
+
+    if args.mmap:
+        import mapped
+
+        s = mapped.open_source('script.txt')
+    else:
+        file = open("script.txt", "r")
+        s = file.read()
+        file.close()
+
+    output = None if args.output == '-' else emitter.OutputFile(args.output, args.append)
+    return run_script(s, args, output, functools.partial(write_binary, args.binary))
+
+
+def write_binary(path, data):
+    file = open(path, 'wb')
+    file.write(data)
+    file.close()
+
+
+def run_script(s, args, output, save_binary):
+    # Compiles the script text s as the command line args ask, printing to
+    # standard output and writing the code to output, an emitter.OutputFile
+    # or None. With -b, the binary form of the program is handed to
+    # save_binary. Returns the exit status.
+    if output is None:
+        write = sys.stdout.write
+    else:
+        def write(text):
+            sys.stdout.write(text)
+            output.write(text)
+
+    stats = None
+    if args.stats or args.profile:
+        import stats as statsmod
+
+        stats = statsmod.Stats(args.profile)
+        stats.start()
+        with stats.phase('setup'):
+            compiler = Compiler(args.optimize, stats, args.loops)
+    else:
+        compiler = Compiler(args.optimize, loops=args.loops)
+    compiler.lex_jobs = args.lex_jobs
+    compiler.fold_limits = fold_limits(args)
+    compiler.lex_dfa = args.lexer == 'dfa'
+    try:
+        if not (args.tree or args.optimize or args.loops or args.binary or args.run or args.cfg or stats):
+            # Nothing needs the whole tree or program, the code is written
+            # out while the script is parsed
+            print("===============================================")
+            compiler.stream(s, write)
+            for msg in compiler.warnings:
+                print('warning: ' + msg)
+        else:
+            prog = compiler.parse(s)
+            for msg in compiler.warnings:
+                print('warning: ' + msg)
+            if args.tree:
+                print('==== Tree ====')
+                print(prog)
+                for val in prog:
+                    print(val)
+
+            compiler.generate(prog)
+
+            if args.optimize or args.loops:
+                count = len(compiler.program)
+                compiler.optimize()
+                print('==== Optimizer -O%d ====' % args.optimize)
+                for name, removed in compiler.report:
+                    print('%-10s %s %d' % (name, 'removed' if removed >= 0 else 'added', abs(removed)))
+                print('%d -> %d instructions' % (count, len(compiler.program)))
+
+            compiler.lower()
+            print("===============================================")
+
+            with compiler.phase('output'):
+                out = emitter.Emitter(write)
+                for val in compiler.program.lines():
+                    out.line(val)
+                out.flush()
+    except CompileError as e:
+        if output:
+            output.discard()
+        for msg in e.errors:
+            print(msg)
+        return 1
+    except BaseException:
+        if output:
+            output.discard()
+        raise
+    if output:
+        with compiler.phase('output'):
+            output.commit()
+
+    if stats:
+        stats.stop()
+        sys.stderr.write(stats.json() if args.stats == 'json' else stats.text())
+
+    if args.cfg:
+        print('==== Control flow graph ====')
+        for line in cfg.Graph(compiler.program).lines():
+            print(line)
+
+    if args.binary:
+        save_binary(compiler.program.to_bytes())
+
+    if args.run:
+        import vm
+
+        print("==== Run ====")
+        try:
+            if args.hotspots:
+                import profiler
+
+                machine = profiler.Profiler(max_steps=args.max_steps)
+                try:
+                    machine.run(prog)
+                finally:
+                    sys.stdout.flush()
+                    sys.stderr.write(machine.report(args.hotspots, s if type(s) is str else None))
+            elif args.run == 'interpreter':
+                import interpreter
+
+                interpreter.run(prog, max_steps=args.max_steps)
+            elif args.run == 'python':
+                import pycode
+
+                pycode.run(pycode.load(s, args.max_steps is not None, prog), max_steps=args.max_steps)
+            else:
+                vm.run(compiler.program, max_steps=args.max_steps)
+        except CompileError as e:
+            for msg in e.errors:
+                print(msg)
+            return 1
+        except vm.VMError as e:
+            print(e)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    # Run from the importable module, so modules importing compiler share its
+    # classes (CompileError) with the command line
+    import compiler
+
+    sys.exit(compiler.main())
@@ -0,0 +1,218 @@
+import asyncio
+import contextlib
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+import traceback
+from collections import OrderedDict
+
+import client
+import compiler
+import emitter
+
+# A long running compile server on a Unix domain socket, for the thin client
+# in client.py. The lexer and parse tables are built once when it starts.
+# Every request names the command line arguments of compiler.py and the
+# working directory of the client: the server reads script.txt there and
+# writes the output and binary files there as compiler.py would, and sends
+# back what it prints and its exit status. The result of compiling a script
+# is kept in an LRU cache keyed by a hash of the options and the script
+# text, so a script that did not change is not compiled again. asyncio
+# serves any number of clients at once, every request is handled on a
+# thread of the default executor so a long compile or run doesn't hold up
+# the others, and what a request prints goes to its own buffer through the
+# Printed standing in for sys.stdout.
+#
+# A batch, --watch, --mmap, --lex-jobs, --stats, --profile, --hotspots and
+# a --run without --max-steps, which could keep the server busy forever, are
+# not served: the client is told to run compiler.py itself, as it is when
+# the script or an output file can't be opened, so errors are reported the
+# same.
+#
+# A request is one line of JSON with argv and cwd, the response one line of
+# JSON with status and stdout, stderr when the compile raised an exception,
+# or fallback when the client has to run the compile.
+
+VERSION = 1
+MAX_ENTRIES = 256
+
+FALLBACK = json.dumps({'fallback': True})
+
+
+def served(args):
+    # Whether the server can run a compile with the command line args
+    return not (args.scripts or args.watch or args.mmap or args.lex_jobs or args.stats or args.profile
+                or args.hotspots or args.debug_grammar or (args.run and args.max_steps is None))
+
+
+class Printed:
+    # Takes the place of sys.stdout, sending what a thread prints to the
+    # buffer it captures into, the real standard output otherwise
+    def __init__(self, stdout):
+        self.stdout = stdout
+        self.local = threading.local()
+
+    def target(self):
+        return getattr(self.local, 'buffer', None) or self.stdout
+
+    def write(self, text):
+        return self.target().write(text)
+
+    def flush(self):
+        self.target().flush()
+
+    @contextlib.contextmanager
+    def capture(self, buffer):
+        self.local.buffer = buffer
+        try:
+            yield buffer
+        finally:
+            self.local.buffer = None
+
+
+class Code:
+    # Takes the place of the output file, keeping the code
+    def __init__(self):
+        self.parts = []
+        self.write = self.parts.append
+        self.committed = False
+
+    def commit(self):
+        self.committed = True
+
+    def discard(self):
+        self.parts = []
+
+
+class Server:
+    def __init__(self, path, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        # Key to (status, printed text, code or None when discarded, binary
+        # program or None)
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.printed = None
+        self.argparser = compiler.argument_parser()
+        compiler.build()
+
+    def key(self, args, text):
+        # Everything that changes the result, the output file and binary
+        # paths only change where it is written
+        options = (VERSION, args.optimize, args.loops, compiler.fold_limits(args), args.tree, args.cfg, args.run,
+                   args.max_steps, args.binary is not None)
+        h = hashlib.sha256()
+        h.update(repr(options).encode() + b'\0')
+        h.update(text.encode('utf-8'))
+        return h.hexdigest()
+
+    def result(self, args, text):
+        key = self.key(args, text)
+        with self.lock:
+            result = self.cache.get(key)
+            if result is not None:
+                self.cache.move_to_end(key)
+                return result
+        code = Code()
+        binary = []
+        with self.printed.capture(io.StringIO()) as out:
+            status = compiler.run_script(text, args, code, binary.append)
+        result = (status, out.getvalue(), ''.join(code.parts) if code.committed else None,
+                  binary[0] if binary else None)
+        with self.lock:
+            self.cache[key] = result
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+        return result
+
+    def compile(self, argv, cwd):
+        # Response to a request, as JSON text
+        try:
+            args = compiler.parse_args(self.argparser, argv)
+        except SystemExit:
+            return FALLBACK  # The client prints the usage
+        if not served(args):
+            return FALLBACK
+        try:
+            file = open(os.path.join(cwd, 'script.txt'), 'r')
+            text = file.read()
+            file.close()
+            output = None
+            if args.output != '-':
+                output = emitter.OutputFile(os.path.join(cwd, args.output or 'output.txt'), args.append)
+        except OSError:
+            return FALLBACK
+        try:
+            status, printed, code, binary = self.result(args, text)
+        except Exception:
+            if output:
+                output.discard()
+            return json.dumps({'status': 1, 'stdout': '', 'stderr': traceback.format_exc()})
+        if output:
+            if code is None:
+                output.discard()
+            else:
+                output.write(code)
+                output.commit()
+        if binary is not None:
+            compiler.write_binary(os.path.join(cwd, args.binary), binary)
+        return json.dumps({'status': status, 'stdout': printed})
+
+    async def handle(self, reader, writer):
+        try:
+            header = json.loads(await reader.readline())
+            response = await asyncio.get_running_loop().run_in_executor(None, self.compile, header['argv'],
+                                                                        header['cwd'])
+            writer.write(response.encode('utf-8') + b'\n')
+            await writer.drain()
+        except (ValueError, KeyError, TypeError, ConnectionError):
+            pass  # A client that went away or doesn't speak the protocol
+        finally:
+            writer.close()
+
+    async def serve(self):
+        self.printed = Printed(sys.stdout)
+        sys.stdout = self.printed
+        try:
+            server = await asyncio.start_unix_server(self.handle, self.path)
+            async with server:
+                await server.serve_forever()
+        finally:
+            sys.stdout = self.printed.stdout
+
+
+def serve(path):
+    if client.listening(path):
+        print('a server is already listening on %s' % path)
+        return 1
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)  # Left behind by a server that was killed
+    server = Server(path)
+    print('listening on %s' % path, flush=True)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    return 0
+
+
+def main(argv=None):
+    import argparse
+
+    argparser = argparse.ArgumentParser(description='Serve compiles of script.txt to client.py')
+    argparser.add_argument('--socket', default=client.socket_path(),
+                           help='Unix domain socket to listen on (default $SIMPLE_COMPILER_SOCKET or daemon.sock '
+                                'in the table cache directory)')
+    args = argparser.parse_args(argv)
+    return serve(args.socket)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
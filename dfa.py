@@ -0,0 +1,428 @@
+import re
+import sys
+
+from ply.lex import LexToken
+
+import compiler
+
+# Lexing with one deterministic automaton built from the rules of the PLY
+# lexer in compiler.py: the t_ functions in the order they are defined, the
+# t_ strings longest first, the literals and t_ignore. The master regex of
+# PLY takes the first rule that matches, which for these rules is always the
+# longest match, the one the automaton takes, ties going to the rule PLY
+# tries first. Reserved words are told from names by t_ID, as they are with
+# PLY. The pattern of every rule
+# is compiled to a nondeterministic automaton (the subset of regex syntax
+# the rules use: literals, escapes, classes, ., groups, |, *, + and ?),
+# the automata are joined and turned into a single table by the subset
+# construction, over classes of characters that no rule tells apart.
+#
+# The lexer reads every character once: it follows the table from the
+# start state to the longest match, keeping the last accepting state it went
+# through. The rules of this language never go more than one character past
+# a match (a digit and a '.' not followed by a digit), which is the only
+# input read twice. The source is translated to its character classes in
+# one pass in C, and a run of characters a state loops on, the body of a
+# string, identifier or number, is skipped by a single class scan instead
+# of a step per character. The token actions are the t_ functions
+# themselves, so values and errors are the ones PLY gives.
+
+# Character class of everything no rule names
+OTHER = 'other'
+
+
+class Nfa:
+    def __init__(self):
+        # Per state, (set, target) edges and epsilon targets. A set is
+        # (negated, frozenset of characters).
+        self.edges = []
+        self.empty = []
+
+    def state(self):
+        self.edges.append([])
+        self.empty.append([])
+        return len(self.edges) - 1
+
+    def pattern(self, pattern):
+        # (start, end) states of a fragment matching pattern
+        parser = Pattern(self, pattern)
+        fragment = parser.alternation()
+        if parser.pos != len(pattern):
+            raise ValueError('unexpected %r at %d in %r' % (pattern[parser.pos], parser.pos, pattern))
+        return fragment
+
+    def chars(self, chars, negated=False):
+        start, end = self.state(), self.state()
+        self.edges[start].append(((negated, frozenset(chars)), end))
+        return start, end
+
+    def sequence(self, fragments):
+        start = end = self.state()
+        for first, last in fragments:
+            self.empty[end].append(first)
+            end = last
+        return start, end
+
+    def repeat(self, fragment, low, unbounded):
+        # fragment{low,} when unbounded, else fragment{low,1}
+        first, last = fragment
+        start, end = self.state(), self.state()
+        self.empty[start].append(first)
+        self.empty[last].append(end)
+        if low == 0:
+            self.empty[start].append(end)
+        if unbounded:
+            self.empty[last].append(first)
+        return start, end
+
+    def closure(self, states):
+        stack = list(states)
+        seen = set(states)
+        while stack:
+            for target in self.empty[stack.pop()]:
+                if target not in seen:
+                    seen.add(target)
+                    stack.append(target)
+        return frozenset(seen)
+
+
+DIGITS = '0123456789'
+# Escapes standing for one character and for a set of them
+ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'f': '\f', 'v': '\v', '0': '\0'}
+SETS = {'d': (False, DIGITS), 'D': (True, DIGITS)}
+
+
+class Pattern:
+    # Recursive descent over a regex
+    def __init__(self, nfa, text):
+        self.nfa = nfa
+        self.text = text
+        self.pos = 0
+
+    def peek(self):
+        return self.text[self.pos] if self.pos < len(self.text) else None
+
+    def alternation(self):
+        options = [self.sequence()]
+        while self.peek() == '|':
+            self.pos += 1
+            options.append(self.sequence())
+        if len(options) == 1:
+            return options[0]
+        nfa = self.nfa
+        start, end = nfa.state(), nfa.state()
+        for first, last in options:
+            nfa.empty[start].append(first)
+            nfa.empty[last].append(end)
+        return start, end
+
+    def sequence(self):
+        fragments = []
+        while self.peek() not in (None, '|', ')'):
+            fragment = self.atom()
+            c = self.peek()
+            if c in ('*', '+', '?'):
+                self.pos += 1
+                fragment = self.nfa.repeat(fragment, int(c == '+'), c != '?')
+            fragments.append(fragment)
+        return self.nfa.sequence(fragments)
+
+    def atom(self):
+        text = self.text
+        c = text[self.pos]
+        self.pos += 1
+        if c == '(':
+            if text.startswith('?:', self.pos):
+                self.pos += 2
+            elif text.startswith('?', self.pos):
+                raise ValueError('unsupported group in %r' % text)
+            fragment = self.alternation()
+            if self.peek() != ')':
+                raise ValueError('unbalanced parenthesis in %r' % text)
+            self.pos += 1
+            return fragment
+        if c == '[':
+            negated, chars = self.members()
+            return self.nfa.chars(chars, negated)
+        if c == '.':
+            return self.nfa.chars('\n', True)
+        if c == '\\':
+            negated, chars = self.escape()
+            return self.nfa.chars(chars, negated)
+        if c in '*+?{':
+            raise ValueError('unsupported %r in %r' % (c, text))
+        return self.nfa.chars(c)
+
+    def escape(self):
+        c = self.text[self.pos]
+        self.pos += 1
+        if c in SETS:
+            return SETS[c]
+        if c.isalnum() and c not in ESCAPES:
+            raise ValueError('unsupported escape \\%s in %r' % (c, self.text))
+        return False, ESCAPES.get(c, c)
+
+    def members(self):
+        # (negated, characters) of a class, after its [
+        text = self.text
+        negated = text.startswith('^', self.pos)
+        if negated:
+            self.pos += 1
+        chars = set()
+        first = True
+        while True:
+            if self.pos >= len(text):
+                raise ValueError('unterminated class in %r' % text)
+            c = text[self.pos]
+            self.pos += 1
+            if c == ']' and not first:
+                return negated, chars
+            first = False
+            if c == '\\':
+                escaped_negated, escaped = self.escape()
+                if escaped_negated:
+                    raise ValueError('negated set inside a class in %r' % text)
+                if len(escaped) > 1:
+                    chars.update(escaped)
+                    continue
+                c = escaped
+            if text.startswith('-', self.pos) and self.pos + 1 < len(text) and text[self.pos + 1] != ']':
+                high = text[self.pos + 1]
+                self.pos += 2
+                if high == '\\':
+                    high = self.escape()[1]
+                chars.update(chr(code) for code in range(ord(c), ord(high) + 1))
+            else:
+                chars.add(c)
+
+
+def rules(module=None):
+    # (name, pattern or None, set of characters or None) in priority order:
+    # the ignored characters, which PLY skips before matching, the t_
+    # functions in definition order, the t_ strings longest first, the
+    # literals
+    module = module or compiler
+    found = []
+    strings = []
+    for name, value in vars(module).items():
+        if not name.startswith('t_') or name in ('t_ignore', 't_error'):
+            continue
+        if callable(value):
+            found.append((value.__code__.co_firstlineno, name[2:], value.__doc__))
+        else:
+            strings.append((name[2:], value))
+    found.sort()
+    strings.sort(key=lambda rule: -len(rule[1]))
+    return ([('ignore', None, set(module.t_ignore))] + [(name, pattern, None) for _, name, pattern in found]
+            + [(name, pattern, None) for name, pattern in strings]
+            + [(literal, None, set(literal)) for literal in module.literals])
+
+
+class Table:
+    # The automaton of all the rules. States are numbered from 1, 0 is the
+    # dead state, and the next state of s on class c is rows[s][c].
+    # accepts[s] is the index of the rule a match ending in s is of, or None.
+    def __init__(self, rule_list):
+        self.rules = rule_list
+        nfa = Nfa()
+        start = nfa.state()
+        final = {}
+        for index, (name, pattern, chars) in enumerate(rule_list):
+            if pattern is None:
+                first, last = nfa.chars(chars)
+                if name == 'ignore':
+                    first, last = nfa.repeat((first, last), 1, True)
+            else:
+                first, last = nfa.pattern(pattern)
+            nfa.empty[start].append(first)
+            final[last] = index
+
+        # Every character a rule names gets a symbol of its own, all the
+        # rest behave the same and share OTHER
+        named = set()
+        for edges in nfa.edges:
+            for (negated, chars), target in edges:
+                named.update(chars)
+        symbols = sorted(named) + [OTHER]
+
+        def member(symbol, charset):
+            negated, chars = charset
+            return (symbol in chars) != negated
+
+        states = {}
+        order = []
+        rows = []
+
+        def number(subset):
+            if subset not in states:
+                states[subset] = len(order) + 1
+                order.append(subset)
+            return states[subset]
+
+        number(nfa.closure([start]))
+        i = 0
+        while i < len(order):
+            subset = order[i]
+            row = []
+            for symbol in symbols:
+                targets = [target for state in subset for charset, target in nfa.edges[state]
+                           if member(symbol, charset)]
+                row.append(number(nfa.closure(targets)) if targets else 0)
+            rows.append(row)
+            i += 1
+
+        # Symbols every state treats alike are one class
+        columns = {}
+        self.classes = {}
+        for column, symbol in enumerate(symbols):
+            key = tuple(row[column] for row in rows)
+            self.classes[symbol] = columns.setdefault(key, len(columns))
+        width = len(columns)
+        self.width = width
+        table = [[0] * width for _ in range(len(rows) + 1)]
+        for key, cls in columns.items():
+            for state, target in enumerate(key, 1):
+                table[state][cls] = target
+        self.rows = [tuple(row) for row in table]
+        self.accepts = [None] + [min([final[state] for state in subset if state in final], default=None)
+                                 for subset in order]
+        self.start = 1
+        if width > 255:
+            raise ValueError('too many character classes')
+
+        # Translation tables from the source to a string of classes, bytes
+        # for ASCII source
+        other = self.classes[OTHER]
+        self.ascii = bytes(self.classes.get(chr(code), other) for code in range(256))
+        self.unicode = ClassMap((ord(symbol), cls) for symbol, cls in self.classes.items() if symbol != OTHER)
+        self.unicode.other = other
+        # Per state, the scan past a run of classes it loops on
+        self.runs = [None] * (len(rows) + 1)
+        for state in range(1, len(rows) + 1):
+            loops = bytes(cls for cls in range(width) if self.rows[state][cls] == state)
+            if loops:
+                self.runs[state] = re.compile(b'[' + b''.join(b'\\x%02x' % cls for cls in loops) + b']*').match
+
+
+class ClassMap(dict):
+    # str.translate table sending every character no rule names to OTHER
+    def __missing__(self, code):
+        return self.other
+
+
+_table = None
+
+
+def table():
+    global _table
+    if _table is None:
+        _table = Table(rules())
+    return _table
+
+
+class DfaLexer:
+    # Takes the place of the PLY lexer for str source, the compiler's error
+    # method gets the lexer errors
+    def __init__(self, automaton=None):
+        self.table = automaton or table()
+        self.compiler = None
+        self.lexdata = ''
+        self.classes = b''
+        self.lexpos = 0
+        self.lineno = 1
+        self.actions = []
+        for name, pattern, chars in self.table.rules:
+            action = getattr(compiler, 't_' + name, None)
+            self.actions.append(action if callable(action) else None)
+        self.error = compiler.t_error
+
+    def input(self, text):
+        self.lexdata = text
+        self.lexpos = 0
+        if text.isascii():
+            self.classes = text.encode('ascii').translate(self.table.ascii)
+        else:
+            self.classes = text.translate(self.table.unicode).encode('latin-1')
+
+    def skip(self, n):
+        self.lexpos += n
+
+    def token(self):
+        automaton = self.table
+        rows = automaton.rows
+        accepts = automaton.accepts
+        runs = automaton.runs
+        rules = automaton.rules
+        classes = self.classes
+        text = self.lexdata
+        end = len(classes)
+        pos = self.lexpos
+        while pos < end:
+            state = automaton.start
+            i = pos
+            rule = None
+            while i < end:
+                target = rows[state][classes[i]]
+                if not target:
+                    break
+                i += 1
+                if target == state:
+                    # A run the state loops on, the rest of it in one scan
+                    run = runs[state]
+                    if run is not None:
+                        i = run(classes, i).end()
+                state = target
+                if accepts[state] is not None:
+                    rule = accepts[state]
+                    stop = i
+            if rule is None:
+                tok = LexToken()
+                tok.type = 'error'
+                tok.value = text[pos]
+                tok.lineno = self.lineno
+                tok.lexpos = pos
+                tok.lexer = self
+                self.lexpos = pos
+                self.error(tok)
+                pos = self.lexpos
+                continue
+            if rule == 0:
+                pos = stop
+                continue
+            tok = LexToken()
+            tok.type = rules[rule][0]
+            tok.value = text[pos:stop]
+            tok.lineno = self.lineno
+            tok.lexpos = pos
+            pos = stop
+            action = self.actions[rule]
+            if action is not None:
+                tok.lexer = self
+                self.lexpos = pos
+                tok = action(tok)
+                if tok is None:
+                    continue
+            self.lexpos = pos
+            return tok
+        self.lexpos = pos
+        return None
+
+    def __iter__(self):
+        return iter(self.token, None)
+
+
+def main(argv=None):
+    # Prints the size of the automaton and its states
+    automaton = table()
+    names = [name for name, pattern, chars in automaton.rules]
+    sys.stdout.write('%d states, %d character classes\n' % (len(automaton.accepts) - 1, automaton.width))
+    for state in range(1, len(automaton.accepts)):
+        rule = automaton.accepts[state]
+        targets = sorted(set(automaton.rows[state]) - set([0]))
+        sys.stdout.write('%3d %-10s -> %s\n' % (state, '' if rule is None else names[rule],
+                                                 ' '.join(str(target) for target in targets) or '-'))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+import array
+import os
+
+import cfg
+import ir
+
+# Writing compiled code out as text. An Emitter takes the place of the
+# ir.Program a Compiler generates into: the code of every top level statement
+# is lowered and formatted once it is complete, and handed to a write function
+# (file.write, sys.stdout.write or any callback taking text) in buffered
+# chunks of lines, so only the structured code of one statement is kept. Its
+# labels are offsets counted from the instructions written before it. The
+# operand table is still kept to format operands.
+
+BUFFER_LINES = 1024
+MAX_OPERANDS = 4096
+
+
+class Emitter(ir.Program):
+    def __init__(self, write, buffer_lines=BUFFER_LINES):
+        ir.Program.__init__(self)
+        self.write = write
+        self.buffer_lines = buffer_lines
+        self.buffer = []
+        self.count = 0
+        # Whether the code written so far jumps to its end, which is labelled
+        # once the code after it is known
+        self.jumps_to_end = False
+
+    def release(self):
+        # Called between statements, when no operand index is held any more.
+        # Writes out their code and keeps the table from growing with the
+        # number of distinct operands.
+        self.lower()
+        if len(self.values) > MAX_OPERANDS:
+            self.kinds = array.array('B')
+            self.values = []
+            self.names = {}
+            self.consts = {}
+
+    def lower(self):
+        ops = self.ops
+        if not ops:
+            return
+        base = self.count
+        if cfg.STRUCTURED.isdisjoint(ops):
+            # Straight line code is the same lowered
+            self.count += len(ops)
+            if self.jumps_to_end:
+                self.line('L%d:' % base)
+                self.jumps_to_end = False
+            line = self.line
+            for i in range(len(ops)):
+                line(ir.instruction_text(self[i]))
+        else:
+            code = cfg.lower(self, base)
+            targets = code.targets()
+            if self.jumps_to_end:
+                targets.add(base)
+            self.count += len(code.ops)
+            self.jumps_to_end = self.count in targets
+            targets.discard(self.count)
+            for text in code.lines(base, targets):
+                self.line(text)
+        for column in (ops, self.dest, self.a, self.b):
+            del column[:]
+
+    def line(self, text):
+        buffer = self.buffer
+        buffer.append(text)
+        if len(buffer) >= self.buffer_lines:
+            self.write_buffer()
+
+    def write_buffer(self):
+        if self.buffer:
+            self.write(''.join(line + '\n' for line in self.buffer))
+            self.buffer = []
+
+    def flush(self):
+        # Writes out everything, the code is complete
+        self.lower()
+        if self.jumps_to_end:
+            self.line('L%d:' % self.count)
+            self.jumps_to_end = False
+        self.write_buffer()
+
+    def __len__(self):
+        # Instructions emitted, none of them are kept
+        return self.count
+
+
+class OutputFile:
+    # A text file that only changes if the output is committed. In truncate
+    # mode it is written under a private name and moved into place, in
+    # append mode anything written is cut off again on discard.
+    def __init__(self, path, append=False):
+        self.path = path
+        self.append = append
+        if append:
+            self.file = open(path, 'a')
+            self.start = self.file.tell()
+        else:
+            self.tmp = '%s.%d.tmp' % (path, os.getpid())
+            self.file = open(self.tmp, 'w')
+        self.write = self.file.write
+
+    def commit(self):
+        self.file.close()
+        if not self.append:
+            os.replace(self.tmp, self.path)
+
+    def discard(self):
+        if self.append:
+            self.file.flush()
+            self.file.truncate(self.start)
+            self.file.close()
+        else:
+            self.file.close()
+            os.remove(self.tmp)
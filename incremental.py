@@ -0,0 +1,216 @@
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+
+import emitter
+import ir
+from compiler import CompileError, Compiler
+from nodes import Declare, DeclareAssign
+
+# Incremental recompilation. The source is cut into its top level statements
+# and the tree and code of every statement are cached by the statement's
+# text, so after an edit only the statements that changed are lexed, parsed
+# and generated again and the code of the rest is spliced from the cache.
+# Keying by the text instead of a hash of the tree also skips the parse, and
+# hashing a tree costs about as much as generating its code. The code of a
+# statement also depends on the types of the names it uses that are declared
+# before it, an entry is only reused while they stay the same. Statements are
+# cached in structured form, the spliced program is lowered to jumps as a
+# whole since its labels are offsets into all of it.
+
+MAX_ENTRIES = 65536
+POLL_INTERVAL = 0.01
+
+# Strings are skipped the way the lexer reads them, up to the next quote not
+# escaped by a backslash on the same line
+_structure = re.compile(r'"(?:[^"\\\n]|\\.)*"|[{}();]')
+_continuation = re.compile(r'\s*(?:elif|else)\b')
+_do = re.compile(r'\s*do\b')
+
+
+def split_statements(text):
+    # Top level statements of a program as stripped text. A statement ends at
+    # a ';' outside of any braces and parentheses, or at the '}' closing its
+    # last block, except for an if that goes on with elif or else and a
+    # do-while that still needs its condition.
+    chunks = []
+    start = 0
+    braces = parens = 0
+    do = _do.match(text) is not None
+    for m in _structure.finditer(text):
+        c = m.group()
+        if c == '{':
+            braces += 1
+            continue
+        if c == '(':
+            parens += 1
+            continue
+        if c == ')':
+            parens -= 1
+            continue
+        if c == '}':
+            braces -= 1
+            if braces or parens or do or _continuation.match(text, m.end()):
+                continue
+        elif c != ';' or braces or parens:
+            continue
+        chunks.append(text[start:m.end()].strip())
+        start = m.end()
+        do = _do.match(text, start) is not None
+    rest = text[start:].strip()
+    if rest:
+        chunks.append(rest)
+    return chunks
+
+
+class CodeCache:
+    # Least recently used (statement, code) entries by statement text
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, valid=None):
+        # The entry of key, if there is one and valid(entry) holds
+        entry = self.entries.get(key)
+        if entry is not None and valid is not None and not valid(entry):
+            entry = None
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class IncrementalCompiler:
+    # The code of all statements interns its operands in one shared table, so
+    # splicing it into a program only has to renumber temporaries
+    def __init__(self, optimize=0, max_entries=MAX_ENTRIES, loops=()):
+        self.compiler = Compiler(optimize, loops=loops)
+        self.cache = CodeCache(max_entries)
+        self.prog = []
+        self.clear()
+
+    def clear(self):
+        self.table = ir.Program()
+        self.cache.clear()
+        self.baseline = None
+
+    def compile(self, text):
+        compiler = self.compiler
+        # Types of the top level declarations so far, the first one of a name
+        # counts like in the symbol table
+        declared = {}
+
+        def valid(entry):
+            return all(declared.get(name) == type_ for name, type_ in entry[2])
+
+        # Temporaries never live from one statement into the next, so the
+        # code is spliced as it is
+        program = self.table.shared()
+        prog = []
+        for chunk in split_statements(text):
+            entry = self.cache.get(chunk, valid)
+            if entry is None:
+                # Parsed on its own, seeing the declarations before it
+                try:
+                    stms = compiler.parse(chunk, declared)
+                except CompileError:
+                    stms = None
+                if stms is None or len(stms) != 1:
+                    # The errors are reported for the whole program. If it
+                    # parses after all, it is compiled without the cache.
+                    self.prog = compiler.parse(text)
+                    compiler.generate(self.prog)
+                    compiler.optimize()
+                    return compiler.lower()
+                compiler.program = self.table.shared()
+                compiler.statement(stms[0])
+                used = tuple((name, declared.get(name)) for name in compiler.symbols.used)
+                entry = (stms[0], compiler.program, used)
+                self.cache.put(chunk, entry)
+            stm = entry[0]
+            if type(stm) is Declare or type(stm) is DeclareAssign:
+                declared.setdefault(stm.name, stm.type)
+            program.splice(entry[1], False)
+            prog.append(stm)
+        program.detach()
+        self.prog = prog
+
+        # Operands of statements that were edited away stay in the table
+        if self.baseline is None:
+            self.baseline = len(self.table.values)
+        elif len(self.table.values) > 2 * self.baseline + 1024:
+            self.clear()
+
+        compiler.program = program
+        compiler.optimize()
+        return compiler.lower()
+
+
+def file_state(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def watch(compiler, source, output, binary=None, poll=POLL_INTERVAL):
+    # Recompiles source into output every time it is saved, until interrupted.
+    # A save that leaves the content unchanged is not compiled again.
+    print('Watching %s, press Ctrl-C to stop' % source, flush=True)
+    state = None
+    digest = None
+    try:
+        while True:
+            current = file_state(source)
+            if current is None or current == state:
+                time.sleep(poll)
+                continue
+            state = current
+            file = open(source, 'r')
+            text = file.read()
+            file.close()
+            new_digest = hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+            if new_digest == digest:
+                continue
+            digest = new_digest
+
+            start = time.perf_counter()
+            misses = compiler.cache.misses
+            try:
+                program = compiler.compile(text)
+            except CompileError as e:
+                for msg in e.errors:
+                    print(msg, flush=True)
+                continue
+
+            out = emitter.OutputFile(output)
+            out.write(program.text())
+            out.commit()
+            if binary:
+                file = open(binary, 'wb')
+                file.write(program.to_bytes())
+                file.close()
+            print('%s: %d statements, %d regenerated, %d instructions in %.1f ms'
+                  % (source, len(compiler.prog), compiler.cache.misses - misses, len(program),
+                     (time.perf_counter() - start) * 1e3), flush=True)
+    except KeyboardInterrupt:
+        pass
+    return 0
@@ -0,0 +1,195 @@
+import ir
+from nodes import Assign, Conditional, Declare, DeclareAssign, DoWhile, For, Id, Neg, Operation, Print, ToFloat, While
+from typecheck import LOGIC
+from vm import VMError, format_value
+
+# Executes a syntax tree directly, without generating code, with the same
+# results as compiling it and running it on the virtual machine. Statements
+# run from the same kind of work stack the code generator uses, a loop is a
+# generator that yields its body for every iteration, and the deep parts of
+# an expression are evaluated from a stack of their own, so neither nesting
+# depth nor the length of an expression is limited by the Python stack. A
+# step is an iteration of a loop.
+
+# Levels of an expression evaluated by recursing
+MAX_RECURSION = 50
+# Expression nodes evaluated from their operands, anything else is a constant
+# or a name
+COMPOUND = frozenset([Operation, Neg, ToFloat])
+# By operator and type of the result
+OPERATIONS = dict((key, ir.OPERATIONS[op]) for key, op in ir.TYPED_OPS.items())
+
+
+class Interpreter:
+    def __init__(self, out=None, max_steps=None):
+        self.out = out or print
+        self.max_steps = max_steps
+        self.steps = 0
+        self.vars = {}
+        self.simple = {
+            DeclareAssign: self.declare_assign,
+            Declare: self.declare,
+            Assign: self.assign,
+            Print: self.print_,
+        }
+        self.nested = {
+            Conditional: self.conditional,
+            While: self.while_,
+            DoWhile: self.do_while,
+            For: self.for_,
+        }
+
+    def __getitem__(self, name):
+        return self.vars[name]
+
+    def run(self, prog):
+        work = [iter(prog)]
+        simple = self.simple
+        nested = self.nested
+        try:
+            while work:
+                for stm in work[-1]:
+                    if type(stm) is list:
+                        work.append(iter(stm))
+                        break
+                    fn = simple.get(type(stm))
+                    if fn is not None:
+                        fn(stm)
+                    else:
+                        work.append(nested[type(stm)](stm))
+                        break
+                else:
+                    work.pop()
+        except (TypeError, ValueError, ZeroDivisionError, OverflowError) as e:
+            raise VMError('runtime error: %s' % e)
+        return self
+
+    def value(self, val, depth=0):
+        # Shallow expressions are evaluated recursively, a part nested deeper
+        # than MAX_RECURSION from an explicit stack
+        t = type(val)
+        if t is Id:
+            return self.vars.get(val.var)
+        if t not in COMPOUND:
+            return val
+        if depth >= MAX_RECURSION:
+            return self.evaluate(val)
+        depth += 1
+        if t is Operation:
+            if val.op == 'and':
+                return bool(self.value(val.left, depth)) and bool(self.value(val.right, depth))
+            if val.op == 'or':
+                return bool(self.value(val.left, depth)) or bool(self.value(val.right, depth))
+            return OPERATIONS[val.op, val.type](self.value(val.left, depth), self.value(val.right, depth))
+        if t is Neg:
+            return -self.value(val.value, depth)
+        return float(self.value(val.value, depth))
+
+    def evaluate(self, val):
+        # Evaluates an expression in post order from an explicit stack, so
+        # long chains like 1 + 1 + ... + 1 are not limited by the Python
+        # stack. Only compound nodes go on the stack, constants and names are
+        # read when the node using them is evaluated. and and or only
+        # evaluate their right side when the left one does not decide the
+        # result.
+        variables = self.vars
+        results = []
+        stack = [(val, False)]
+        while stack:
+            node, ready = stack.pop()
+            t = type(node)
+            if t is Operation:
+                left = node.left
+                right = node.right
+                if node.op in LOGIC:
+                    if ready is False:
+                        stack.append((node, True))
+                        if type(left) in COMPOUND:
+                            stack.append((left, False))
+                        continue
+                    if ready is True:
+                        t = type(left)
+                        value = bool(results.pop() if t in COMPOUND else variables.get(left.var) if t is Id else left)
+                        if value == (node.op == 'and'):
+                            stack.append((node, None))
+                            if type(right) in COMPOUND:
+                                stack.append((right, False))
+                        else:
+                            results.append(value)
+                        continue
+                    t = type(right)
+                    results.append(bool(results.pop() if t in COMPOUND else variables.get(right.var) if t is Id
+                                        else right))
+                    continue
+                if not ready:
+                    stack.append((node, True))
+                    if type(right) in COMPOUND:
+                        stack.append((right, False))
+                    if type(left) in COMPOUND:
+                        stack.append((left, False))
+                    continue
+                t = type(right)
+                b = results.pop() if t in COMPOUND else variables.get(right.var) if t is Id else right
+                t = type(left)
+                a = results.pop() if t in COMPOUND else variables.get(left.var) if t is Id else left
+                results.append(OPERATIONS[node.op, node.type](a, b))
+            else:
+                # A negation or a conversion to float
+                value = node.value
+                tv = type(value)
+                if not ready:
+                    stack.append((node, True))
+                    if tv in COMPOUND:
+                        stack.append((value, False))
+                    continue
+                a = results.pop() if tv in COMPOUND else variables.get(value.var) if tv is Id else value
+                results.append(-a if t is Neg else float(a))
+        return results.pop()
+
+    def step(self):
+        if self.max_steps is not None and self.steps >= self.max_steps:
+            raise VMError('step limit of %d exceeded' % self.max_steps)
+        self.steps += 1
+
+    def declare_assign(self, val):
+        self.vars[val.var] = self.value(val.value)
+
+    def declare(self, val):
+        self.vars[val.var] = ir.DEFAULTS[val.type]
+
+    def assign(self, val):
+        self.vars[val.var] = self.value(val.value)
+
+    def print_(self, val):
+        self.out(format_value(self.value(val.value)))
+
+    def conditional(self, val):
+        for arm in [val.if_] + val.elifs:
+            if self.value(arm.test):
+                yield arm.body
+                return
+        if val.else_ is not None:
+            yield val.else_.body
+
+    def while_(self, val):
+        while self.value(val.test):
+            self.step()
+            yield val.body
+
+    def do_while(self, val):
+        self.step()
+        yield val.body
+        while self.value(val.test):
+            self.step()
+            yield val.body
+
+    def for_(self, val):
+        self.declare_assign(val.init)
+        while self.value(val.test):
+            self.step()
+            yield val.body
+            self.assign(val.step)
+
+
+def run(prog, out=None, max_steps=None):
+    return Interpreter(out, max_steps).run(prog)
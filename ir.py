@@ -0,0 +1,379 @@
+import array
+import math
+import operator
+import struct
+import sys
+from collections import namedtuple
+
+# Three-address intermediate code. A Program keeps its instructions as
+# parallel array columns (opcode, dest, a, b). Operands are indexes in an
+# interned table of names, constants and labels, temporaries are not interned
+# but stored as -1 - n for tn, and -1 means the instruction has no such
+# operand. Arithmetic on operands whose types are known at compile time uses
+# the integer, float and string opcodes, the generic ones only remain for
+# values of undeclared variables.
+#
+# Code is generated and optimized in structured form, with markers opening
+# and closing every block, and lowered by cfg.lower to jumps to labels, a
+# label being the offset of the instruction it names.
+
+(DECLARE, MOVE, ADD, SUB, MUL, DIV, POW, EQ, NE, GE, LE, GT, LT, AND, OR, NEG, PRINT, TEST,
+ IF, END_IF, ELIF, END_ELIF, ELSE, END_ELSE, WHILE, END_WHILE, DO, DO_WHILE, END_DO,
+ FOR, END_FOR, IADD, ISUB, IMUL, IPOW, INEG, FADD, FSUB, FMUL, FDIV, FPOW, FNEG, CONCAT,
+ ITOF, BOOL, JUMP, JUMP_IF, JUMP_UNLESS) = range(48)
+
+BINARY_OPS = {'+': ADD, '-': SUB, '*': MUL, '/': DIV, '^': POW, '==': EQ, '!=': NE, '>=': GE,
+              '<=': LE, '>': GT, '<': LT, 'and': AND, 'or': OR}
+# Opcodes by operator and type of the result, None when it is not known
+TYPED_OPS = dict(((sym, type_), op) for sym, op in BINARY_OPS.items()
+                 for type_ in (None, 'int', 'float', 'string', 'boolean'))
+TYPED_OPS.update({('+', 'int'): IADD, ('-', 'int'): ISUB, ('*', 'int'): IMUL, ('^', 'int'): IPOW,
+                  ('+', 'float'): FADD, ('-', 'float'): FSUB, ('*', 'float'): FMUL, ('/', 'float'): FDIV,
+                  ('^', 'float'): FPOW, ('+', 'string'): CONCAT})
+NEG_OPS = {None: NEG, 'int': INEG, 'float': FNEG}
+
+SYMBOLS = dict((op, sym) for sym, op in BINARY_OPS.items())
+SYMBOLS.update({IADD: '+i', ISUB: '-i', IMUL: '*i', IPOW: '^i', FADD: '+f', FSUB: '-f', FMUL: '*f', FDIV: '/f',
+                FPOW: '^f', CONCAT: '+s'})
+UNARY_SYMBOLS = {NEG: '-', INEG: '-i', FNEG: '-f', ITOF: 'float', BOOL: 'bool'}
+
+
+def int_pow(x, y):
+    if y < 0:
+        raise ValueError('negative exponent %d in integer power' % y)
+    return x ** y
+
+
+# What every operation computes, shared by the virtual machine and the
+# constant folding in the optimizer
+OPERATIONS = {ADD: operator.add, SUB: operator.sub, MUL: operator.mul, DIV: operator.truediv,
+              POW: operator.pow, EQ: operator.eq, NE: operator.ne, GE: operator.ge, LE: operator.le,
+              GT: operator.gt, LT: operator.lt, AND: lambda x, y: bool(x and y),
+              OR: lambda x, y: bool(x or y), IADD: operator.add, ISUB: operator.sub, IMUL: operator.mul,
+              IPOW: int_pow, FADD: operator.add, FSUB: operator.sub, FMUL: operator.mul,
+              FDIV: operator.truediv, FPOW: math.pow, CONCAT: operator.add}
+UNARY_OPERATIONS = {NEG: operator.neg, INEG: operator.neg, FNEG: operator.neg, ITOF: float, BOOL: bool}
+
+# Value of a declared but unassigned variable
+DEFAULTS = {'int': 0, 'float': 0.0, 'string': '', 'boolean': False}
+
+# Structural markers, printed as they are
+MARKERS = {IF: 'if', END_IF: 'end if', ELIF: 'elif', END_ELIF: 'end elif', ELSE: 'else',
+           END_ELSE: 'end else', WHILE: 'while', END_WHILE: 'end while', DO: 'do',
+           DO_WHILE: 'while', END_DO: 'end do', FOR: 'for', END_FOR: 'end for'}
+
+OPENERS = {IF: END_IF, ELIF: END_ELIF, ELSE: END_ELSE, WHILE: END_WHILE, DO: END_DO, FOR: END_FOR}
+CLOSERS = dict((close, start) for start, close in OPENERS.items())
+LOOPS = (WHILE, DO, FOR)
+
+# Jumps of lowered code, the label is a for a jump and b for the conditional
+# ones
+JUMPS = (JUMP, JUMP_IF, JUMP_UNLESS)
+
+# Operand kinds
+TEMP, NAME, CONST, LABEL = range(4)
+
+Instruction = namedtuple('Instruction', 'op dest a b')
+
+MAGIC = b'SCIR'
+VERSION = 3
+
+
+def operand_text(operand):
+    kind, value = operand
+    if kind == TEMP:
+        return 't%d' % value
+    if kind == NAME:
+        return value
+    if kind == LABEL:
+        return 'L%d' % value
+    if type(value) is str:
+        if '\\' in value or '"' in value or '\n' in value or '\t' in value:
+            # Escaped the way the lexer reads strings
+            value = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\t', '\\t')
+        return '"%s"' % value
+    if type(value) is bool:
+        return 'true' if value else 'false'
+    return repr(value)
+
+
+def instruction_text(instr):
+    op = instr.op
+    if op in MARKERS:
+        return MARKERS[op]
+    if op in SYMBOLS:
+        return '%s = %s %s %s' % (operand_text(instr.dest), operand_text(instr.a), SYMBOLS[op],
+                                  operand_text(instr.b))
+    if op == MOVE:
+        return '%s = %s' % (operand_text(instr.dest), operand_text(instr.a))
+    if op in UNARY_SYMBOLS:
+        return '%s = %s %s' % (operand_text(instr.dest), UNARY_SYMBOLS[op], operand_text(instr.a))
+    if op == DECLARE:
+        return '%s %s' % (instr.a[1], operand_text(instr.dest))
+    if op == PRINT:
+        return 'print ' + operand_text(instr.a)
+    if op == TEST:
+        return 'test ' + operand_text(instr.a)
+    if op == JUMP:
+        return 'goto ' + operand_text(instr.a)
+    if op == JUMP_IF:
+        return 'if %s goto %s' % (operand_text(instr.a), operand_text(instr.b))
+    if op == JUMP_UNLESS:
+        return 'iffalse %s goto %s' % (operand_text(instr.a), operand_text(instr.b))
+    raise ValueError('unknown opcode %d' % op)
+
+
+def match_markers(ops):
+    # Returns the matching closing index of every opener, and the opener that
+    # owns every test and do-while condition marker
+    match = {}
+    owner = {}
+    stack = []
+    for pc, op in enumerate(ops):
+        if op in OPENERS:
+            stack.append(pc)
+        elif op == TEST or op == DO_WHILE:
+            if not stack:
+                raise ValueError('%s outside of a block at instruction %d' % (MARKERS.get(op, 'test'), pc))
+            owner[pc] = stack[-1]
+        elif op in CLOSERS:
+            if not stack or OPENERS[ops[stack[-1]]] != op:
+                raise ValueError('unmatched %s at instruction %d' % (MARKERS[op], pc))
+            match[stack.pop()] = pc
+    if stack:
+        raise ValueError('unterminated %s at instruction %d' % (MARKERS[ops[stack[-1]]], stack[-1]))
+    return match, owner
+
+
+def chain_end(ops, match, pc):
+    # First instruction after the if/elif/else chain continuing at pc
+    while pc < len(ops) and ops[pc] == ELIF:
+        pc = match[pc] + 1
+    if pc < len(ops) and ops[pc] == ELSE:
+        pc = match[pc] + 1
+    return pc
+
+
+class Program:
+    def __init__(self):
+        self.ops = array.array('B')
+        self.dest = array.array('i')
+        self.a = array.array('i')
+        self.b = array.array('i')
+        self.kinds = array.array('B')
+        self.values = []
+        self.names = {}
+        self.consts = {}
+        self.temps = 0
+
+    def name(self, name):
+        i = self.names.get(name)
+        if i is None:
+            i = self.names[name] = len(self.values)
+            self.kinds.append(NAME)
+            self.values.append(name)
+        return i
+
+    def const(self, value):
+        # The value type is part of the key so 1, 1.0 and true stay distinct,
+        # and the sign of a float zero so -0.0 does not print as 0.0
+        key = (type(value), value)
+        if value == 0 and type(value) is float:
+            key = (float, value, math.copysign(1.0, value))
+        i = self.consts.get(key)
+        if i is None:
+            i = self.consts[key] = len(self.values)
+            self.kinds.append(CONST)
+            self.values.append(value)
+        return i
+
+    def label(self, offset):
+        # Interned with the constants, under a key no constant has
+        key = (LABEL, offset)
+        i = self.consts.get(key)
+        if i is None:
+            i = self.consts[key] = len(self.values)
+            self.kinds.append(LABEL)
+            self.values.append(offset)
+        return i
+
+    def temp(self, n=None):
+        if n is None:
+            self.temps += 1
+            n = self.temps
+        elif n > self.temps:
+            self.temps = n
+        return -1 - n
+
+    def intern(self, operand):
+        if operand is None:
+            return -1
+        kind, value = operand
+        if kind == TEMP:
+            return self.temp(value)
+        if kind == NAME:
+            return self.name(value)
+        if kind == LABEL:
+            return self.label(value)
+        return self.const(value)
+
+    def operand(self, i):
+        if i >= 0:
+            return (self.kinds[i], self.values[i])
+        if i < -1:
+            return (TEMP, -1 - i)
+        return None
+
+    def emit(self, op, dest=-1, a=-1, b=-1):
+        self.ops.append(op)
+        self.dest.append(dest)
+        self.a.append(a)
+        self.b.append(b)
+
+    def append(self, instr):
+        # Add an instruction whose operands are (kind, value) pairs, possibly
+        # taken from another program
+        self.emit(instr.op, self.intern(instr.dest), self.intern(instr.a), self.intern(instr.b))
+
+    def extend(self, instrs):
+        for instr in instrs:
+            self.append(instr)
+
+    def shared(self):
+        # An empty program that interns its operands in the table of this one
+        program = Program()
+        program.kinds, program.values, program.names, program.consts = self.kinds, self.values, self.names, self.consts
+        return program
+
+    def detach(self):
+        # Stop sharing the operand table with other programs
+        self.kinds = array.array('B', self.kinds)
+        self.values = list(self.values)
+        self.names = dict(self.names)
+        self.consts = dict(self.consts)
+
+    def splice(self, other, renumber=True):
+        # Append the code of another program, its temporaries are renumbered
+        # after the ones already in use unless the code is known not to keep
+        # any alive from before. Operands are interned here unless both
+        # programs share one table.
+        if renumber:
+            shift = self.temps
+            self.temps += other.temps
+        else:
+            shift = 0
+            self.temps = max(self.temps, other.temps)
+        self.ops.extend(other.ops)
+        if other.values is self.values:
+            if not shift:
+                self.dest.extend(other.dest)
+                self.a.extend(other.a)
+                self.b.extend(other.b)
+                return
+            remap = range(len(self.values))
+        else:
+            remap = [self.name(value) if kind == NAME else self.label(value) if kind == LABEL else self.const(value)
+                     for kind, value in zip(other.kinds, other.values)]
+        for column, code in ((self.dest, other.dest), (self.a, other.a), (self.b, other.b)):
+            column.extend(array.array('i', [remap[i] if i >= 0 else (i - shift if i < -1 else -1) for i in code]))
+
+    def __len__(self):
+        return len(self.ops)
+
+    def __getitem__(self, i):
+        operand = self.operand
+        return Instruction(self.ops[i], operand(self.dest[i]), operand(self.a[i]), operand(self.b[i]))
+
+    def __iter__(self):
+        for i in range(len(self.ops)):
+            yield self[i]
+
+    def targets(self):
+        # Offsets jumped to
+        values = self.values
+        return set(values[self.a[pc] if op == JUMP else self.b[pc]] for pc, op in enumerate(self.ops) if op in JUMPS)
+
+    def lines(self, base=0, targets=None):
+        # Text of the code, an instruction that is jumped to preceded by its
+        # label. Offsets are counted from base, targets defaults to the ones
+        # of this code.
+        if targets is None:
+            targets = self.targets()
+        for i, instr in enumerate(self):
+            if base + i in targets:
+                yield 'L%d:' % (base + i)
+            yield instruction_text(instr)
+        if base + len(self.ops) in targets:
+            yield 'L%d:' % (base + len(self.ops))
+
+    def text(self):
+        return ''.join(line + '\n' for line in self.lines())
+
+    def to_bytes(self):
+        out = [struct.pack('<4sHIII', MAGIC, VERSION, len(self.ops), len(self.values), self.temps)]
+        for kind, value in zip(self.kinds, self.values):
+            if kind == NAME:
+                data = value.encode('utf-8')
+                out.append(struct.pack('<BI', kind, len(data)) + data)
+            elif type(value) is bool:
+                out.append(struct.pack('<BcB', kind, b'b', value))
+            elif type(value) is int:
+                data = value.to_bytes((value.bit_length() + 8) // 8, 'little', signed=True)
+                out.append(struct.pack('<BcI', kind, b'i', len(data)) + data)
+            elif type(value) is float:
+                out.append(struct.pack('<Bcd', kind, b'f', value))
+            else:
+                data = value.encode('utf-8')
+                out.append(struct.pack('<BcI', kind, b's', len(data)) + data)
+        for column in (self.ops, self.dest, self.a, self.b):
+            if sys.byteorder == 'big':
+                column = array.array(column.typecode, column)
+                column.byteswap()
+            out.append(column.tobytes())
+        return b''.join(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, count, noperands, temps = struct.unpack_from('<4sHIII', data)
+        # Older versions only lack opcodes: the typed ones in version 1 and
+        # the jumps in 1 and 2
+        if magic != MAGIC or not 1 <= version <= VERSION:
+            raise ValueError('not a version %d program' % VERSION)
+        program = cls()
+        program.temps = temps
+        pos = struct.calcsize('<4sHIII')
+        for _ in range(noperands):
+            kind = data[pos]
+            pos += 1
+            if kind == NAME:
+                size = struct.unpack_from('<I', data, pos)[0]
+                program.name(data[pos + 4:pos + 4 + size].decode('utf-8'))
+                pos += 4 + size
+            else:
+                tag = data[pos:pos + 1]
+                pos += 1
+                if tag == b'b':
+                    value = bool(data[pos])
+                    pos += 1
+                elif tag == b'f':
+                    value = struct.unpack_from('<d', data, pos)[0]
+                    pos += 8
+                else:
+                    size = struct.unpack_from('<I', data, pos)[0]
+                    raw = data[pos + 4:pos + 4 + size]
+                    pos += 4 + size
+                    if tag == b'i':
+                        value = int.from_bytes(raw, 'little', signed=True)
+                    else:
+                        value = raw.decode('utf-8')
+                if kind == LABEL:
+                    program.label(value)
+                else:
+                    program.const(value)
+        for column in (program.ops, program.dest, program.a, program.b):
+            size = count * column.itemsize
+            column.frombytes(data[pos:pos + size])
+            if sys.byteorder == 'big':
+                column.byteswap()
+            pos += size
+        return program
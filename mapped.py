@@ -0,0 +1,151 @@
+import mmap
+import re
+
+from compiler import literals, reserved, unescape
+
+# Lexing straight from a memory mapped file. The PLY lexer needs the whole
+# script as one str and copies out the text of every token, this lexer
+# matches bytes regexes against the mapping itself and a token only keeps
+# the (start, end) offsets of its text: its value is decoded the first time
+# the parser reads it, which never happens for punctuation and keywords the
+# grammar actions ignore. Pages the lexer has moved past are dropped from
+# memory every DROP_BYTES, a parser action that still reads a token there
+# has the page read in again, so memory stays flat however large the file.
+# Line numbers count \n, \r\n and \r alike, the way reading the file in text
+# mode does, and column() gives the column of an offset.
+
+DROP_BYTES = 16 << 20
+
+_master = re.compile(rb'''
+    (?P<ignore>[ \t]+)
+  | (?P<FLOATV>\d+\.\d+)
+  | (?P<INTV>\d+)
+  | (?P<STRING>"(?:[^"\\\r\n]|\\[^\r\n])*")
+  | (?P<ID>[a-zA-Z_][a-zA-Z_0-9]*)
+  | (?P<newline>(?:\r\n?|\n)+)
+  | (?P<operator>==|!=|>=|<=)
+''', re.VERBOSE)
+
+_reserved = dict((word.encode(), kind) for word, kind in reserved.items())
+_longest_reserved = max(len(word) for word in reserved)
+# Two character operators by their first byte
+_operators = {ord('='): 'EQC', ord('!'): 'NOTEQC', ord('>'): 'BIGGEREQ', ord('<'): 'SMALLEREQ'}
+_literals = dict((ord(c), c) for c in literals)
+
+
+class Token:
+    __slots__ = ('type', 'lineno', 'lexpos', 'end', 'buffer', 'lexer', '_value')
+
+    def __init__(self, type_, lineno, lexpos, end, buffer):
+        self.type = type_
+        self.lineno = lineno
+        self.lexpos = lexpos
+        self.end = end
+        self.buffer = buffer
+        self._value = None
+
+    @property
+    def value(self):
+        value = self._value
+        if value is None:
+            raw = self.buffer[self.lexpos:self.end]
+            kind = self.type
+            if kind == 'INTV':
+                value = int(raw)
+            elif kind == 'FLOATV':
+                value = float(raw)
+            elif kind == 'STRINGV':
+                value = unescape(raw[1:-1].decode('utf-8'))
+            else:
+                value = raw.decode('utf-8')
+            self._value = value
+        return value
+
+    def __repr__(self):
+        return 'LexToken(%s,%r,%d,%d)' % (self.type, self.value, self.lineno, self.lexpos)
+
+
+def open_source(path):
+    # Read only mapping of the file, or empty bytes for an empty file, which
+    # can't be mapped
+    file = open(path, 'rb')
+    try:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        return b''
+    finally:
+        file.close()
+
+
+def column(buffer, pos):
+    # 1 based column of an offset
+    return pos - max(buffer.rfind(b'\n', 0, pos), buffer.rfind(b'\r', 0, pos))
+
+
+class MappedLexer:
+    # Takes the place of the PLY lexer, input() accepts any bytes-like buffer
+    def __init__(self):
+        self.compiler = None
+        self.buffer = b''
+        self.lexpos = 0
+        self.lineno = 1
+        self.dropped = 0
+
+    def input(self, buffer):
+        self.buffer = buffer
+        self.lexpos = 0
+        self.dropped = 0
+
+    def column(self, pos):
+        return column(self.buffer, pos)
+
+    def drop(self, pos):
+        # Releases the pages before pos, a multiple of the page size
+        pos -= pos % mmap.PAGESIZE
+        if pos > self.dropped and hasattr(self.buffer, 'madvise'):
+            self.buffer.madvise(mmap.MADV_DONTNEED, 0, pos)
+            self.dropped = pos
+
+    def token(self):
+        buffer = self.buffer
+        pos = self.lexpos
+        end = len(buffer)
+        match = _master.match
+        while pos < end:
+            m = match(buffer, pos)
+            if m is None:
+                kind = _literals.get(buffer[pos])
+                if kind is None:
+                    # Reports a whole UTF-8 character
+                    size = 1
+                    lead = buffer[pos]
+                    if lead >= 0xc0:
+                        size = 2 if lead < 0xe0 else 3 if lead < 0xf0 else 4
+                    char = buffer[pos:pos + size].decode('utf-8', 'replace')
+                    self.compiler.error("Illegal character '%s'" % char)
+                    pos += size
+                    continue
+                self.lexpos = pos + 1
+                return Token(kind, self.lineno, pos, pos + 1, buffer)
+            kind = m.lastgroup
+            start = pos
+            pos = m.end()
+            if kind == 'ignore':
+                continue
+            if kind == 'newline':
+                run = buffer[start:pos]
+                self.lineno += run.count(b'\n') + run.count(b'\r') - run.count(b'\r\n')
+                if pos - self.dropped > DROP_BYTES:
+                    self.drop(pos - DROP_BYTES // 2)
+                continue
+            if kind == 'ID':
+                if pos - start <= _longest_reserved:
+                    kind = _reserved.get(buffer[start:pos], 'ID')
+            elif kind == 'STRING':
+                kind = 'STRINGV'
+            elif kind == 'operator':
+                kind = _operators[buffer[start]]
+            self.lexpos = pos
+            return Token(kind, self.lineno, start, pos, buffer)
+        self.lexpos = pos
+        return None
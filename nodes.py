@@ -0,0 +1,211 @@
+# Syntax tree nodes built by the parser actions. Every kind of node is a
+# class with __slots__, so a node is a small fixed object without a dict and
+# code looks at type(node) instead of comparing a string tag. Constants stay
+# plain int, float, str and bool values and blocks stay lists of statements.
+# A node prints as the tuple the tree used to be made of, tag first. An
+# expression node also has the type the parser worked out for it and a
+# statement or if arm the source line it starts on, neither part of its
+# fields, None when it is not known. A name, declaration or assignment keeps
+# the id of the declaration it refers to in the symbol table it was parsed
+# with, None when there is none, and the variable holding its value: the
+# name itself, unless the declaration hides one of an enclosing block, see
+# symbols.py.
+
+
+def tree_text(tree):
+    # repr of a node or a list of statements, built from an explicit stack in
+    # one pass so long expressions print in linear time at any depth
+    parts = []
+    stack = [(False, tree)]
+    while stack:
+        text, item = stack.pop()
+        if text:
+            parts.append(item)
+        elif isinstance(item, Node):
+            parts.append('(' + repr(item.tag))
+            stack.append((True, ')'))
+            for name in reversed(item.fields):
+                stack.append((False, getattr(item, name)))
+                stack.append((True, ', '))
+        elif type(item) is list:
+            parts.append('[')
+            stack.append((True, ']'))
+            for i in range(len(item) - 1, -1, -1):
+                stack.append((False, item[i]))
+                if i:
+                    stack.append((True, ', '))
+        else:
+            parts.append(repr(item))
+    return ''.join(parts)
+
+
+class Node:
+    __slots__ = fields = ()
+    tag = None
+
+    def __repr__(self):
+        return tree_text(self)
+
+
+class Declare(Node):
+    __slots__ = ('type', 'name', 'line', 'sid', 'var')
+    fields = ('type', 'name')
+    tag = 'declare'
+
+    def __init__(self, type_, name, line=None, sid=None, var=None):
+        self.type = type_
+        self.name = name
+        self.line = line
+        self.sid = sid
+        self.var = name if var is None else var
+
+
+class DeclareAssign(Node):
+    __slots__ = ('type', 'name', 'value', 'line', 'sid', 'var')
+    fields = ('type', 'name', 'value')
+    tag = 'declareAssign'
+
+    def __init__(self, type_, name, value, line=None, sid=None, var=None):
+        self.type = type_
+        self.name = name
+        self.value = value
+        self.line = line
+        self.sid = sid
+        self.var = name if var is None else var
+
+
+class Assign(Node):
+    __slots__ = ('name', 'value', 'line', 'sid', 'var')
+    fields = ('name', 'value')
+    tag = 'assign'
+
+    def __init__(self, name, value, line=None, sid=None, var=None):
+        self.name = name
+        self.value = value
+        self.line = line
+        self.sid = sid
+        self.var = name if var is None else var
+
+
+class Print(Node):
+    __slots__ = ('value', 'line')
+    fields = ('value',)
+    tag = 'print'
+
+    def __init__(self, value, line=None):
+        self.value = value
+        self.line = line
+
+
+class Conditional(Node):
+    # An If arm, a list of Elif arms and an Else or None, on the line of the
+    # If
+    __slots__ = fields = ('if_', 'elifs', 'else_')
+    tag = 'conditional'
+
+    def __init__(self, if_, elifs, else_):
+        self.if_ = if_
+        self.elifs = elifs
+        self.else_ = else_
+
+    @property
+    def line(self):
+        return self.if_.line
+
+
+class If(Node):
+    __slots__ = ('test', 'body', 'line')
+    fields = ('test', 'body')
+    tag = 'if'
+
+    def __init__(self, test, body, line=None):
+        self.test = test
+        self.body = body
+        self.line = line
+
+
+class Elif(If):
+    __slots__ = ()
+    tag = 'elif'
+
+
+class Else(Node):
+    __slots__ = fields = ('body',)
+    tag = 'else'
+
+    def __init__(self, body):
+        self.body = body
+
+
+class While(Node):
+    __slots__ = ('test', 'body', 'line')
+    fields = ('test', 'body')
+    tag = 'while'
+
+    def __init__(self, test, body, line=None):
+        self.test = test
+        self.body = body
+        self.line = line
+
+
+class DoWhile(While):
+    __slots__ = ()
+    tag = 'do-while'
+
+
+class For(Node):
+    # A DeclareAssign, the test, an Assign and the body
+    __slots__ = ('init', 'test', 'step', 'body', 'line')
+    fields = ('init', 'test', 'step', 'body')
+    tag = 'for'
+
+    def __init__(self, init, test, step, body, line=None):
+        self.init = init
+        self.test = test
+        self.step = step
+        self.body = body
+        self.line = line
+
+
+class Operation(Node):
+    __slots__ = ('left', 'op', 'right', 'type')
+    fields = ('left', 'op', 'right')
+    tag = 'operation'
+
+    def __init__(self, left, op, right, type_=None):
+        self.left = left
+        self.op = op
+        self.right = right
+        self.type = type_
+
+
+class Neg(Node):
+    __slots__ = ('value', 'type')
+    fields = ('value',)
+    tag = 'neg'
+
+    def __init__(self, value, type_=None):
+        self.value = value
+        self.type = type_
+
+
+class ToFloat(Node):
+    # An int expression used where a float is expected
+    __slots__ = fields = ('value',)
+    tag = 'float'
+    type = 'float'
+
+    def __init__(self, value):
+        self.value = value
+
+
+class Id(Node):
+    __slots__ = ('name', 'type', 'sid', 'var')
+    fields = ('name',)
+    tag = 'id'
+
+    def __init__(self, name, type_=None, sid=None, var=None):
+        self.name = name
+        self.type = type_
+        self.sid = sid
+        self.var = name if var is None else var
@@ -0,0 +1,735 @@
+import functools
+import itertools
+import math
+
+import ir
+from ir import Instruction
+
+# Optimization passes over the structured intermediate code. Every pass takes
+# and returns a list of ir.Instruction. Block markers are never reordered, so
+# the passes only have to be careful where control flow joins: at the head of
+# a loop and after the end of any block, facts about the operands written
+# inside that block are dropped.
+
+PURE = set(ir.OPERATIONS) | set(ir.UNARY_OPERATIONS) | set([ir.MOVE])
+
+# Operations that can't fail at run time on the operands the type checker
+# gives them. A division, power or conversion can, and so can any generic
+# operation, whose operands may be values of undeclared variables: they are
+# only removed or moved when their operands are constants that fold.
+SAFE = frozenset([ir.MOVE, ir.IADD, ir.ISUB, ir.IMUL, ir.INEG, ir.FADD, ir.FSUB, ir.FMUL, ir.FNEG, ir.CONCAT,
+                  ir.EQ, ir.NE, ir.AND, ir.OR, ir.BOOL])
+
+# Largest integer, in bits, and string, in characters, constant folding
+# gives by default, and the number of steps it may take in one optimize()
+# call, a step being an operation evaluated or an iteration of a loop
+# counter stepped at compile time. Beyond them an operation is left to run
+# time, so hostile constants like 9 ^ 9 ^ 9 ^ 9 or programs full of loops
+# can't take the compiler unbounded time and memory. optimize() takes other
+# limits as (bits, characters, steps).
+MAX_FOLDED_BITS = 1024
+MAX_FOLDED_LENGTH = 4096
+MAX_FOLDING_STEPS = 1000000
+LIMITS = (MAX_FOLDED_BITS, MAX_FOLDED_LENGTH, MAX_FOLDING_STEPS)
+
+
+class Limits:
+    # The folding limits of one optimize() call and the steps it has left
+    __slots__ = ('bits', 'length', 'steps')
+
+    def __init__(self, limits=LIMITS):
+        self.bits, self.length, self.steps = limits
+
+    def step(self):
+        # Once the steps are used up, anything else is left to run time
+        if self.steps <= 0:
+            raise OverflowError('folding steps used up')
+        self.steps -= 1
+
+
+def is_const(operand):
+    return operand is not None and operand[0] == ir.CONST
+
+
+def is_temp(operand):
+    return operand is not None and operand[0] == ir.TEMP
+
+
+def is_boundary(op):
+    # Instructions that end a straight line segment
+    return op == ir.TEST or op in ir.MARKERS
+
+
+def blocks(code):
+    ops = [ins.op for ins in code]
+    match, owner = ir.match_markers(ops)
+    return ops, match, owner
+
+
+def assigned_in_blocks(code):
+    # Operands written anywhere inside each block, keyed by opener and closer
+    assigned = {}
+    stack = []
+    for pc, ins in enumerate(code):
+        if ins.op in ir.OPENERS:
+            stack.append((pc, set()))
+        elif ins.op in ir.CLOSERS:
+            start, written = stack.pop()
+            assigned[start] = assigned[pc] = written
+            if stack:
+                stack[-1][1].update(written)
+        elif ins.dest is not None and stack:
+            stack[-1][1].add(ins.dest)
+    return assigned
+
+
+def evaluate(op, x, y=None, limits=None):
+    # x op y computed at compile time, a step of limits, a Limits. An integer
+    # or string result past the folding limits is an OverflowError, found
+    # from the sizes of the operands before a product or power is computed.
+    if limits is None:
+        limits = Limits()
+    limits.step()
+    if op in ir.UNARY_OPERATIONS:
+        return ir.UNARY_OPERATIONS[op](x)
+    bits, length = limits.bits, limits.length
+    tx, ty = type(x), type(y)
+    if op in MULTIPLICATIONS:
+        if tx is str or ty is str:
+            if (len(x) * y if tx is str else x * len(y)) > length:
+                raise OverflowError('string too long to fold')
+        elif tx is int and ty is int and x.bit_length() + y.bit_length() > bits:
+            raise OverflowError('integer too large to fold')
+    elif op in POWERS and tx is int and ty is int and y > 0 and abs(x) > 1:
+        # The result has at least this many bits
+        if (abs(x).bit_length() - 1) * y > bits:
+            raise OverflowError('integer too large to fold')
+    value = ir.OPERATIONS[op](x, y)
+    t = type(value)
+    if (t is int and value.bit_length() > bits) or (t is str and len(value) > length):
+        raise OverflowError('result too large to fold')
+    return value
+
+
+def fold(op, a, b, limits=None):
+    # Constant result of an operation, None when it can't be computed at
+    # compile time or is too large, it is then left to run time
+    try:
+        value = evaluate(op, a[1], None if b is None else b[1], limits)
+    except (ArithmeticError, TypeError, ValueError):
+        return None
+    return (ir.CONST, value)
+
+
+def cannot_fail(op, a, b, limits=None):
+    # Whether an operation gives a value at run time, so it can be removed
+    # when the value is not needed. A float division by a constant other
+    # than zero gives one too, an infinity at worst.
+    if op in SAFE or (op == ir.FDIV and is_number(b) and b[1]):
+        return True
+    return is_const(a) and (b is None or is_const(b)) and fold(op, a, b, limits) is not None
+
+
+def temp_uses(code):
+    uses = {}
+    for ins in code:
+        for operand in (ins.a, ins.b):
+            if is_temp(operand):
+                uses[operand] = uses.get(operand, 0) + 1
+    return uses
+
+
+def propagate_constants(code, limits=None):
+    # Replaces operands known to hold a constant and folds operations whose
+    # operands are all constant into moves
+    assigned = assigned_in_blocks(code)
+    env = {}
+    out = []
+    for pc, ins in enumerate(code):
+        op = ins.op
+        if op in ir.LOOPS or op in ir.CLOSERS:
+            for operand in assigned[pc]:
+                env.pop(operand, None)
+
+        a = env.get(ins.a, ins.a)
+        b = env.get(ins.b, ins.b)
+        if (op in ir.OPERATIONS and is_const(a) and is_const(b)) or (op in ir.UNARY_OPERATIONS and is_const(a)):
+            value = fold(op, a, b, limits)
+            if value is not None:
+                op, a, b = ir.MOVE, value, None
+        ins = Instruction(op, ins.dest, a, b)
+        out.append(ins)
+
+        if op == ir.MOVE and is_const(a):
+            env[ins.dest] = a
+        elif op == ir.DECLARE:
+            env[ins.dest] = (ir.CONST, ir.DEFAULTS[a[1]])
+        elif ins.dest is not None:
+            env.pop(ins.dest, None)
+    return out
+
+
+def eliminate_branches(code):
+    # Resolves tests on constants: branches that can't be taken are removed
+    # and branches that are always taken lose their test and markers
+    ops, match, owner = blocks(code)
+    dowhile = dict((owner[pc], pc) for pc, op in enumerate(ops) if op == ir.DO_WHILE)
+    keep = [True] * len(code)
+
+    def drop(start, end):
+        for pc in range(start, end + 1):
+            keep[pc] = False
+
+    def drop_following_arms(end):
+        pc = end + 1
+        while pc < len(ops) and ops[pc] in (ir.ELIF, ir.ELSE):
+            drop(pc, match[pc])
+            pc = match[pc] + 1
+
+    for pc, ins in enumerate(code):
+        if ins.op != ir.TEST or not keep[pc] or not is_const(ins.a):
+            continue
+        start = owner[pc]
+        end = match[start]
+        kind = ops[start]
+        if ins.a[1]:
+            keep[pc] = False
+            if kind == ir.IF:
+                keep[start] = keep[end] = False
+                drop_following_arms(end)
+            elif kind == ir.ELIF:
+                ops[start], ops[end] = ir.ELSE, ir.END_ELSE
+                drop_following_arms(end)
+            # An always true loop condition just loops, without the test
+        elif kind == ir.IF:
+            drop(start, end)
+            following = end + 1
+            if following < len(ops) and ops[following] == ir.ELIF:
+                ops[following], ops[match[following]] = ir.IF, ir.END_IF
+            elif following < len(ops) and ops[following] == ir.ELSE:
+                keep[following] = keep[match[following]] = False
+        elif kind == ir.DO:
+            # The body still runs once
+            keep[start] = False
+            drop(dowhile[start], end)
+        else:
+            drop(start, end)
+
+    return [Instruction(ops[pc], ins.dest, ins.a, ins.b) for pc, ins in enumerate(code) if keep[pc]]
+
+
+def eliminate_dead_code(code, limits=None):
+    # Removes computations into temporaries that are never read and stores to
+    # variables that are overwritten later in the same straight line segment
+    # before being read, unless they can fail at run time. Variables are live
+    # at the end of the program.
+    uses = temp_uses(code)
+    keep = [True] * len(code)
+    overwritten = set()
+    for pc in range(len(code) - 1, -1, -1):
+        ins = code[pc]
+        op = ins.op
+        if op in PURE and cannot_fail(op, ins.a, ins.b, limits):
+            dest = ins.dest
+            if (is_temp(dest) and not uses.get(dest)) or dest in overwritten:
+                keep[pc] = False
+                for operand in (ins.a, ins.b):
+                    if is_temp(operand):
+                        uses[operand] -= 1
+                continue
+        if is_boundary(op):
+            overwritten.clear()
+        elif ins.dest is not None and ins.dest[0] == ir.NAME:
+            overwritten.add(ins.dest)
+        overwritten.discard(ins.a)
+        overwritten.discard(ins.b)
+    return [ins for pc, ins in enumerate(code) if keep[pc]]
+
+
+def eliminate_common_subexpressions(code):
+    # Within a straight line segment, an operation already computed into an
+    # operand that still holds it is replaced by a copy, and copies into
+    # temporaries are propagated to their readers
+    uses = temp_uses(code)
+    available = {}
+    copies = {}
+    out = []
+    moves = []
+
+    def kill(operand):
+        for key in [key for key, holder in available.items()
+                    if holder == operand or operand == key[1] or operand == key[2]]:
+            del available[key]
+        for temp in [temp for temp, source in copies.items() if temp == operand or source == operand]:
+            del copies[temp]
+
+    def read(operand):
+        source = copies.get(operand)
+        if source is None:
+            return operand
+        uses[operand] -= 1
+        if is_temp(source):
+            uses[source] = uses.get(source, 0) + 1
+        return source
+
+    for ins in code:
+        op = ins.op
+        a = read(ins.a)
+        b = read(ins.b)
+        dest = ins.dest
+        if is_boundary(op):
+            available.clear()
+            copies.clear()
+        elif op in ir.OPERATIONS or op in ir.UNARY_OPERATIONS:
+            holder = available.get((op, a, b))
+            if holder == dest:
+                # Computed into the operand that still holds it, which
+                # happens once temporaries are reused
+                for operand in (a, b):
+                    if is_temp(operand):
+                        uses[operand] -= 1
+                continue
+            kill(dest)
+            if holder is not None:
+                for operand in (a, b):
+                    if is_temp(operand):
+                        uses[operand] -= 1
+                op, a, b = ir.MOVE, holder, None
+                if is_temp(holder):
+                    uses[holder] = uses.get(holder, 0) + 1
+                if is_temp(dest):
+                    copies[dest] = holder
+                    moves.append(len(out))
+            elif dest != a and dest != b:
+                available[(op, a, b)] = dest
+        elif dest is not None:
+            kill(dest)
+            if op == ir.MOVE and is_temp(dest):
+                copies[dest] = a
+        out.append(Instruction(op, dest, a, b))
+
+    # Copies that every reader was redirected away from
+    dead = set(pc for pc in moves if not uses.get(out[pc].dest))
+    for pc in dead:
+        holder = out[pc].a
+        if is_temp(holder):
+            uses[holder] -= 1
+    return [ins for pc, ins in enumerate(out) if pc not in dead]
+
+
+# Loop passes, enabled one by one. Code hoisted out of a loop runs before the
+# body would have, so like dead code elimination they leave operations that
+# can fail at run time where they are. Every loop is rewritten after the
+# loops inside it, so code hoisted out of an inner loop can be hoisted out of
+# the outer one.
+
+# Trip counts that have no closed form are found by stepping the counter at
+# compile time, up to this many iterations
+MAX_SIMULATED_TRIPS = 100000
+# Loops running at most this many times are unrolled completely, longer ones
+# UNROLL_FACTOR iterations per test, copying at most UNROLL_BUDGET
+# instructions
+FULL_UNROLL_TRIPS = 8
+UNROLL_FACTOR = 4
+UNROLL_BUDGET = 256
+# Integers up to this magnitude are exact as floats
+EXACT = 1 << 53
+
+COMPARISONS = (ir.EQ, ir.NE, ir.GE, ir.LE, ir.GT, ir.LT)
+ADDS = (ir.ADD, ir.IADD, ir.FADD)
+SUBS = (ir.SUB, ir.ISUB, ir.FSUB)
+POWERS = (ir.POW, ir.IPOW, ir.FPOW)
+MULTIPLICATIONS = (ir.MUL, ir.IMUL, ir.FMUL)
+# The operation keeping a product or power up to date as a counter steps
+RUNNING = {ir.MUL: ir.ADD, ir.IMUL: ir.IADD, ir.FMUL: ir.FADD, ir.POW: ir.MUL, ir.IPOW: ir.IMUL,
+           ir.FPOW: ir.FMUL}
+
+
+def max_temp(code):
+    n = 0
+    for ins in code:
+        for operand in (ins.dest, ins.a, ins.b):
+            if is_temp(operand) and operand[1] > n:
+                n = operand[1]
+    return n
+
+
+def is_number(operand):
+    return is_const(operand) and type(operand[1]) in (int, float)
+
+
+def integral(value):
+    return type(value) is int or value.is_integer()
+
+
+def same_value(x, y):
+    # Equal and printing the same, so 1 and 1.0 or 0.0 and -0.0 differ
+    if type(x) is not type(y) or x != y:
+        return False
+    return type(x) is not float or math.copysign(1, x) == math.copysign(1, y)
+
+
+def rewrite_loops(code, rewrite):
+    # Calls rewrite(out, start) for every loop, inner loops first, when the
+    # code of the loop is out[start:]. rewrite replaces it in place and can
+    # insert code before start.
+    out = []
+    openers = []
+    for ins in code:
+        if ins.op in ir.OPENERS:
+            openers.append(len(out))
+        out.append(ins)
+        if ins.op in ir.CLOSERS:
+            start = openers.pop()
+            if out[start].op in ir.LOOPS:
+                rewrite(out, start)
+    return out
+
+
+class Loop:
+    # The parts of the code of a loop, from its opener to its closer: the
+    # indexes of the instructions directly in it, outside nested blocks, and
+    # of its test
+    def __init__(self, code):
+        self.code = code
+        self.kind = code[0].op
+        self.top = []
+        self.test = None
+        depth = 0
+        for i in range(1, len(code) - 1):
+            op = code[i].op
+            if op in ir.OPENERS:
+                depth += 1
+            elif op in ir.CLOSERS:
+                depth -= 1
+            elif depth:
+                continue
+            elif op == ir.TEST:
+                self.test = i
+            elif op != ir.DO_WHILE:
+                self.top.append(i)
+
+    def in_body(self, i):
+        # Whether the instruction at i only runs once the test passed
+        return self.kind != ir.DO and self.test is not None and i > self.test
+
+
+class Counted:
+    # A for or while loop testing a variable against a constant, the
+    # variable changing by a constant once per iteration and nowhere else.
+    # value(n) is the variable after n steps, it is n steps in at the test
+    # of iteration n and the loop runs trips times.
+    def __init__(self, name, step, delta, trips, value, exact):
+        self.name = name
+        self.step = step
+        self.delta = delta
+        self.trips = trips
+        self.value = value
+        # The values are integers stepped in closed form
+        self.exact = exact
+
+
+def initial_value(out, start, name):
+    # Constant the variable holds when the code at start is reached, looking
+    # back through the straight line code before it
+    for pc in range(start - 1, -1, -1):
+        ins = out[pc]
+        if ins.dest == name:
+            if ins.op == ir.MOVE and is_const(ins.a):
+                return ins.a
+            if ins.op == ir.DECLARE:
+                return (ir.CONST, ir.DEFAULTS[ins.a[1]])
+            return None
+        if is_boundary(ins.op):
+            return None
+    return None
+
+
+def counted_loop(out, start, loop, limits=None):
+    # Counted description of a loop stepping a counter to a constant bound,
+    # None when it is not one or stepping it takes more than the steps left
+    # in limits
+    code = loop.code
+    if loop.kind == ir.DO or loop.test != 2:
+        return None
+    compare = code[1]
+    if compare.op not in COMPARISONS or code[2].a != compare.dest:
+        return None
+    if is_number(compare.b) and compare.a is not None and compare.a[0] == ir.NAME:
+        name, limit = compare.a, compare.b[1]
+        test = lambda v: ir.OPERATIONS[compare.op](v, limit)
+    elif is_number(compare.a) and compare.b is not None and compare.b[0] == ir.NAME:
+        name, limit = compare.b, compare.a[1]
+        test = lambda v: ir.OPERATIONS[compare.op](limit, v)
+    else:
+        return None
+
+    writes = [i for i, ins in enumerate(code) if ins.dest == name]
+    if len(writes) != 1 or writes[0] not in loop.top or writes[0] < loop.test:
+        return None
+    step = writes[0]
+    ins = code[step]
+    if ins.op in ADDS and ins.a == name and is_number(ins.b):
+        delta = ins.b[1]
+    elif ins.op in ADDS and ins.b == name and is_number(ins.a):
+        delta = ins.a[1]
+    elif ins.op in SUBS and ins.a == name and is_number(ins.b):
+        delta = ins.b[1]
+    else:
+        return None
+    first = initial_value(out, start, name)
+    if not is_number(first):
+        return None
+    first = first[1]
+    op = ins.op
+    sign = -1 if op in SUBS else 1
+
+    try:
+        if integral(first) and integral(delta) and delta and abs(first) <= EXACT:
+            # Counted in closed form while the values stay exact as floats
+            def value(n):
+                return first if not n else ir.OPERATIONS[op](first, delta * n)
+
+            last = (EXACT - int(abs(first))) // int(abs(delta))
+            if compare.op in (ir.EQ, ir.NE):
+                trips = None
+            elif not test(first):
+                trips = 0
+            elif test(value(last)):
+                return None
+            else:
+                # The test holds up to the trip count, the values only move
+                # one way
+                low, high = 0, last
+                while high - low > 1:
+                    middle = (low + high) // 2
+                    if test(value(middle)):
+                        low = middle
+                    else:
+                        high = middle
+                trips = high
+            if trips is not None:
+                return Counted(name, step, sign * delta, trips, value, True)
+
+        if limits is None:
+            limits = Limits()
+        values = [first]
+        v = first
+        while test(v):
+            if len(values) > MAX_SIMULATED_TRIPS:
+                return None
+            limits.step()
+            v = ir.OPERATIONS[op](v, delta)
+            values.append(v)
+    except (ArithmeticError, TypeError, ValueError):
+        return None
+    return Counted(name, step, sign * delta, len(values) - 1, values.__getitem__, False)
+
+
+def hoist_invariants(code, limits=None):
+    # Moves operations on operands no loop iteration changes in front of the
+    # loop. The test of a while or for loop always runs, the body only when
+    # the test passes: unless the loop is known to run, what is hoisted out
+    # of the body goes under an if with a copy of the test. A variable
+    # computed from invariants is assigned from a temporary in the loop.
+    # Only operations that can't fail are hoisted, so an error still comes
+    # after what the loop printed before it.
+    fresh = itertools.count(max_temp(code) + 1)
+
+    def rewrite(out, start):
+        loop = Loop(out[start:])
+        written = set(ins.dest for ins in loop.code if ins.dest is not None)
+        runs = loop.kind == ir.DO or loop.test is None
+        never = False
+        if not runs:
+            counted = counted_loop(out, start, loop, limits)
+            if counted is not None:
+                runs = counted.trips > 0
+                never = not runs
+        top = set(loop.top)
+        before = []
+        guarded = []
+        rename = {}
+        new = []
+        for i, ins in enumerate(loop.code):
+            a = rename.get(ins.a, ins.a)
+            b = rename.get(ins.b, ins.b)
+            op, dest = ins.op, ins.dest
+            rename.pop(dest, None)
+            if (i in top and (op in ir.OPERATIONS or op in ir.UNARY_OPERATIONS) and a not in written
+                    and b not in written and not (never and loop.in_body(i))
+                    and cannot_fail(op, a, b, limits)):
+                temp = (ir.TEMP, next(fresh))
+                (guarded if loop.in_body(i) and not runs else before).append(Instruction(op, temp, a, b))
+                if is_temp(dest):
+                    rename[dest] = temp
+                else:
+                    new.append(Instruction(ir.MOVE, dest, temp, None))
+                continue
+            new.append(Instruction(op, dest, a, b))
+        if not before and not guarded:
+            return
+        if guarded:
+            test = Loop(new).test
+            guarded = [Instruction(ir.IF, None, None, None)] + new[1:test + 1] + guarded + [
+                Instruction(ir.END_IF, None, None, None)]
+        out[start:] = before + guarded + new
+
+    return rewrite_loops(code, rewrite)
+
+
+def reduce_strength(code, limits=None):
+    # In a counted loop, a product of the counter and a constant or a
+    # constant to the power of the counter is kept in a temporary that
+    # changes along with the counter, by an addition or a multiplication.
+    # Only done when that gives exactly the same value on every iteration.
+    fresh = itertools.count(max_temp(code) + 1)
+
+    def reduction(counted, op, a, b):
+        # (first value, update operation, update constant) of the temporary
+        # following a op b, or None
+        name = counted.name
+        update = RUNNING.get(op)
+        if update is None:
+            return None
+        power = update not in ADDS
+        if not power and (a == name and is_number(b) or b == name and is_number(a)):
+            factor = b[1] if a == name else a[1]
+        elif power and b == name and is_number(a):
+            factor = a[1]
+        else:
+            return None
+        compute = lambda x, y: evaluate(op, x, y, limits)
+        operands = (lambda v: (v, factor)) if a == name else (lambda v: (factor, v))
+        value = counted.value
+        # Checked step by step, integer products in closed form only for the
+        # first steps and the largest magnitude
+        checked = counted.trips
+        if counted.trips > MAX_SIMULATED_TRIPS:
+            biggest = max(abs(value(0)), abs(value(counted.trips)))
+            if (power or not counted.exact or not integral(factor) or factor <= 0
+                    or biggest * factor > EXACT or abs(counted.delta * factor) > EXACT):
+                return None
+            checked = 2
+        try:
+            # What one step of the counter changes the temporary by
+            change = compute(*operands(counted.delta)) if power else counted.delta * factor
+            first = current = compute(*operands(value(0)))
+            for n in range(checked + 1):
+                if not same_value(current, compute(*operands(value(n)))):
+                    return None
+                if type(current) is int and abs(current) > EXACT:
+                    # Powers grow too fast to be worth checking
+                    return None
+                current = evaluate(update, current, change, limits)
+        except (ArithmeticError, TypeError, ValueError):
+            return None
+        return first, update, change
+
+    def rewrite(out, start):
+        loop = Loop(out[start:])
+        counted = counted_loop(out, start, loop, limits)
+        if counted is None or not counted.trips:
+            return
+        new = []
+        temps = {}
+        init = []
+        updates = []
+        rename = {}
+        for i, ins in enumerate(loop.code):
+            a = rename.get(ins.a, ins.a)
+            b = rename.get(ins.b, ins.b)
+            rename.pop(ins.dest, None)
+            key = (ins.op, a, b)
+            temp = temps.get(key)
+            if temp is None:
+                reduced = reduction(counted, *key)
+                if reduced is not None:
+                    first, update, change = reduced
+                    temp = temps[key] = (ir.TEMP, next(fresh))
+                    init.append(Instruction(ir.MOVE, temp, (ir.CONST, first), None))
+                    updates.append(Instruction(update, temp, temp, (ir.CONST, change)))
+            if temp is None:
+                new.append(Instruction(ins.op, ins.dest, a, b))
+            elif is_temp(ins.dest):
+                # The reader of the result reads the temporary instead
+                rename[ins.dest] = temp
+            else:
+                new.append(Instruction(ir.MOVE, ins.dest, temp, None))
+            if i == counted.step:
+                step = len(new)
+        if not temps:
+            return
+        new[step:step] = updates
+        out[start:] = init + new
+
+    return rewrite_loops(code, rewrite)
+
+
+def unroll_loops(code, limits=None):
+    # Copies the body of a counted for loop, with its step, once for every
+    # iteration when it runs only a few times. A longer loop runs
+    # UNROLL_FACTOR copies per test until the counter reaches the value it
+    # has after the last full round, the remaining iterations follow the
+    # loop.
+    def rewrite(out, start):
+        loop = Loop(out[start:])
+        if loop.kind != ir.FOR:
+            return
+        counted = counted_loop(out, start, loop, limits)
+        if counted is None:
+            return
+        code = loop.code
+        body = code[loop.test + 1:-1]
+        trips = counted.trips
+        if trips <= FULL_UNROLL_TRIPS and len(body) * trips <= UNROLL_BUDGET:
+            out[start:] = body * trips
+            return
+        if trips < 2 * UNROLL_FACTOR or len(body) * UNROLL_FACTOR > UNROLL_BUDGET:
+            return
+        rounds, rest = divmod(trips, UNROLL_FACTOR)
+        bound = counted.value(rounds * UNROLL_FACTOR)
+        if not counted.exact and any(counted.value(n * UNROLL_FACTOR) == bound for n in range(rounds)):
+            return
+        test = Instruction(ir.NE, code[1].dest, counted.name, (ir.CONST, bound))
+        out[start:] = [code[0], test, code[2]] + body * UNROLL_FACTOR + [code[-1]] + body * rest
+
+    return rewrite_loops(code, rewrite)
+
+
+LOOP_PASSES = [('hoist', hoist_invariants), ('strength', reduce_strength), ('unroll', unroll_loops)]
+
+LEVELS = {
+    0: [],
+    1: [('constants', propagate_constants), ('branches', eliminate_branches), ('dead code', eliminate_dead_code)],
+    2: [('constants', propagate_constants), ('branches', eliminate_branches), ('cse', eliminate_common_subexpressions),
+        ('dead code', eliminate_dead_code)],
+}
+
+# Passes that fold constants or step loop counters, taking the folding
+# limits
+FOLDING = frozenset([propagate_constants, eliminate_dead_code, hoist_invariants, reduce_strength, unroll_loops])
+
+MAX_ROUNDS = 8
+
+
+def optimize(program, level=1, loops=(), limits=LIMITS):
+    # Runs the passes of the level and the loop passes named in loops until
+    # nothing changes, folding constants within limits. Returns the new
+    # program and a report of (pass, instructions removed) in pass order.
+    limits = Limits(limits)
+    passes = [(name, functools.partial(run, limits=limits) if run in FOLDING else run)
+              for name, run in LEVELS[level] + [(name, run) for name, run in LOOP_PASSES if name in loops]]
+    report = dict((name, 0) for name, _ in passes)
+    code = list(program)
+    for _ in range(MAX_ROUNDS):
+        before = code
+        for name, run in passes:
+            count = len(code)
+            code = run(code)
+            report[name] += count - len(code)
+        if code == before:
+            break
+    optimized = ir.Program()
+    optimized.extend(code)
+    return optimized, [(name, report[name]) for name, _ in passes]
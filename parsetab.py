@@ -1,80 +0,0 @@
-
-# parsetab.py
-# This file is automatically generated. Do not edit.
-# pylint: disable=W,C,R
-_tabversion = '3.10'
-
-_lr_method = 'LALR'
-
-_lr_signature = "right=leftEQCNOTEQCleft+-left*/left^leftANDORnonassoc<>BIGGEREQSMALLEREQrightUMINUSAND BIGGEREQ BOOLEAN DO ELIF ELSE EQC FALSE FLOAT FLOATV FOR ID IF INT INTV NOTEQC OR PRINT SMALLEREQ STRING STRINGV TRUE WHILEprog : statementstatement : conditional statement\n                 | while statement\n                 | for statement\n                 | declare ';' statement\n                 | print ';' statement\n                 | nonenone :conditional : if elif elseif : IF '(' expression ')' '{' statement '}' elif : ELIF '(' expression ')' '{' statement '}' elif\n                 | noneelse : ELSE '{' statement '}'\n            | nonewhile : WHILE '(' expression ')' '{' statement '}'\n             | DO '{' statement '}' WHILE '(' expression ')' ';' for : FOR '(' declarationAssign ';' expression ';' declareAssign ')' '{' statement '}' type : INT\n            | FLOAT\n            | STRING\n            | BOOLEANdeclare : declaration\n               | declarationAssign\n               | declareAssigndeclaration : type IDdeclarationAssign : type ID '=' expressiondeclareAssign : ID '=' expressionprint : PRINT expressionexpression : expression '+' expression\n                  | expression '-' expression\n                  | expression '*' expression\n                  | expression '/' expression\n                  | expression '^' expression\n                  | expression EQC expression\n                  | expression NOTEQC expression\n                  | expression BIGGEREQ expression\n                  | expression SMALLEREQ expression\n                  | expression '>' expression\n                  | expression '<' expression\n                  | expression AND expression\n                  | expression OR expressionexpression : '-' expression %prec UMINUSexpression : '(' expression ')' expression : INTV\n                  | FLOATV\n                  | STRINGV\n                  | boolvalboolval : TRUE\n               | FALSEexpression : ID"
-    
-_lr_action_items = {'WHILE':([0,3,4,5,9,27,28,29,31,33,50,52,76,79,100,103,104,105,111,114,115,118,119,120,122,],[10,10,10,10,-8,10,10,-8,-12,10,-9,-14,10,101,10,10,-13,10,-15,-10,-8,-11,-16,10,-17,]),'DO':([0,3,4,5,9,27,28,29,31,33,50,52,76,100,103,104,105,111,114,115,118,119,120,122,],[11,11,11,11,-8,11,11,-8,-12,11,-9,-14,11,11,11,-13,11,-15,-10,-8,-11,-16,11,-17,]),'FOR':([0,3,4,5,9,27,28,29,31,33,50,52,76,100,103,104,105,111,114,115,118,119,120,122,],[12,12,12,12,-8,12,12,-8,-12,12,-9,-14,12,12,12,-13,12,-15,-10,-8,-11,-16,12,-17,]),'PRINT':([0,3,4,5,9,27,28,29,31,33,50,52,76,100,103,104,105,111,114,115,118,119,120,122,],[16,16,16,16,-8,16,16,-8,-12,16,-9,-14,16,16,16,-13,16,-15,-10,-8,-11,-16,16,-17,]),'$end':([0,1,2,3,4,5,8,9,24,25,26,27,28,29,31,48,49,50,52,104,111,114,115,118,119,122,],[-8,0,-1,-8,-8,-8,-7,-8,-2,-3,-4,-8,-8,-8,-12,-5,-6,-9,-14,-13,-15,-10,-8,-11,-16,-17,]),'IF':([0,3,4,5,9,27,28,29,31,33,50,52,76,100,103,104,105,111,114,115,118,119,120,122,],[17,17,17,17,-8,17,17,-8,-12,17,-9,-14,17,17,17,-13,17,-15,-10,-8,-11,-16,17,-17,]),'ID':([0,3,4,5,9,16,18,20,21,22,23,27,28,29,31,32,33,36,37,45,47,50,52,53,57,58,59,60,61,62,63,64,65,66,67,68,69,70,74,76,80,100,103,104,105,107,108,111,114,115,118,119,120,122,],[19,19,19,19,-8,42,46,-18,-19,-20,-21,19,19,-8,-12,42,19,42,42,42,42,-9,-14,42,81,42,42,42,42,42,42,42,42,42,42,42,42,42,42,19,42,19,19,-13,19,42,19,-15,-10,-8,-11,-16,19,-17,]),'INT':([0,3,4,5,9,27,28,29,31,33,34,50,52,76,100,103,104,105,111,114,115,118,119,120,122,],[20,20,20,20,-8,20,20,-8,-12,20,20,-9,-14,20,20,20,-13,20,-15,-10,-8,-11,-16,20,-17,]),'FLOAT':([0,3,4,5,9,27,28,29,31,33,34,50,52,76,100,103,104,105,111,114,115,118,119,120,122,],[21,21,21,21,-8,21,21,-8,-12,21,21,-9,-14,21,21,21,-13,21,-15,-10,-8,-11,-16,21,-17,]),'STRING':([0,3,4,5,9,27,28,29,31,33,34,50,52,76,100,103,104,105,111,114,115,118,119,120,122,],[22,22,22,22,-8,22,22,-8,-12,22,22,-9,-14,22,22,22,-13,22,-15,-10,-8,-11,-16,22,-17,]),'BOOLEAN':([0,3,4,5,9,27,28,29,31,33,34,50,52,76,100,103,104,105,111,114,115,118,119,120,122,],[23,23,23,23,-8,23,23,-8,-12,23,23,-9,-14,23,23,23,-13,23,-15,-10,-8,-11,-16,23,-17,]),'}':([3,4,5,8,9,24,25,26,27,28,29,31,33,48,49,50,52,55,76,98,100,103,104,105,106,109,110,111,114,115,118,119,120,121,122,],[-8,-8,-8,-7,-8,-2,-3,-4,-8,-8,-8,-12,-8,-5,-6,-9,-14,79,-8,104,-8,-8,-13,-8,111,114,115,-15,-10,-8,-11,-16,-8,122,-17,]),';':([6,7,13,14,15,35,38,39,40,41,42,43,44,46,56,71,75,82,83,84,85,86,87,88,89,90,91,92,93,94,95,97,102,116,],[27,28,-23,-24,-22,-28,-44,-45,-46,-47,-50,-48,-49,-25,80,-42,-27,-29,-30,-31,-32,-33,-34,-35,-36,-37,-38,-39,-40,-41,-43,-26,108,119,]),'ELIF':([9,114,115,],[30,-10,30,]),'ELSE':([9,29,31,114,115,118,],[-8,51,-12,-10,-8,-11,]),'(':([10,12,16,17,30,32,36,37,45,47,53,58,59,60,61,62,63,64,65,66,67,68,69,70,74,80,101,107,],[32,34,37,45,53,37,37,37,37,37,37,37,37,37,37,37,37,37,37,37,37,37,37,37,37,37,107,37,]),'{':([11,51,78,96,99,117,],[33,76,100,103,105,120,]),'-':([16,32,35,36,37,38,39,40,41,42,43,44,45,47,53,54,58,59,60,61,62,63,64,65,66,67,68,69,70,71,72,73,74,75,77,80,82,83,84,85,86,87,88,89,90,91,92,93,94,95,97,102,107,112,],[36,36,59,36,36,-44,-45,-46,-47,-50,-48,-49,36,36,36,59,36,36,36,36,36,36,36,36,36,36,36,36,36,-42,59,59,36,59,59,36,-29,-30,-31,-32,-33,59,59,-36,-37,-38,-39,-40,-41,-43,59,59,36,59,]),'INTV':([16,32,36,37,45,47,53,58,59,60,61,62,63,64,65,66,67,68,69,70,74,80,107,],[38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,]),'FLOATV':([16,32,36,37,45,47,53,58,59,60,61,62,63,64,65,66,67,68,69,70,74,80,107,],[39,39,39,39,39,39,39,39,39,39,39,39,39,39,39,39,39,39,39,39,39,39,39,]),'STRINGV':([16,32,36,37,45,47,53,58,59,60,61,62,63,64,65,66,67,68,69,70,74,80,107,],[40,40,40,40,40,40,40,40,40,40,40,40,40,40,40,40,40,40,40,40,40,40,40,]),'TRUE':([16,32,36,37,45,47,53,58,59,60,61,62,63,64,65,66,67,68,69,70,74,80,107,],[43,43,43,43,43,43,43,43,43,43,43,43,43,43,43,43,43,43,43,43,43,43,43,]),'FALSE':([16,32,36,37,45,47,53,58,59,60,61,62,63,64,65,66,67,68,69,70,74,80,107,],[44,44,44,44,44,44,44,44,44,44,44,44,44,44,44,44,44,44,44,44,44,44,44,]),'=':([19,46,81,],[47,74,74,]),'+':([35,38,39,40,41,42,43,44,54,71,72,73,75,77,82,83,84,85,86,87,88,89,90,91,92,93,94,95,97,102,112,],[58,-44,-45,-46,-47,-50,-48,-49,58,-42,58,58,58,58,-29,-30,-31,-32,-33,58,58,-36,-37,-38,-39,-40,-41,-43,58,58,58,]),'*':([35,38,39,40,41,42,43,44,54,71,72,73,75,77,82,83,84,85,86,87,88,89,90,91,92,93,94,95,97,102,112,],[60,-44,-45,-46,-47,-50,-48,-49,60,-42,60,60,60,60,60,60,-31,-32,-33,60,60,-36,-37,-38,-39,-40,-41,-43,60,60,60,]),'/':([35,38,39,40,41,42,43,44,54,71,72,73,75,77,82,83,84,85,86,87,88,89,90,91,92,93,94,95,97,102,112,],[61,-44,-45,-46,-47,-50,-48,-49,61,-42,61,61,61,61,61,61,-31,-32,-33,61,61,-36,-37,-38,-39,-40,-41,-43,61,61,61,]),'^':([35,38,39,40,41,42,43,44,54,71,72,73,75,77,82,83,84,85,86,87,88,89,90,91,92,93,94,95,97,102,112,],[62,-44,-45,-46,-47,-50,-48,-49,62,-42,62,62,62,62,62,62,62,62,-33,62,62,-36,-37,-38,-39,-40,-41,-43,62,62,62,]),'EQC':([35,38,39,40,41,42,43,44,54,71,72,73,75,77,82,83,84,85,86,87,88,89,90,91,92,93,94,95,97,102,112,],[63,-44,-45,-46,-47,-50,-48,-49,63,-42,63,63,63,63,-29,-30,-31,-32,-33,-34,-35,-36,-37,-38,-39,-40,-41,-43,63,63,63,]),'NOTEQC':([35,38,39,40,41,42,43,44,54,71,72,73,75,77,82,83,84,85,86,87,88,89,90,91,92,93,94,95,97,102,112,],[64,-44,-45,-46,-47,-50,-48,-49,64,-42,64,64,64,64,-29,-30,-31,-32,-33,-34,-35,-36,-37,-38,-39,-40,-41,-43,64,64,64,]),'BIGGEREQ':([35,38,39,40,41,42,43,44,54,71,72,73,75,77,82,83,84,85,86,87,88,89,90,91,92,93,94,95,97,102,112,],[65,-44,-45,-46,-47,-50,-48,-49,65,-42,65,65,65,65,65,65,65,65,65,65,65,None,None,None,None,65,65,-43,65,65,65,]),'SMALLEREQ':([35,38,39,40,41,42,43,44,54,71,72,73,75,77,82,83,84,85,86,87,88,89,90,91,92,93,94,95,97,102,112,],[66,-44,-45,-46,-47,-50,-48,-49,66,-42,66,66,66,66,66,66,66,66,66,66,66,None,None,None,None,66,66,-43,66,66,66,]),'>':([35,38,39,40,41,42,43,44,54,71,72,73,75,77,82,83,84,85,86,87,88,89,90,91,92,93,94,95,97,102,112,],[67,-44,-45,-46,-47,-50,-48,-49,67,-42,67,67,67,67,67,67,67,67,67,67,67,None,None,None,None,67,67,-43,67,67,67,]),'<':([35,38,39,40,41,42,43,44,54,71,72,73,75,77,82,83,84,85,86,87,88,89,90,91,92,93,94,95,97,102,112,],[68,-44,-45,-46,-47,-50,-48,-49,68,-42,68,68,68,68,68,68,68,68,68,68,68,None,None,None,None,68,68,-43,68,68,68,]),'AND':([35,38,39,40,41,42,43,44,54,71,72,73,75,77,82,83,84,85,86,87,88,89,90,91,92,93,94,95,97,102,112,],[69,-44,-45,-46,-47,-50,-48,-49,69,-42,69,69,69,69,69,69,69,69,69,69,69,-36,-37,-38,-39,-40,-41,-43,69,69,69,]),'OR':([35,38,39,40,41,42,43,44,54,71,72,73,75,77,82,83,84,85,86,87,88,89,90,91,92,93,94,95,97,102,112,],[70,-44,-45,-46,-47,-50,-48,-49,70,-42,70,70,70,70,70,70,70,70,70,70,70,-36,-37,-38,-39,-40,-41,-43,70,70,70,]),')':([38,39,40,41,42,43,44,54,71,72,73,75,77,82,83,84,85,86,87,88,89,90,91,92,93,94,95,112,113,],[-44,-45,-46,-47,-50,-48,-49,78,-42,95,96,-27,99,-29,-30,-31,-32,-33,-34,-35,-36,-37,-38,-39,-40,-41,-43,116,117,]),}
-
-_lr_action = {}
-for _k, _v in _lr_action_items.items():
-   for _x,_y in zip(_v[0],_v[1]):
-      if not _x in _lr_action:  _lr_action[_x] = {}
-      _lr_action[_x][_k] = _y
-del _lr_action_items
-
-_lr_goto_items = {'prog':([0,],[1,]),'statement':([0,3,4,5,27,28,33,76,100,103,105,120,],[2,24,25,26,48,49,55,98,106,109,110,121,]),'conditional':([0,3,4,5,27,28,33,76,100,103,105,120,],[3,3,3,3,3,3,3,3,3,3,3,3,]),'while':([0,3,4,5,27,28,33,76,100,103,105,120,],[4,4,4,4,4,4,4,4,4,4,4,4,]),'for':([0,3,4,5,27,28,33,76,100,103,105,120,],[5,5,5,5,5,5,5,5,5,5,5,5,]),'declare':([0,3,4,5,27,28,33,76,100,103,105,120,],[6,6,6,6,6,6,6,6,6,6,6,6,]),'print':([0,3,4,5,27,28,33,76,100,103,105,120,],[7,7,7,7,7,7,7,7,7,7,7,7,]),'none':([0,3,4,5,9,27,28,29,33,76,100,103,105,115,120,],[8,8,8,8,31,8,8,52,8,8,8,8,8,31,8,]),'if':([0,3,4,5,27,28,33,76,100,103,105,120,],[9,9,9,9,9,9,9,9,9,9,9,9,]),'declarationAssign':([0,3,4,5,27,28,33,34,76,100,103,105,120,],[13,13,13,13,13,13,13,56,13,13,13,13,13,]),'declareAssign':([0,3,4,5,27,28,33,76,100,103,105,108,120,],[14,14,14,14,14,14,14,14,14,14,14,113,14,]),'declaration':([0,3,4,5,27,28,33,76,100,103,105,120,],[15,15,15,15,15,15,15,15,15,15,15,15,]),'type':([0,3,4,5,27,28,33,34,76,100,103,105,120,],[18,18,18,18,18,18,18,57,18,18,18,18,18,]),'elif':([9,115,],[29,118,]),'expression':([16,32,36,37,45,47,53,58,59,60,61,62,63,64,65,66,67,68,69,70,74,80,107,],[35,54,71,72,73,75,77,82,83,84,85,86,87,88,89,90,91,92,93,94,97,102,112,]),'boolval':([16,32,36,37,45,47,53,58,59,60,61,62,63,64,65,66,67,68,69,70,74,80,107,],[41,41,41,41,41,41,41,41,41,41,41,41,41,41,41,41,41,41,41,41,41,41,41,]),'else':([29,],[50,]),}
-
-_lr_goto = {}
-for _k, _v in _lr_goto_items.items():
-   for _x, _y in zip(_v[0], _v[1]):
-       if not _x in _lr_goto: _lr_goto[_x] = {}
-       _lr_goto[_x][_k] = _y
-del _lr_goto_items
-_lr_productions = [
-  ("S' -> prog","S'",1,None,None,None),
-  ('prog -> statement','prog',1,'p_start','compiler.py',96),
-  ('statement -> conditional statement','statement',2,'p_statement','compiler.py',102),
-  ('statement -> while statement','statement',2,'p_statement','compiler.py',103),
-  ('statement -> for statement','statement',2,'p_statement','compiler.py',104),
-  ('statement -> declare ; statement','statement',3,'p_statement','compiler.py',105),
-  ('statement -> print ; statement','statement',3,'p_statement','compiler.py',106),
-  ('statement -> none','statement',1,'p_statement','compiler.py',107),
-  ('none -> <empty>','none',0,'p_none','compiler.py',117),
-  ('conditional -> if elif else','conditional',3,'p_conditional','compiler.py',122),
-  ('if -> IF ( expression ) { statement }','if',7,'p_if','compiler.py',127),
-  ('elif -> ELIF ( expression ) { statement } elif','elif',8,'p_elif','compiler.py',132),
-  ('elif -> none','elif',1,'p_elif','compiler.py',133),
-  ('else -> ELSE { statement }','else',4,'p_else','compiler.py',141),
-  ('else -> none','else',1,'p_else','compiler.py',142),
-  ('while -> WHILE ( expression ) { statement }','while',7,'p_while','compiler.py',148),
-  ('while -> DO { statement } WHILE ( expression ) ;','while',9,'p_while','compiler.py',149),
-  ('for -> FOR ( declarationAssign ; expression ; declareAssign ) { statement }','for',11,'p_for','compiler.py',157),
-  ('type -> INT','type',1,'p_type','compiler.py',162),
-  ('type -> FLOAT','type',1,'p_type','compiler.py',163),
-  ('type -> STRING','type',1,'p_type','compiler.py',164),
-  ('type -> BOOLEAN','type',1,'p_type','compiler.py',165),
-  ('declare -> declaration','declare',1,'p_declare','compiler.py',170),
-  ('declare -> declarationAssign','declare',1,'p_declare','compiler.py',171),
-  ('declare -> declareAssign','declare',1,'p_declare','compiler.py',172),
-  ('declaration -> type ID','declaration',2,'p_declaration','compiler.py',177),
-  ('declarationAssign -> type ID = expression','declarationAssign',4,'p_declarationAssign','compiler.py',182),
-  ('declareAssign -> ID = expression','declareAssign',3,'p_declareAssign','compiler.py',187),
-  ('print -> PRINT expression','print',2,'p_print','compiler.py',193),
-  ('expression -> expression + expression','expression',3,'p_expression_operation','compiler.py',199),
-  ('expression -> expression - expression','expression',3,'p_expression_operation','compiler.py',200),
-  ('expression -> expression * expression','expression',3,'p_expression_operation','compiler.py',201),
-  ('expression -> expression / expression','expression',3,'p_expression_operation','compiler.py',202),
-  ('expression -> expression ^ expression','expression',3,'p_expression_operation','compiler.py',203),
-  ('expression -> expression EQC expression','expression',3,'p_expression_operation','compiler.py',204),
-  ('expression -> expression NOTEQC expression','expression',3,'p_expression_operation','compiler.py',205),
-  ('expression -> expression BIGGEREQ expression','expression',3,'p_expression_operation','compiler.py',206),
-  ('expression -> expression SMALLEREQ expression','expression',3,'p_expression_operation','compiler.py',207),
-  ('expression -> expression > expression','expression',3,'p_expression_operation','compiler.py',208),
-  ('expression -> expression < expression','expression',3,'p_expression_operation','compiler.py',209),
-  ('expression -> expression AND expression','expression',3,'p_expression_operation','compiler.py',210),
-  ('expression -> expression OR expression','expression',3,'p_expression_operation','compiler.py',211),
-  ('expression -> - expression','expression',2,'p_expression_uminus','compiler.py',216),
-  ('expression -> ( expression )','expression',3,'p_expression_group','compiler.py',221),
-  ('expression -> INTV','expression',1,'p_expression_number','compiler.py',226),
-  ('expression -> FLOATV','expression',1,'p_expression_number','compiler.py',227),
-  ('expression -> STRINGV','expression',1,'p_expression_number','compiler.py',228),
-  ('expression -> boolval','expression',1,'p_expression_number','compiler.py',229),
-  ('boolval -> TRUE','boolval',1,'p_boolVal','compiler.py',234),
-  ('boolval -> FALSE','boolval',1,'p_boolVal','compiler.py',235),
-  ('expression -> ID','expression',1,'p_expression_ID','compiler.py',243),
-]
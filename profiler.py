@@ -0,0 +1,178 @@
+import json
+import time
+
+from interpreter import Interpreter
+from nodes import DoWhile, For, While
+from vm import VMError
+
+# Instrumented execution of a syntax tree. A Profiler runs the tree like the
+# Interpreter it extends, whose own run loop stays free of any counting, and
+# records how many times the statements of every source line ran and, for
+# every while, do-while and for loop, how often it was entered, how many
+# iterations it ran and the time spent in it: in total and in itself, not
+# counting the loops nested in it. The time of every stack of nested loops
+# is also kept, the top level being the script, for the report as folded
+# stacks that flame graph tools read.
+
+LOOPS = (While, DoWhile, For)
+KINDS = {While: 'while', DoWhile: 'do-while', For: 'for'}
+
+
+class Loop:
+    __slots__ = ('line', 'kind', 'entries', 'iterations', 'seconds', 'own')
+
+    def __init__(self, node):
+        self.line = node.line
+        self.kind = KINDS[type(node)]
+        self.entries = 0
+        self.iterations = 0
+        self.seconds = 0.0
+        # Not counting the loops nested in it
+        self.own = 0.0
+
+    def frame(self):
+        return '%s line %s' % (self.kind, self.line)
+
+
+class Profiler(Interpreter):
+    def __init__(self, out=None, max_steps=None, clock=time.perf_counter):
+        Interpreter.__init__(self, out, max_steps)
+        self.clock = clock
+        # Statements run by source line
+        self.hits = {}
+        # By loop node, in the order they were first entered
+        self.loops = {}
+        # Own seconds by stack of loops, as tuples of Loop
+        self.stacks = {}
+        self.seconds = 0.0
+
+    def run(self, prog):
+        clock = self.clock
+        hits = self.hits
+        simple = self.simple
+        nested = self.nested
+        work = [iter(prog)]
+        # The Loop of every entry of work that is a loop, None for the rest
+        timed = [None]
+        # Open loops with the time they were entered
+        open_ = []
+        stack = ()
+        start = mark = clock()
+        try:
+            while work:
+                for stm in work[-1]:
+                    if type(stm) is list:
+                        loop = timed[-1]
+                        if loop is not None:
+                            loop.iterations += 1
+                        work.append(iter(stm))
+                        timed.append(None)
+                        break
+                    line = stm.line
+                    hits[line] = hits.get(line, 0) + 1
+                    kind = type(stm)
+                    fn = simple.get(kind)
+                    if fn is not None:
+                        fn(stm)
+                        continue
+                    loop = None
+                    if kind in LOOPS:
+                        loop = self.loops.get(stm)
+                        if loop is None:
+                            loop = self.loops[stm] = Loop(stm)
+                        loop.entries += 1
+                        now = clock()
+                        self.charge(stack, now - mark)
+                        mark = now
+                        stack += (loop,)
+                        open_.append(now)
+                    work.append(nested[kind](stm))
+                    timed.append(loop)
+                    break
+                else:
+                    work.pop()
+                    if timed.pop() is not None:
+                        now = clock()
+                        mark = self.close(stack, open_.pop(), mark, now)
+                        stack = stack[:-1]
+        except (TypeError, ValueError, ZeroDivisionError, OverflowError) as e:
+            raise VMError('runtime error: %s' % e)
+        finally:
+            # Loops left open by an error are timed up to it
+            now = clock()
+            while open_:
+                mark = self.close(stack, open_.pop(), mark, now)
+                stack = stack[:-1]
+            self.charge(stack, now - mark)
+            self.seconds += now - start
+        return self
+
+    def charge(self, stack, seconds):
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + seconds
+        if stack:
+            stack[-1].own += seconds
+
+    def close(self, stack, entered, mark, now):
+        # Ends the innermost loop of stack, entered at entered, returns the
+        # new mark
+        self.charge(stack, now - mark)
+        stack[-1].seconds += now - entered
+        return now
+
+    def as_dict(self):
+        return {
+            'seconds': self.seconds,
+            'steps': self.steps,
+            'lines': [{'line': line, 'hits': self.hits[line]} for line in self.lines()],
+            'loops': [{'line': loop.line, 'kind': loop.kind, 'entries': loop.entries, 'iterations': loop.iterations,
+                       'seconds': loop.seconds, 'own_seconds': loop.own} for loop in self.hot()],
+        }
+
+    def lines(self):
+        # Source lines that ran, in order
+        return sorted(self.hits, key=lambda line: line or 0)
+
+    def hot(self):
+        # Loops by the time spent in them, longest first
+        return sorted(self.loops.values(), key=lambda loop: -loop.seconds)
+
+    def json(self):
+        return json.dumps(self.as_dict(), indent=2) + '\n'
+
+    def text(self, source=None):
+        # With the source text, every line is shown next to its counts
+        lines = ['==== Loops ====', '%6s %-9s %10s %12s %10s %10s %7s' % (
+            'line', 'kind', 'entries', 'iterations', 'ms', 'own ms', 'share')]
+        for loop in self.hot():
+            lines.append('%6s %-9s %10d %12d %10.3f %10.3f %6.1f%%' % (
+                loop.line, loop.kind, loop.entries, loop.iterations, loop.seconds * 1e3, loop.own * 1e3,
+                100 * loop.seconds / self.seconds if self.seconds else 0.0))
+        lines.append('==== Lines ====')
+        lines.append('%6s %12s  %s' % ('line', 'hits', 'source' if source is not None else ''))
+        text = source.split('\n') if source is not None else []
+        for line in self.lines():
+            shown = text[line - 1].strip() if type(line) is int and 0 < line <= len(text) else ''
+            lines.append('%6s %12d  %s' % (line, self.hits[line], shown[:80]))
+        lines.append('%.3f ms, %d steps' % (self.seconds * 1e3, self.steps))
+        return '\n'.join(lines) + '\n'
+
+    def folded(self):
+        # One line per stack of loops, script first, with its own time in
+        # microseconds
+        lines = []
+        for stack, seconds in self.stacks.items():
+            micros = int(round(seconds * 1e6))
+            if micros:
+                lines.append('%s %d' % (';'.join(['script'] + [loop.frame() for loop in stack]), micros))
+        return ''.join(line + '\n' for line in lines)
+
+    def report(self, fmt='text', source=None):
+        if fmt == 'json':
+            return self.json()
+        if fmt == 'folded':
+            return self.folded()
+        return self.text(source)
+
+
+def run(prog, out=None, max_steps=None):
+    return Profiler(out, max_steps).run(prog)
@@ -0,0 +1,200 @@
+import random
+import string
+
+# Synthetic programs for benchmarks, valid in the grammar of compiler.py and
+# scaled along one axis each: many flat statements, deep nesting of every
+# kind of block, long expressions, many identifiers and large strings. All
+# randomness comes from a seed, so the same arguments give the same text.
+
+OPERATORS = ['+', '-', '*', '/', '^']
+COMPARISONS = ['==', '!=', '>=', '<=', '>', '<']
+TYPES = ['int', 'float', 'string', 'boolean']
+
+# Anything the lexer accepts inside a string on one line
+STRING_CHARS = string.ascii_letters + string.digits + ' .,:;!?-+*/=()[]{}<>_#'
+
+
+def flat_program(n, names=0):
+    # Mix of the statement kinds that can appear in a flat statement list,
+    # every statement uses new identifiers unless a number of names is given
+    lines = []
+    for i in range(n):
+        kind = i % 4
+        v = i % names if names else i
+        if kind == 0:
+            lines.append('int x%d = %d;' % (v, i))
+        elif kind == 1:
+            lines.append('x%d = x%d + 1;' % (v - 1, v - 1))
+        elif kind == 2:
+            lines.append('print "s%d";' % v)
+        else:
+            lines.append('float f%d;' % v)
+    return '\n'.join(lines) + '\n'
+
+
+def block_program(n):
+    # Same statements, but inside a single while block
+    return 'while(x < 10){\n' + flat_program(n) + '}\n'
+
+
+def nested_program(n, depth=4, unique=False):
+    # Statements of every kind nested a few levels deep, all the same unless
+    # they are made unique
+    kinds = (
+        'while(x < 10){\n%s}\n',
+        'for(int i = 0; i < 10; i = i + 1){\n%s}\n',
+        'do{\n%s}while(x > 1);\n',
+        'if(x == 1){\n%s} elif (x == 2) {\n    print "two";\n} else {\n%s}\n',
+    )
+    parts = []
+    for i in range(n):
+        body = 'x = x + %d;\nprint x;\n' % (i if unique else 1)
+        for level in range(depth):
+            template = kinds[(i + level) % len(kinds)]
+            body = template % ((body,) * template.count('%s'))
+        parts.append(body)
+    return 'int x = 0;\n' + ''.join(parts)
+
+
+DEEP = {
+    'while': ('while(x < 10){\n', '}\n'),
+    'for': ('for(int i%d = 0; i%d < 10; i%d = i%d + 1){\n', '}\n'),
+    'do': ('do{\n', '}while(x > 1);\n'),
+    'if': ('if(x == %d){\n', '} elif (x == %d) {\n    print "elif arm";\n} else {\n    print "else arm";\n}\n'),
+}
+
+
+def deep_program(depth, kinds=('while',)):
+    # One block nested depth times, cycling through the kinds of block
+    opening = []
+    closing = []
+    for level in range(depth):
+        start, end = DEEP[kinds[level % len(kinds)]]
+        opening.append(start.replace('%d', str(level)))
+        closing.append(end.replace('%d', str(-level)))
+    return ''.join(opening) + 'x = x + 1;\n' + ''.join(reversed(closing))
+
+
+def random_string(rng, size):
+    return ''.join(rng.choice(STRING_CHARS) for _ in range(size))
+
+
+def operand(rng, names):
+    r = rng.random()
+    if names and r < 0.4:
+        return rng.choice(names)
+    if r < 0.7:
+        return str(rng.randint(1, 99))
+    return '%d.%d' % (rng.randint(0, 9), rng.randint(1, 9))
+
+
+def expression(rng, length, names=()):
+    # Arithmetic on length operands, with a parenthesized group now and then
+    parts = [operand(rng, names)]
+    for _ in range(length - 1):
+        parts.append(rng.choice(OPERATORS))
+        if rng.random() < 0.1:
+            parts.append('(%s %s %s)' % (operand(rng, names), rng.choice(OPERATORS), operand(rng, names)))
+        else:
+            parts.append(operand(rng, names))
+    return ' '.join(parts)
+
+
+def expression_program(n, length, seed=0):
+    # n assignments of expressions with length operands each
+    rng = random.Random(seed)
+    names = ['a', 'b', 'c', 'd']
+    lines = ['float %s = %d;' % (name, i + 1) for i, name in enumerate(names)]
+    for i in range(n):
+        lines.append('%s = %s;' % (names[i % len(names)], expression(rng, length, names)))
+    return '\n'.join(lines) + '\n'
+
+
+def identifier(rng, i, size):
+    suffix = ''.join(rng.choice(string.ascii_lowercase + string.digits + '_') for _ in range(size))
+    return 'v%d_%s' % (i, suffix)
+
+
+def identifier_program(n, string_size=1000, name_size=16, seed=0):
+    # n distinct long identifiers, every fourth one holding a large string
+    rng = random.Random(seed)
+    lines = []
+    for i in range(n):
+        name = identifier(rng, i, name_size)
+        if i % 4 == 0:
+            lines.append('string %s = "%s";' % (name, random_string(rng, string_size)))
+            lines.append('print %s;' % name)
+        else:
+            lines.append('%s %s;' % (TYPES[i % len(TYPES)], name))
+    return '\n'.join(lines) + '\n'
+
+
+def string_program(n, strings=4, size=12, seed=0):
+    # n concatenations of a few short strings each, some with escapes and
+    # reserved words in them
+    rng = random.Random(seed)
+    pieces = ['\\"', '\\\\', '\\n', '\\t', ' if ', ' while ']
+    lines = ['string s;']
+    for _ in range(n):
+        parts = []
+        for _ in range(strings):
+            text = random_string(rng, size)
+            if rng.random() < 0.5:
+                at = rng.randint(0, size)
+                text = text[:at] + rng.choice(pieces) + text[at:]
+            parts.append('"%s"' % text)
+        lines.append('s = %s;' % ' + '.join(parts))
+    return '\n'.join(lines) + '\n'
+
+
+def random_statement(rng, names, depth, lines, indent=''):
+    r = rng.random()
+    if depth <= 0 or r < 0.6:
+        name = rng.choice(names)
+        r = rng.random()
+        if r < 0.5:
+            lines.append('%s%s = %s;' % (indent, name, expression(rng, rng.randint(1, 6), names)))
+        elif r < 0.8:
+            lines.append('%sprint %s;' % (indent, expression(rng, rng.randint(1, 3), names)))
+        else:
+            lines.append('%sprint "%s";' % (indent, random_string(rng, 20)))
+        return
+    condition = '%s %s %s' % (rng.choice(names), rng.choice(COMPARISONS), operand(rng, names))
+    kind = rng.choice(['if', 'while', 'do', 'for'])
+    if kind == 'if':
+        lines.append('%sif(%s){' % (indent, condition))
+        random_block(rng, names, depth - 1, lines, indent)
+        for _ in range(rng.randint(0, 2)):
+            lines.append('%s} elif (%s) {' % (indent, condition))
+            random_block(rng, names, depth - 1, lines, indent)
+        if rng.random() < 0.5:
+            lines.append('%s} else {' % indent)
+            random_block(rng, names, depth - 1, lines, indent)
+        lines.append('%s}' % indent)
+    elif kind == 'while':
+        lines.append('%swhile(%s){' % (indent, condition))
+        random_block(rng, names, depth - 1, lines, indent)
+        lines.append('%s}' % indent)
+    elif kind == 'do':
+        lines.append('%sdo{' % indent)
+        random_block(rng, names, depth - 1, lines, indent)
+        lines.append('%s}while(%s);' % (indent, condition))
+    else:
+        lines.append('%sfor(int i = 0; i < %d; i = i + 1){' % (indent, rng.randint(1, 10)))
+        random_block(rng, names, depth - 1, lines, indent)
+        lines.append('%s}' % indent)
+
+
+def random_block(rng, names, depth, lines, indent):
+    for _ in range(rng.randint(1, 4)):
+        random_statement(rng, names, depth, lines, indent + '    ')
+
+
+def random_program(n, depth=3, seed=0):
+    # n random top level statements of every kind, blocks nested up to depth
+    rng = random.Random(seed)
+    names = ['n%d' % i for i in range(8)]
+    lines = ['float %s = %d;' % (name, i) for i, name in enumerate(names)]
+    for _ in range(n):
+        random_statement(rng, names, depth, lines)
+    return '\n'.join(lines) + '\n'
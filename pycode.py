@@ -0,0 +1,311 @@
+import hashlib
+import marshal
+import math
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import ir
+from compiler import CompileError, Compiler, cache_dir
+from nodes import Assign, Conditional, Declare, DeclareAssign, DoWhile, For, Id, Neg, Operation, Print, ToFloat, While
+from typecheck import LOGIC, type_of
+from vm import VMError, format_value
+
+# Backend that translates a syntax tree into the source of one Python
+# function and compiles it with compile(), so a program runs as CPython
+# bytecode with every variable a local of that function. It gives the same
+# results as the virtual machine: and and or only evaluate their right side
+# when the left one does not decide the result, / is a true division, integer
+# and float powers fail where the instructions do and an undeclared variable
+# is None. Code objects are cached by a hash of the program text, in memory
+# and marshalled in the table cache directory, where the files used least
+# recently, by modification time, are deleted past MAX_FILES. With a step
+# limit, every iteration of a loop is a step.
+
+VERSION = 4
+MAX_ENTRIES = 256
+MAX_FILES = 1024
+
+# Deeper expressions are split into temporaries, CPython refuses about 200
+# nested parentheses
+MAX_EXPRESSION_DEPTH = 50
+# CPython allows 100 levels of indentation and 20 nested loops
+MAX_INDENT = 90
+
+PYTHON_OPS = {'+': '+', '-': '-', '*': '*', '/': '/', '^': '**', '==': '==', '!=': '!=', '>=': '>=',
+              '<=': '<=', '>': '>', '<': '<'}
+HELPERS = {('^', 'int'): 'IPOW', ('^', 'float'): 'FPOW'}
+
+_cache = OrderedDict()
+# Held while _cache is read or changed, the daemon loads on several threads
+_lock = threading.Lock()
+
+
+def local(var):
+    # Python local of a variable, x.1 becomes v1_x next to v_x
+    name, _, depth = var.partition('.')
+    return 'v%s_%s' % (depth, name)
+
+
+def const_text(value):
+    if type(value) is float and not math.isfinite(value):
+        return "float('%r')" % value
+    return repr(value)
+
+
+class Translator:
+    def __init__(self, limit=False):
+        self.limit = limit
+        self.lines = []
+        self.names = set()
+        self.temps = 0
+
+    def expression(self, val):
+        # Returns (lines computing temporaries, text of the expression). The
+        # tree is walked without recursion, an expression nested deeper than
+        # MAX_EXPRESSION_DEPTH has its deepest parts assigned to temporaries.
+        prelude = []
+        results = []
+        # Where the temporaries of the right side of every open and/or start
+        marks = []
+        stack = [(val, False)]
+        while stack:
+            node, done = stack.pop()
+            t = type(node)
+            if t is Operation and node.op in LOGIC:
+                if done is False:
+                    stack += [(node, True), (node.right, False), (node, None), (node.left, False)]
+                    continue
+                if done is None:
+                    marks.append(len(prelude))
+                    continue
+                (right, rdepth), (left, ldepth) = results.pop(), results.pop()
+                mark = marks.pop()
+                boolean = type_of(node.left) == 'boolean' and type_of(node.right) == 'boolean'
+                if len(prelude) > mark:
+                    # The right side needs temporaries, they are only
+                    # computed when it is evaluated
+                    lines = prelude[mark:]
+                    del prelude[mark:]
+                    self.temps += 1
+                    temp = 't%d' % self.temps
+                    prelude.append('%s = %s' % (temp, left))
+                    prelude.append(('if %s:' if node.op == 'and' else 'if not %s:') % temp)
+                    prelude += ['    ' + line for line in lines]
+                    prelude.append('    %s = %s' % (temp, right))
+                    text, depth = (temp if boolean else 'bool(%s)' % temp), 1
+                else:
+                    text = ('(%s %s %s)' if boolean else 'bool(%s %s %s)') % (left, node.op, right)
+                    depth = max(ldepth, rdepth) + 1
+            elif t is Operation:
+                if not done:
+                    stack += [(node, True), (node.right, False), (node.left, False)]
+                    continue
+                (right, rdepth), (left, ldepth) = results.pop(), results.pop()
+                helper = HELPERS.get((node.op, node.type))
+                if helper is not None:
+                    text = '%s(%s, %s)' % (helper, left, right)
+                else:
+                    text = '(%s %s %s)' % (left, PYTHON_OPS[node.op], right)
+                depth = max(ldepth, rdepth) + 1
+            elif t is Neg or t is ToFloat:
+                if not done:
+                    stack += [(node, True), (node.value, False)]
+                    continue
+                value, depth = results.pop()
+                text = ('(-%s)' if t is Neg else 'float(%s)') % value
+                depth += 1
+            elif t is Id:
+                self.names.add(node.var)
+                text, depth = local(node.var), 0
+            else:
+                text, depth = const_text(node), 0
+            if depth >= MAX_EXPRESSION_DEPTH:
+                self.temps += 1
+                prelude.append('t%d = %s' % (self.temps, text))
+                text, depth = 't%d' % self.temps, 0
+            results.append((text, depth))
+        return prelude, results.pop()[0]
+
+    def emit(self, level, line):
+        if level > MAX_INDENT:
+            raise CompileError(['program nested too deeply for the python backend'])
+        self.lines.append('    ' * level + line)
+
+    def store(self, level, var, val):
+        prelude, text = self.expression(val)
+        for line in prelude:
+            self.emit(level, line)
+        self.names.add(var)
+        self.emit(level, '%s = %s' % (local(var), text))
+
+    def loop_test(self, level, test):
+        # Opens a loop running while test holds, returns the level of its body
+        prelude, text = self.expression(test)
+        if prelude:
+            self.emit(level, 'while True:')
+            for line in prelude:
+                self.emit(level + 1, line)
+            self.emit(level + 1, 'if not %s:' % text)
+            self.emit(level + 2, 'break')
+        else:
+            self.emit(level, 'while %s:' % text)
+        self.count_step(level + 1)
+        return level + 1
+
+    def count_step(self, level):
+        if self.limit:
+            self.emit(level, 'steps += 1')
+            self.emit(level, 'if steps > limit:')
+            self.emit(level + 1, "raise VMError('step limit of %d exceeded' % limit)")
+
+    def block(self, level, stms):
+        start = len(self.lines)
+        for stm in stms:
+            self.statement(level, stm)
+        if len(self.lines) == start:
+            self.emit(level, 'pass')
+
+    def statement(self, level, stm):
+        t = type(stm)
+        if t is DeclareAssign:
+            self.store(level, stm.var, stm.value)
+        elif t is Declare:
+            self.names.add(stm.var)
+            self.emit(level, '%s = %s' % (local(stm.var), const_text(ir.DEFAULTS[stm.type])))
+        elif t is Assign:
+            self.store(level, stm.var, stm.value)
+        elif t is Print:
+            prelude, text = self.expression(stm.value)
+            for line in prelude:
+                self.emit(level, line)
+            self.emit(level, 'out(fmt(%s))' % text)
+        elif t is Conditional:
+            keyword = 'if'
+            for arm in [stm.if_] + stm.elifs:
+                prelude, text = self.expression(arm.test)
+                if prelude and keyword == 'elif':
+                    # The temporaries of an elif test are computed only when
+                    # the arms before it did not match
+                    self.emit(level, 'else:')
+                    level += 1
+                    keyword = 'if'
+                for line in prelude:
+                    self.emit(level, line)
+                self.emit(level, '%s %s:' % (keyword, text))
+                self.block(level + 1, arm.body)
+                keyword = 'elif'
+            if stm.else_ is not None:
+                self.emit(level, 'else:')
+                self.block(level + 1, stm.else_.body)
+        elif t is While:
+            self.block(self.loop_test(level, stm.test), stm.body)
+        elif t is DoWhile:
+            self.emit(level, 'while True:')
+            self.count_step(level + 1)
+            self.block(level + 1, stm.body)
+            prelude, text = self.expression(stm.test)
+            for line in prelude:
+                self.emit(level + 1, line)
+            self.emit(level + 1, 'if not %s:' % text)
+            self.emit(level + 2, 'break')
+        elif t is For:
+            self.store(level, stm.init.var, stm.init.value)
+            body = self.loop_test(level, stm.test)
+            self.block(body, stm.body)
+            self.store(body, stm.step.var, stm.step.value)
+
+    def translate(self, prog):
+        self.block(1, prog)
+        head = ['def main(out, fmt, IPOW, FPOW, VMError, limit):']
+        if self.names:
+            head.append('    %s = None' % ' = '.join(local(var) for var in sorted(self.names)))
+        if self.limit:
+            head.append('    steps = 0')
+        return '\n'.join(head + self.lines) + '\n'
+
+
+def translate(prog, limit=False):
+    # Python source of a function main(out, fmt, IPOW, FPOW, VMError, limit)
+    # running prog
+    return Translator(limit).translate(prog)
+
+
+def source_key(text, limit=False):
+    h = hashlib.sha256()
+    h.update(('%d %s %d\0' % (VERSION, sys.implementation.cache_tag, limit)).encode())
+    h.update(text.encode('utf-8') if isinstance(text, str) else text)
+    return h.hexdigest()
+
+
+def prune(directory, max_files=MAX_FILES):
+    # Deletes the marshalled code objects used least recently past max_files
+    files = []
+    for name in os.listdir(directory):
+        if name.startswith('pycode-') and name.endswith('.marshal'):
+            path = os.path.join(directory, name)
+            try:
+                files.append((os.stat(path).st_mtime, path))
+            except OSError:
+                pass  # Deleted by another process
+    if len(files) <= max_files:
+        return
+    files.sort()
+    for _, path in files[:len(files) - max_files]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def load(text, limit=False, prog=None):
+    # Code object of the program text, from the caches or translated from
+    # prog, the tree of text, which is parsed if not given
+    key = source_key(text, limit)
+    with _lock:
+        code = _cache.get(key)
+        if code is not None:
+            _cache.move_to_end(key)
+            return code
+    path = os.path.join(cache_dir(), 'pycode-%s.marshal' % key)
+    try:
+        file = open(path, 'rb')
+        code = marshal.loads(file.read())
+        file.close()
+        # Used again, so pruning keeps it longer
+        os.utime(path)
+    except (OSError, EOFError, ValueError, TypeError):
+        code = None
+    if code is None:
+        if prog is None:
+            prog = Compiler().parse(text)
+        try:
+            code = compile(translate(prog, limit), '<program %s>' % key[:12], 'exec')
+        except (SyntaxError, RecursionError, MemoryError) as e:
+            raise CompileError(['python backend: %s' % e])
+        try:
+            os.makedirs(cache_dir(), exist_ok=True)
+            tmp = '%s.%d.tmp' % (path, os.getpid())
+            file = open(tmp, 'wb')
+            file.write(marshal.dumps(code))
+            file.close()
+            os.replace(tmp, path)
+            prune(cache_dir(), MAX_FILES)
+        except OSError:
+            pass  # Read-only cache, keep the code in memory only
+    with _lock:
+        _cache[key] = code
+        while len(_cache) > MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return code
+
+
+def run(code, out=None, max_steps=None):
+    namespace = {}
+    exec(code, namespace)
+    try:
+        namespace['main'](out or print, format_value, ir.OPERATIONS[ir.IPOW], ir.OPERATIONS[ir.FPOW], VMError,
+                          max_steps)
+    except (TypeError, ValueError, ZeroDivisionError, OverflowError) as e:
+        raise VMError('runtime error: %s' % e)
@@ -0,0 +1,169 @@
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from nodes import Assign, Conditional, DeclareAssign, DoWhile, For, Neg, Operation, Print, ToFloat, While
+
+# Statistics of a compile run: wall and CPU time and net allocated memory
+# blocks of every phase, counts of tokens, tree nodes and instructions and
+# the deepest nesting, reported as text or json. Optionally the whole run is
+# profiled with cProfile (hottest functions) or tracemalloc (bytes per phase
+# and the largest allocation sites).
+
+TOP = 15
+
+
+def tree_stats(stms):
+    # Nodes of a syntax tree (statements, if arms and expression nodes), the
+    # deepest block nesting, top level statements being at depth 0, and the
+    # deepest expression nesting
+    nodes = 0
+    max_block = max_expression = 0
+    blocks = [(stms, 0)]
+    expressions = []
+    while blocks:
+        block, depth = blocks.pop()
+        max_block = max(max_block, depth)
+        for stm in block:
+            nodes += 1
+            kind = type(stm)
+            if kind is DeclareAssign or kind is Assign or kind is Print:
+                expressions.append(stm.value)
+            elif kind is While or kind is DoWhile:
+                expressions.append(stm.test)
+                blocks.append((stm.body, depth + 1))
+            elif kind is For:
+                nodes += 2
+                expressions += [stm.init.value, stm.test, stm.step.value]
+                blocks.append((stm.body, depth + 1))
+            elif kind is Conditional:
+                for arm in [stm.if_] + stm.elifs:
+                    nodes += 1
+                    expressions.append(arm.test)
+                    blocks.append((arm.body, depth + 1))
+                if stm.else_ is not None:
+                    nodes += 1
+                    blocks.append((stm.else_.body, depth + 1))
+
+    stack = [(expression, 1) for expression in expressions]
+    while stack:
+        expression, depth = stack.pop()
+        nodes += 1
+        max_expression = max(max_expression, depth)
+        kind = type(expression)
+        if kind is Operation:
+            stack.append((expression.left, depth + 1))
+            stack.append((expression.right, depth + 1))
+        elif kind is Neg or kind is ToFloat:
+            stack.append((expression.value, depth + 1))
+    return nodes, max_block, max_expression
+
+
+class Stats:
+    def __init__(self, profile=None):
+        # profile is None, 'cprofile' or 'tracemalloc'
+        self.profile = profile
+        self.profiler = None
+        self.phases = {}
+        self.counts = {}
+        self.hot = []
+
+    @contextmanager
+    def phase(self, name):
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            memory = tracemalloc.get_traced_memory()[0]
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            entry = self.phases.setdefault(name, {'seconds': 0.0, 'cpu_seconds': 0.0, 'blocks': 0})
+            entry['seconds'] += elapsed
+            entry['cpu_seconds'] += time.process_time() - cpu
+            entry['blocks'] += sys.getallocatedblocks() - blocks
+            if tracing:
+                current, peak = tracemalloc.get_traced_memory()
+                entry['bytes'] = entry.get('bytes', 0) + current - memory
+                entry['peak_bytes'] = max(entry.get('peak_bytes', 0), peak - memory)
+
+    def count(self, name, n):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def maximum(self, name, n):
+        self.counts[name] = max(self.counts.get(name, 0), n)
+
+    def tree(self, stms):
+        nodes, blocks, expressions = tree_stats(stms)
+        self.count('nodes', nodes)
+        self.maximum('max block depth', blocks)
+        self.maximum('max expression depth', expressions)
+
+    def start(self):
+        if self.profile == 'cprofile':
+            import cProfile
+
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif self.profile == 'tracemalloc':
+            tracemalloc.start()
+
+    def stop(self):
+        if self.profile == 'cprofile':
+            import pstats
+
+            self.profiler.disable()
+            functions = pstats.Stats(self.profiler).stats
+            top = sorted(functions.items(), key=lambda item: item[1][2], reverse=True)[:TOP]
+            self.hot = [{'function': '%s:%d(%s)' % key, 'calls': value[1], 'seconds': value[2],
+                         'cumulative': value[3]} for key, value in top]
+        elif self.profile == 'tracemalloc':
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            self.hot = [{'location': '%s:%d' % (stat.traceback[0].filename, stat.traceback[0].lineno),
+                         'bytes': stat.size, 'blocks': stat.count}
+                        for stat in snapshot.statistics('lineno')[:TOP]]
+
+    def as_dict(self):
+        return {
+            'phases': self.phases,
+            'seconds': sum(entry['seconds'] for entry in self.phases.values()),
+            'counts': self.counts,
+            'profile': self.profile,
+            'hot': self.hot,
+        }
+
+    def json(self):
+        return json.dumps(self.as_dict(), indent=2) + '\n'
+
+    def text(self):
+        lines = ['==== Stats ====', '%-12s %10s %10s %12s' % ('phase', 'ms', 'cpu ms', 'blocks')]
+        tracing = self.profile == 'tracemalloc'
+        if tracing:
+            lines[-1] += ' %12s %12s' % ('bytes', 'peak bytes')
+        for name, entry in self.phases.items():
+            line = '%-12s %10.3f %10.3f %12d' % (name, entry['seconds'] * 1e3, entry['cpu_seconds'] * 1e3,
+                                                entry['blocks'])
+            if tracing:
+                line += ' %12d %12d' % (entry.get('bytes', 0), entry.get('peak_bytes', 0))
+            lines.append(line)
+        lines.append('%-12s %10.3f' % ('total', self.as_dict()['seconds'] * 1e3))
+        for name, n in self.counts.items():
+            lines.append('%-22s %d' % (name, n))
+        if self.profile == 'cprofile':
+            lines.append('==== Hot functions (cProfile, by own time) ====')
+            lines.append('%10s %10s %10s  %s' % ('calls', 'own ms', 'cum ms', 'function'))
+            for entry in self.hot:
+                lines.append('%10d %10.3f %10.3f  %s' % (entry['calls'], entry['seconds'] * 1e3,
+                                                        entry['cumulative'] * 1e3, entry['function']))
+        elif tracing:
+            lines.append('==== Allocation sites still alive (tracemalloc) ====')
+            lines.append('%12s %10s  %s' % ('bytes', 'blocks', 'location'))
+            for entry in self.hot:
+                lines.append('%12d %10d  %s' % (entry['bytes'], entry['blocks'], entry['location']))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,108 @@
+import array
+
+# Symbol table filled in by the parser actions. Every declaration gets the
+# next small integer id, and its name, declared type, line and scope depth
+# are kept in lists indexed by that id. Scopes nest like the blocks of the
+# program (a for loop also scopes its initialization). Instead of a stack of
+# dicts to search, one dict maps every name to the id of its innermost
+# visible declaration, and every open scope remembers which ids its own
+# declarations hide. Lookups and redeclaration checks are a single dict
+# access, closing a scope restores what it hid.
+#
+# A declaration hiding one of an enclosing block is a variable of its own at
+# run time, named after the name and the depth of its scope, x.1 for an x
+# declared in a block hiding an x of the top level, and a warning says what
+# it hides. Every other declaration is held in the variable of its name:
+# blocks that are not nested in one another never run at the same time, and
+# a declaration always gives its variable a value.
+#
+# A statement parsed apart from the rest of its program sees the names
+# declared before it through outer, a dict of their types: such a name is
+# entered in the outermost scope the first time the statement looks it up or
+# declares it again. Every name looked for there is kept in used, with the
+# undeclared ones, as what the statement depends on.
+
+TYPES = ('int', 'float', 'string', 'boolean')
+
+
+class SymbolTable:
+    def __init__(self, outer=None):
+        self.names = []
+        self.types = array.array('B')
+        self.lines = array.array('i')
+        self.depths = array.array('i')
+        # Variable of every declaration
+        self.vars = []
+        self.visible = {}
+        self.scopes = [[]]
+        self.undeclared = set()
+        self.warnings = []
+        self.outer = outer
+        self.used = set()
+
+    def __len__(self):
+        return len(self.names)
+
+    def open(self):
+        self.scopes.append([])
+
+    def close(self):
+        visible = self.visible
+        for name, hidden in reversed(self.scopes.pop()):
+            if hidden is None:
+                del visible[name]
+            else:
+                visible[name] = hidden
+
+    def enter(self, name, type_, line, depth):
+        sid = len(self.names)
+        self.names.append(name)
+        self.types.append(TYPES.index(type_))
+        self.lines.append(line)
+        self.depths.append(depth)
+        hidden = self.visible.get(name)
+        self.vars.append(name if hidden is None else '%s.%d' % (name, depth))
+        self.scopes[depth].append((name, hidden))
+        self.visible[name] = sid
+        return sid
+
+    def enter_outer(self, name):
+        # Id of the outer declaration of name, None if there is none
+        self.used.add(name)
+        type_ = self.outer.get(name)
+        if type_ is None:
+            return None
+        return self.enter(name, type_, 0, 0)
+
+    def declare(self, name, type_, line):
+        depth = len(self.scopes) - 1
+        current = self.visible.get(name)
+        if current is None and self.outer is not None:
+            current = self.enter_outer(name)
+        if current is not None:
+            if self.depths[current] == depth:
+                self.warnings.append('line %d: %s is already declared as %s on line %d'
+                                     % (line, name, self.type_of(current), self.lines[current]))
+                return current
+            self.warnings.append('line %d: %s hides the %s %s of an enclosing block'
+                                 % (line, name, self.type_of(current), name))
+        return self.enter(name, type_, line, depth)
+
+    def lookup(self, name, line):
+        # Id of the declaration a use of name refers to, None if there is
+        # none. Every undeclared name is reported once.
+        sid = self.visible.get(name)
+        if sid is None and self.outer is not None:
+            sid = self.enter_outer(name)
+        if sid is None and name not in self.undeclared:
+            self.undeclared.add(name)
+            self.warnings.append('line %d: %s is not declared' % (line, name))
+        return sid
+
+    def type_of(self, sid):
+        return TYPES[self.types[sid]]
+
+    def var(self, sid, name):
+        # Variable holding the value of declaration sid, name when there is
+        # none
+        return name if sid is None else self.vars[sid]
@@ -0,0 +1,117 @@
+from nodes import Assign, Declare, DeclareAssign, Id, Neg, Operation, ToFloat
+
+# Static types, worked out by the parser actions as the tree is built. Every
+# expression node gets the type of its value: a constant the type of its
+# Python value, a name the type it is declared with and an operation the type
+# of its result, None when it depends on an undeclared name and is only known
+# at run time. Mismatches are reported as compile errors. Where an int is
+# used as a float, a constant is converted on the spot and anything else is
+# wrapped in a ToFloat node, so the code generator picks the integer, float
+# or string instruction of every operation from its type alone.
+#
+# + - * and ^ on two ints give an int, on numbers of any other mix a float,
+# / always gives a float and + also joins two strings. Numbers compare with
+# numbers, strings with strings and booleans with booleans for equality;
+# and, or and every condition take booleans.
+
+CONSTANT_TYPES = {int: 'int', float: 'float', str: 'string', bool: 'boolean'}
+NUMBERS = ('int', 'float')
+ARITHMETIC = ('+', '-', '*', '/', '^')
+EQUALITY = ('==', '!=')
+LOGIC = ('and', 'or')
+
+
+def type_of(val):
+    t = type(val)
+    if t is Operation or t is Id or t is Neg or t is ToFloat:
+        return val.type
+    return CONSTANT_TYPES[t]
+
+
+def to_float(val):
+    # An int expression as a float
+    if type(val) is int:
+        return float(val)
+    return ToFloat(val)
+
+
+class Checker:
+    def __init__(self, symbols, error):
+        self.symbols = symbols
+        self.error = error
+
+    def name(self, name, line):
+        sid = self.symbols.lookup(name, line)
+        return Id(name, None if sid is None else self.symbols.type_of(sid), sid, self.symbols.var(sid, name))
+
+    def operation(self, left, op, right, line):
+        lt = type_of(left)
+        rt = type_of(right)
+        if lt is None or rt is None:
+            return Operation(left, op, right, None if op in ARITHMETIC else 'boolean')
+        if op in ARITHMETIC:
+            if lt in NUMBERS and rt in NUMBERS:
+                if lt == rt == 'int' and op != '/':
+                    if op == '^' and type(right) is int and right < 0:
+                        self.error('line %d: negative exponent %d in integer power' % (line, right))
+                    return Operation(left, op, right, 'int')
+                if lt == 'int':
+                    left = to_float(left)
+                if rt == 'int':
+                    right = to_float(right)
+                return Operation(left, op, right, 'float')
+            if op == '+' and lt == rt == 'string':
+                return Operation(left, op, right, 'string')
+        elif op in LOGIC:
+            if lt == rt == 'boolean':
+                return Operation(left, op, right, 'boolean')
+        elif (lt in NUMBERS and rt in NUMBERS) or (lt == rt and (op in EQUALITY or lt == 'string')):
+            return Operation(left, op, right, 'boolean')
+        self.error('line %d: cannot apply %s to %s and %s' % (line, op, lt, rt))
+        return Operation(left, op, right)
+
+    def negate(self, value, line):
+        t = type_of(value)
+        if t is not None and t not in NUMBERS:
+            self.error('line %d: cannot negate %s' % (line, t))
+            t = None
+        return Neg(value, t)
+
+    def stored(self, type_, name, value, line):
+        # value as it is stored in a variable of type_
+        t = type_of(value)
+        if type_ is None or t is None or t == type_:
+            return value
+        if type_ == 'float' and t == 'int':
+            return to_float(value)
+        self.error('line %d: cannot assign %s to %s %s' % (line, t, type_, name))
+        return value
+
+    def declared(self, type_, name, line):
+        # Id of the declaration, which is the first one when the name is
+        # declared again in the same scope
+        sid = self.symbols.declare(name, type_, line)
+        current = self.symbols.type_of(sid)
+        if current != type_:
+            self.error('line %d: %s is already declared as %s' % (line, name, current))
+        return sid
+
+    def declare(self, type_, name, line):
+        sid = self.declared(type_, name, line)
+        return Declare(type_, name, line, sid, self.symbols.var(sid, name))
+
+    def declare_assign(self, type_, name, value, line):
+        sid = self.declared(type_, name, line)
+        value = self.stored(self.symbols.type_of(sid), name, value, line)
+        return DeclareAssign(type_, name, value, line, sid, self.symbols.var(sid, name))
+
+    def assign(self, name, value, line):
+        sid = self.symbols.lookup(name, line)
+        type_ = None if sid is None else self.symbols.type_of(sid)
+        return Assign(name, self.stored(type_, name, value, line), line, sid, self.symbols.var(sid, name))
+
+    def condition(self, test, keyword, line):
+        t = type_of(test)
+        if t is not None and t != 'boolean':
+            self.error('line %d: %s condition is %s, not boolean' % (line, keyword, t))
+        return test
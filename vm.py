@@ -0,0 +1,162 @@
+import ir
+
+# Executes a compiled ir.Program. Names, constants and temporaries are mapped
+# to slots of one preallocated register list and every instruction is decoded
+# once into (handler, dest, a, b, target) with its jump target resolved, so
+# running a program never looks a name or label up. Lowered code jumps
+# straight to the offsets of its labels, the structural markers of code that
+# was not lowered are matched once at load time.
+
+
+class VMError(Exception):
+    pass
+
+
+def format_value(value):
+    if type(value) is bool:
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def op_declare(vm, d, a, b, target, pc):
+    vm.regs[d] = ir.DEFAULTS[vm.regs[a]]
+    return pc + 1
+
+
+def op_move(vm, d, a, b, target, pc):
+    regs = vm.regs
+    regs[d] = regs[a]
+    return pc + 1
+
+
+def binary(fn):
+    def op_binary(vm, d, a, b, target, pc):
+        regs = vm.regs
+        regs[d] = fn(regs[a], regs[b])
+        return pc + 1
+    return op_binary
+
+
+def unary(fn):
+    def op_unary(vm, d, a, b, target, pc):
+        regs = vm.regs
+        regs[d] = fn(regs[a])
+        return pc + 1
+    return op_unary
+
+
+def op_print(vm, d, a, b, target, pc):
+    vm.out(format_value(vm.regs[a]))
+    return pc + 1
+
+
+def op_test(vm, d, a, b, target, pc):
+    if vm.regs[a]:
+        return pc + 1
+    return target
+
+
+def op_branch(vm, d, a, b, target, pc):
+    if vm.regs[a]:
+        return target
+    return pc + 1
+
+
+def op_next(vm, d, a, b, target, pc):
+    return pc + 1
+
+
+def op_jump(vm, d, a, b, target, pc):
+    return target
+
+
+# Dense opcode table, indexed by the ir opcode
+HANDLERS = [None] * (ir.JUMP_UNLESS + 1)
+HANDLERS[ir.DECLARE] = op_declare
+HANDLERS[ir.MOVE] = op_move
+for _op, _fn in ir.OPERATIONS.items():
+    HANDLERS[_op] = binary(_fn)
+for _op, _fn in ir.UNARY_OPERATIONS.items():
+    HANDLERS[_op] = unary(_fn)
+HANDLERS[ir.PRINT] = op_print
+HANDLERS[ir.TEST] = op_test
+for _op in (ir.IF, ir.ELIF, ir.ELSE, ir.END_ELSE, ir.WHILE, ir.DO, ir.DO_WHILE, ir.FOR):
+    HANDLERS[_op] = op_next
+for _op in (ir.END_IF, ir.END_ELIF, ir.END_WHILE, ir.END_DO, ir.END_FOR, ir.JUMP):
+    HANDLERS[_op] = op_jump
+HANDLERS[ir.JUMP_IF] = op_branch
+HANDLERS[ir.JUMP_UNLESS] = op_test
+
+class VM:
+    def __init__(self, program, out=None, max_steps=None):
+        self.out = out or print
+        self.max_steps = max_steps
+        ops = program.ops
+        try:
+            match, owner = ir.match_markers(ops)
+        except ValueError as e:
+            raise VMError(str(e))
+        opener = dict((close, start) for start, close in match.items())
+
+        base = len(program.values)
+        self.regs = list(program.values) + [None] * program.temps
+        # Names start out undefined, constants keep their value
+        for i, kind in enumerate(program.kinds):
+            if kind == ir.NAME:
+                self.regs[i] = None
+        self.slots = dict(program.names)
+
+        def slot(i):
+            # Temporaries go after the operand table, -1 stays "no operand"
+            return i if i >= -1 else base - 2 - i
+
+        code = []
+        for pc, op in enumerate(ops):
+            target = -1
+            if op == ir.TEST:
+                # A failed test leaves the block it belongs to
+                target = match[owner[pc]] + 1
+            elif op in (ir.END_WHILE, ir.END_DO, ir.END_FOR):
+                target = opener[pc] + 1
+            elif op in (ir.END_IF, ir.END_ELIF):
+                target = ir.chain_end(ops, match, pc + 1)
+            elif op == ir.JUMP:
+                target = program.values[program.a[pc]]
+            elif op in ir.JUMPS:
+                target = program.values[program.b[pc]]
+            code.append((HANDLERS[op], slot(program.dest[pc]), slot(program.a[pc]), slot(program.b[pc]),
+                         target))
+        self.code = code
+        self.steps = 0
+
+    def __getitem__(self, name):
+        return self.regs[self.slots[name]]
+
+    def run(self):
+        code = self.code
+        end = len(code)
+        pc = 0
+        steps = 0
+        limit = self.max_steps
+        try:
+            if limit is None:
+                while pc < end:
+                    handler, d, a, b, target = code[pc]
+                    pc = handler(self, d, a, b, target, pc)
+                    steps += 1
+            else:
+                while pc < end:
+                    if steps >= limit:
+                        raise VMError('step limit of %d exceeded' % limit)
+                    handler, d, a, b, target = code[pc]
+                    pc = handler(self, d, a, b, target, pc)
+                    steps += 1
+        except (TypeError, ValueError, ZeroDivisionError, OverflowError, KeyError) as e:
+            raise VMError('runtime error at instruction %d: %s' % (pc, e))
+        finally:
+            self.steps += steps
+        return self
+
+
+def run(program, out=None, max_steps=None):
+    return VM(program, out, max_steps).run()